@@ -0,0 +1,122 @@
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import hydra
+import torch
+from tqdm import tqdm
+from omegaconf import DictConfig
+
+from src.image_data import ImageData
+from src.v2_sam.make_sam_v2 import make_samv2_from_original_state_dict as make_sam
+from src.helpers.loading import load_batch_prompts
+from src.helpers.mask_upscale import MaskUpscaler
+from src.helpers.misc import get_default_device_string, make_device_config
+from src.helpers.image_writer import AsyncImageWriter
+
+# Makes hydra give full error messages
+warnings.filterwarnings("ignore", category=UserWarning)
+os.environ["HYDRA_FULL_ERROR"] = "1"
+
+
+@hydra.main(version_base=None, config_path="conf", config_name="auto_label")
+def run_pipeline(cfg: DictConfig) -> None:
+    #.......................................................................................................................
+    # Initialize SAM 2, image data and prompts
+
+    # Display the start of loading the model weights
+    print("", "Loading model weights...", sep="\n", flush=True)
+
+    # Load the resources for SAM 2
+    device = get_default_device_string()
+    config_dict, model = make_sam(cfg.model_path, include_video_components=False)
+
+    # Convert the model to mixed precision and initialize the image data
+    model.to(**make_device_config(device, False))
+    image_writer = AsyncImageWriter(cfg.get("writer_workers", 4), png_compression=cfg.get("png_compression", 1))
+    dataset = ImageData(
+        storage_path=cfg.storage_path,
+        use_manifest=cfg.get("use_manifest", False),
+        image_writer=image_writer,
+        mask_format=cfg.get("mask_format", "image"),
+    )
+
+    # Load the prompts along with the class of each image, used to look up per-class prompts
+    ok_prompts, prompts_lut = load_batch_prompts(cfg.prompts_path)
+    if not ok_prompts:
+        raise ValueError(f"No usable prompts found @ {cfg.prompts_path}")
+    class_lut = dataset.load_metadata()
+
+    def find_prompts(image_name):
+        class_name = class_lut.get(image_name, None)
+        for key in (image_name, class_name, "*"):
+            if key in prompts_lut:
+                return prompts_lut[key]
+        return None
+
+    # Images that already have a mask are skipped, so interrupted runs resume where they left off
+    image_names = dataset.unlabeled_image_names()
+    batch_size = max(1, cfg.batch_size)
+    batches = [image_names[idx:idx + batch_size] for idx in range(0, len(image_names), batch_size)]
+    image_encoder_dict = {"max_side_length": cfg.max_side_length, "use_square_sizing": cfg.use_square_sizing}
+    mask_index = cfg.get("mask_index", None)
+
+    # Upscale masks into a re-used buffer (the mask is copied when queued for saving)
+    mask_upscaler = MaskUpscaler()
+
+
+    #-----------------------------------------------------------------------------------------------------------------------
+    # Segment every unlabeled image
+
+    # Images are read on worker threads (and masks written by the image writer), so disk access overlaps with the model
+    num_saved, num_skipped = 0, 0
+    progress_bar = tqdm(total=len(image_names), desc="Labeling", unit="img")
+    with ThreadPoolExecutor(max_workers=batch_size) as pool, torch.inference_mode():
+        try:
+            # Start loading the first batch of images
+            next_images = pool.map(dataset.load_image, batches[0]) if len(batches) > 0 else None
+            for batch_idx, batch_names in enumerate(batches):
+
+                # Load the next batch in the background while we process the current batch
+                batch_images = list(next_images)
+                if batch_idx + 1 < len(batches):
+                    next_images = pool.map(dataset.load_image, batches[batch_idx + 1])
+
+                # Skip images we can't read or don't have prompts for (they stay unlabeled)
+                batch_items = []
+                for image_name, image_bgr in zip(batch_names, batch_images):
+                    prompts = find_prompts(image_name)
+                    if image_bgr is None or prompts is None:
+                        num_skipped += 1
+                        progress_bar.update(1)
+                        continue
+                    batch_items.append((image_name, image_bgr, prompts))
+
+                # Encode all images of the batch together
+                valid_images = [image_bgr for _, image_bgr, _ in batch_items]
+                encoding_results, _ = model.encode_images(valid_images, **image_encoder_dict, max_batch_size=batch_size)
+
+                for (image_name, image_bgr, prompts), (encoded_img, _, _) in zip(batch_items, encoding_results):
+
+                    # Run the mask decoder & pick out the mask to save
+                    encoded_prompts = model.encode_prompts(prompts["boxes"], prompts["fg_points"], prompts["bg_points"])
+                    mask_preds, iou_preds = model.generate_masks(
+                        encoded_img, encoded_prompts, mask_hint=None, blank_promptless_output=True)
+                    mask_idx = model.get_best_mask_index(iou_preds) if mask_index is None else int(mask_index)
+
+                    # Save mask at the original image size
+                    mask_uint8 = mask_upscaler.upscale(mask_preds[0, mask_idx], image_bgr.shape[0:2])
+                    dataset.save_mask(mask_uint8, image_name)
+                    num_saved += 1
+                    progress_bar.update(1)
+
+        except KeyboardInterrupt:
+            print("", "Interrupted! Re-run to resume labeling from the remaining images", sep="\n", flush=True)
+
+    # Wait for all masks to be written
+    image_writer.close()
+    progress_bar.close()
+    print("", f"Saved {num_saved} masks, skipped {num_skipped} images", sep="\n", flush=True)
+
+if __name__ == "__main__":
+    run_pipeline()
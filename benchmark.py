@@ -0,0 +1,74 @@
+import os
+import warnings
+from itertools import product
+
+import hydra
+import torch
+from tqdm import tqdm
+from omegaconf import DictConfig
+
+from src.helpers.benchmark import make_random_weight_model, benchmark_components, save_benchmark_results
+
+# Makes hydra give full error messages
+warnings.filterwarnings("ignore", category=UserWarning)
+os.environ["HYDRA_FULL_ERROR"] = "1"
+
+
+@hydra.main(version_base=None, config_path="conf", config_name="benchmark")
+def run_benchmark(cfg: DictConfig) -> None:
+    #.......................................................................................................................
+    # Set up all settings to sweep over
+
+    dtypes_lut = {"float32": torch.float32, "float16": torch.float16, "bfloat16": torch.bfloat16}
+    for dtype_name in cfg.dtypes:
+        if dtype_name not in dtypes_lut:
+            raise ValueError(f"Unknown dtype: {dtype_name}, must be one of: {list(dtypes_lut.keys())}")
+
+    # Thread counts of 'null' use the default torch setting, which we record to restore between runs
+    default_num_threads = torch.get_num_threads()
+    thread_counts = [default_num_threads if n is None else int(n) for n in cfg.num_threads]
+    sweep_settings = list(product(cfg.resolutions, cfg.batch_sizes, cfg.dtypes, thread_counts))
+
+
+    #-----------------------------------------------------------------------------------------------------------------------
+    # Time every model component at each setting
+
+    results_list = []
+    progress_bar = tqdm(total=len(cfg.model_sizes) * len(sweep_settings), desc="Benchmarking", unit="run")
+    try:
+        for size_name in cfg.model_sizes:
+
+            # Build the model once per size, with the same random weights on every run
+            model = make_random_weight_model(size_name, seed=cfg.get("seed", 0))
+            for resolution, batch_size, dtype_name, num_threads in sweep_settings:
+                run_txt = f"{size_name}, {resolution}px, b={batch_size}, {dtype_name}, t={num_threads}"
+                progress_bar.set_postfix_str(run_txt)
+                torch.set_num_threads(num_threads)
+                model.to(dtype=dtypes_lut[dtype_name])
+                component_results = benchmark_components(
+                    model,
+                    resolution,
+                    batch_size,
+                    dtypes_lut[dtype_name],
+                    num_memory_frames=cfg.get("num_memory_frames", 6),
+                    num_warmup=cfg.num_warmup,
+                    num_iters=cfg.num_iters,
+                )
+                run_info = {"model_size": size_name, "dtype": dtype_name, "num_threads": num_threads}
+                results_list.extend({**run_info, **result} for result in component_results)
+                progress_bar.update(1)
+
+            # Free up memory before building the next model size
+            del model
+
+    except KeyboardInterrupt:
+        print("", "Interrupted! Saving partial results...", sep="\n", flush=True)
+
+    # Save everything we've timed, along with the settings used
+    torch.set_num_threads(default_num_threads)
+    progress_bar.close()
+    json_path, csv_path = save_benchmark_results(results_list, cfg.save_path)
+    print("", f"Saved {len(results_list)} results:", f"  {json_path}", f"  {csv_path}", sep="\n", flush=True)
+
+if __name__ == "__main__":
+    run_benchmark()
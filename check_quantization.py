@@ -0,0 +1,96 @@
+import os
+import os.path as osp
+import copy
+import warnings
+from time import perf_counter
+
+import cv2
+import hydra
+import numpy as np
+import torch
+from omegaconf import DictConfig
+
+from src.v2_sam.make_sam_v2 import make_samv2_from_original_state_dict as make_sam
+from src.helpers.quantization import (
+    quantize_samv2_model,
+    run_calibration_images,
+    get_box_prompt_from_mask,
+    get_mask_iou,
+)
+
+# Makes hydra give full error messages
+warnings.filterwarnings("ignore", category=UserWarning)
+os.environ["HYDRA_FULL_ERROR"] = "1"
+
+
+@hydra.main(version_base=None, config_path="conf", config_name="check_quantization")
+def run_check(cfg: DictConfig) -> None:
+    #.......................................................................................................................
+    # Load the float32 & int8 models
+
+    print("", "Loading model weights...", sep="\n", flush=True)
+    _, float_model = make_sam(cfg.model_path, include_video_components=False)
+    float_model.to(device="cpu", dtype=torch.float32)
+
+    image_names = sorted(os.listdir(cfg.images_path))
+    image_paths = [osp.join(cfg.images_path, name) for name in image_names]
+    image_encoder_dict = {"max_side_length": cfg.max_side_length, "use_square_sizing": cfg.use_square_sizing}
+
+    calibration_func = None
+    if cfg.get("calibrate_convs", False):
+        calibration_paths = image_paths[:cfg.get("num_calibration_images", 4)]
+        calibration_func = lambda model: run_calibration_images(model, calibration_paths, **image_encoder_dict)
+    quant_model = quantize_samv2_model(copy.deepcopy(float_model), calibration_func)
+
+
+    #-----------------------------------------------------------------------------------------------------------------------
+    # Compare masks from both models on every image
+
+    def run_model(model, image_bgr, prompts):
+        t1 = perf_counter()
+        encoded_img, _, _ = model.encode_image(image_bgr, **image_encoder_dict)
+        encoded_prompts = model.encode_prompts(*prompts)
+        mask_preds, iou_preds = model.generate_masks(encoded_img, encoded_prompts, blank_promptless_output=False)
+        t2 = perf_counter()
+        return mask_preds, iou_preds, 1000.0 * (t2 - t1)
+
+    ious_list, float_times_ms, quant_times_ms = [], [], []
+    for image_name, image_path in zip(image_names, image_paths):
+        image_bgr = cv2.imread(image_path)
+        if image_bgr is None:
+            continue
+
+        # Prompt with a box around the existing mask, if there is one
+        mask_uint8 = cv2.imread(osp.join(cfg.masks_path, image_name), cv2.IMREAD_GRAYSCALE)
+        box_prompt = [] if mask_uint8 is None else get_box_prompt_from_mask(mask_uint8)
+        prompts = (box_prompt, [], []) if len(box_prompt) > 0 else ([], [(0.5, 0.5)], [])
+
+        # Compare the best float32 mask against the same mask output of the int8 model
+        float_preds, float_ious, float_ms = run_model(float_model, image_bgr, prompts)
+        quant_preds, _, quant_ms = run_model(quant_model, image_bgr, prompts)
+        mask_idx = float_model.get_best_mask_index(float_ious)
+        iou = get_mask_iou((float_preds[0, mask_idx] > 0).numpy(), (quant_preds[0, mask_idx] > 0).numpy())
+
+        ious_list.append(iou)
+        float_times_ms.append(float_ms)
+        quant_times_ms.append(quant_ms)
+        print(f"  {image_name}  IoU: {iou:.4f}  float32: {float_ms:.0f} ms  int8: {quant_ms:.0f} ms", flush=True)
+
+    if len(ious_list) == 0:
+        raise FileNotFoundError(f"No readable images found @ {cfg.images_path}")
+
+    # Report overall results & fail if the quantized model is too inaccurate
+    mean_iou = float(np.mean(ious_list))
+    print(
+        "",
+        f"Mean IoU: {mean_iou:.4f} (min: {min(ious_list):.4f})",
+        f"Mean time float32: {np.mean(float_times_ms):.0f} ms, int8: {np.mean(quant_times_ms):.0f} ms",
+        sep="\n",
+        flush=True,
+    )
+    if mean_iou < cfg.min_mean_iou:
+        raise SystemExit(f"FAILED: Mean IoU is below {cfg.min_mean_iou}")
+    print("PASSED")
+
+if __name__ == "__main__":
+    run_check()
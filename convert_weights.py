@@ -0,0 +1,29 @@
+import os
+import warnings
+from time import perf_counter
+
+import hydra
+from omegaconf import DictConfig
+
+from src.v2_sam.make_sam_v2 import save_converted_samv2, make_samv2_from_converted_state_dict
+
+# Makes hydra give full error messages
+warnings.filterwarnings("ignore", category=UserWarning)
+os.environ["HYDRA_FULL_ERROR"] = "1"
+
+
+@hydra.main(version_base=None, config_path="conf", config_name="convert_weights")
+def run_conversion(cfg: DictConfig) -> None:
+
+    # Convert the original weights (only needs to be done once)
+    print("", "Converting model weights...", sep="\n", flush=True)
+    save_path = save_converted_samv2(cfg.model_path, cfg.save_path)
+
+    # Make sure the converted weights load properly
+    t1 = perf_counter()
+    make_samv2_from_converted_state_dict(save_path)
+    t2 = perf_counter()
+    print("", f"Saved converted weights @ {save_path}", f"  (loads in {t2 - t1:.2f} s)", sep="\n", flush=True)
+
+if __name__ == "__main__":
+    run_conversion()
@@ -0,0 +1,62 @@
+import os
+import warnings
+
+import numpy as np
+import hydra
+from omegaconf import DictConfig
+
+from src.v2_sam.make_sam_v2 import make_samv2_from_original_state_dict as make_sam
+from src.v2_sam.onnx_export import export_samv2_onnx
+
+# Makes hydra give full error messages
+warnings.filterwarnings("ignore", category=UserWarning)
+os.environ["HYDRA_FULL_ERROR"] = "1"
+
+
+@hydra.main(version_base=None, config_path="conf", config_name="export_onnx")
+def run_export(cfg: DictConfig) -> None:
+
+    # Load the model (video components aren't exported)
+    print("", "Loading model weights...", sep="\n", flush=True)
+    _, model = make_sam(cfg.model_path, include_video_components=False)
+
+    # Export the image encoder & prompt-to-mask models
+    print("", "Exporting to onnx...", sep="\n", flush=True)
+    example_image_hw = tuple(cfg.get("example_image_hw", (1024, 1024)))
+    save_paths_dict = export_samv2_onnx(model, cfg.save_folder, example_image_hw, cfg.get("opset_version", 17))
+    print("", *[f"Saved {name} @ {path}" for name, path in save_paths_dict.items()], sep="\n", flush=True)
+
+    # Compare onnx & pytorch results, at the export sizing and a different sizing (to check dynamic axes)
+    try:
+        from src.v2_sam.onnx_model import ONNXSAMV2Model
+        onnx_model = ONNXSAMV2Model(cfg.save_folder, return_tensors=True)
+    except ImportError:
+        print("", "Skipping onnx verification (onnxruntime is not installed)", sep="\n", flush=True)
+        return
+
+    print("", "Verifying onnx results:", sep="\n", flush=True)
+    prompts = ([[(0.25, 0.25), (0.75, 0.75)]], [(0.5, 0.5)], [(0.1, 0.9)])
+    for image_hw in (example_image_hw, tuple(cfg.get("verify_image_hw", (768, 1024)))):
+        image_bgr = np.random.randint(0, 256, (*image_hw, 3), dtype=np.uint8)
+        max_side_length = max(image_hw)
+        results_list = []
+        for ref_model in (model, onnx_model):
+            encoded_img, _, _ = ref_model.encode_image(image_bgr, max_side_length, use_square_sizing=False)
+            encoded_prompts = ref_model.encode_prompts(*prompts)
+            mask_preds, iou_preds = ref_model.generate_masks(encoded_img, encoded_prompts)
+            results_list.append((encoded_img[0].float(), mask_preds.float(), iou_preds.float()))
+        (torch_enc, torch_masks, torch_iou), (onnx_enc, onnx_masks, onnx_iou) = results_list
+        enc_diff = (torch_enc - onnx_enc).abs().max()
+        mask_diff = (torch_masks - onnx_masks).abs().max()
+        iou_diff = (torch_iou - onnx_iou).abs().max()
+        print(
+            f"  Image size: {image_hw[0]}x{image_hw[1]}",
+            f"    max. encoding diff: {float(enc_diff):.5f}",
+            f"    max. mask diff: {float(mask_diff):.5f}",
+            f"    max. iou diff: {float(iou_diff):.5f}",
+            sep="\n",
+            flush=True,
+        )
+
+if __name__ == "__main__":
+    run_export()
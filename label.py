@@ -1,6 +1,7 @@
 import os.path as osp
 import cv2
 import torch
+import numpy as np
 import os
 import warnings
 import hydra
@@ -11,12 +12,19 @@ from src.ui.window import DisplayWindow
 from src.ui.layout import HStack, VStack
 from src.ui.static import StaticMessageBar
 from src.ui.buttons import ImmediateButton
-from src.ui.text import TitledTextBlock
+from src.ui.text import TitledTextBlock, TextBlock
 
-from src.v2_sam.make_sam_v2 import make_samv2_from_original_state_dict as make_sam
+from src.v2_sam.onnx_model import ONNXSAMV2Model, IMAGE_ENCODER_FILE_NAME
 from src.helpers.shared_ui_layout import PromptUIControl, PromptUI, ReusableBaseImage
-from src.helpers.contours import get_contours_from_mask
+from src.helpers.contours import MaskContourCache
 from src.helpers.misc import get_default_device_string, make_device_config
+from src.helpers.embedding_cache import ImageEmbeddingCache, make_model_key
+from src.helpers.prefetch import ImagePrefetcher
+from src.helpers.image_writer import AsyncImageWriter
+from src.helpers.prompt_cache import PromptPredictionCache
+from src.helpers.decode_scheduler import DecoderScheduler
+from src.helpers.inference_worker import InferenceWorker
+from src.helpers.viewport import ImageViewport, TileEncodingCache
 
 # Makes hydra give full error messages
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -31,13 +39,119 @@ def run_pipeline(cfg: DictConfig) -> None:
     # Display the start of loading the model weights
     print("", "Loading model weights...", sep="\n", flush=True)
 
-    # Load the resources for SAM 2
+    # Load the resources for SAM 2, either as a pytorch model or as exported onnx models (see export_onnx.py)
+    # -> Model-specific helpers are only imported when used, so the onnx backend doesn't load them
+    # -> Onnx results are given as (cpu) tensors, since the UI helpers work with tensors
     device = get_default_device_string()
-    config_dict, model = make_sam(cfg.model_path)
-
-    # Convert the model to mixed precision and initialize the image data
-    model.to(**make_device_config(device, False))
-    video = ImageData(storage_path=cfg.storage_path)
+    use_onnx = cfg.get("backend", "torch") == "onnx"
+    if use_onnx:
+        device = "cpu"
+        model = ONNXSAMV2Model(cfg.onnx_path, cfg.get("onnx_num_threads", None), return_tensors=True)
+    else:
+        from src.v2_sam.make_sam_v2 import make_samv2_from_original_state_dict as make_sam
+
+        config_dict, model = make_sam(cfg.model_path, include_video_components=False)
+
+    # Convert the model to mixed precision, or to int8 for faster cpu-only use, and initialize the image data
+    use_int8 = cfg.get("use_int8_quantization", False) and not use_onnx
+    if use_int8:
+        device = "cpu"
+    if not use_onnx:
+        model.to(**make_device_config(device, use_int8))
+
+    # Write masks in the background, so saving doesn't stall the UI
+    image_writer = AsyncImageWriter(cfg.get("writer_workers", 2), png_compression=cfg.get("png_compression", 1))
+    video = ImageData(
+        storage_path=cfg.storage_path,
+        use_manifest=cfg.get("use_manifest", False),
+        annotator_id=cfg.get("annotator_id", None),
+        lease_sec=cfg.get("lease_sec", 900.0),
+        claim_size=cfg.get("claim_size", 4),
+        random_order=cfg.get("random_order", False),
+        image_writer=image_writer,
+        mask_format=cfg.get("mask_format", "image"),
+    )
+    video.claim_next()
+
+    # Set up shared image encoder settings to be cached
+    image_encoder_dict = {"max_side_length": 1024, "use_square_sizing": False}
+
+    # Quantize the model (convs are calibrated on the first few images, if enabled)
+    if use_int8:
+        from src.helpers.quantization import quantize_samv2_model, run_calibration_images
+
+        calibration_func = None
+        num_calibration_images = cfg.get("int8_calibration_images", 0)
+        if num_calibration_images > 0:
+            calibration_paths = video.upcoming_image_paths()[:num_calibration_images]
+            calibration_func = lambda m: run_calibration_images(m, calibration_paths, **image_encoder_dict)
+        model = quantize_samv2_model(model, calibration_func)
+
+    # Set up on-disk cache of image encodings, so revisited images don't need to be re-encoded
+    # -> Quantized encodings are kept separate, since they don't exactly match the float encodings
+    embedding_cache = None
+    if cfg.get("embedding_cache_path", None) is not None:
+        model_key_path = osp.join(cfg.onnx_path, IMAGE_ENCODER_FILE_NAME) if use_onnx else cfg.model_path
+        model_key = make_model_key(model_key_path) + ("-int8" if use_int8 else "")
+        embedding_cache = ImageEmbeddingCache(cfg.embedding_cache_path, model_key, cfg.embedding_cache_size_mb)
+
+    def encode_image(image_bgr):
+        if embedding_cache is not None:
+            return embedding_cache.encode_image(model, image_bgr, **image_encoder_dict)
+        return model.encode_image(image_bgr, **image_encoder_dict)
+
+    # Load & encode upcoming images in the background, so moving to the next image doesn't stall
+    prefetch_depth = cfg.get("prefetch_depth", 2)
+    prefetcher = ImagePrefetcher(encode_image, video.upcoming_image_paths(), prefetch_depth)
+
+    # Optionally trace/compile the mask decoder, which speeds up mask updates (traces are specialized to input shapes)
+    decoder_model = model
+    decoder_compile_mode = None if use_onnx else cfg.get("decoder_compile_mode", None)
+    if decoder_compile_mode is not None:
+        from src.helpers.compiled_decoder import CompiledDecoderModel
+
+        decoder_model = CompiledDecoderModel(model, decoder_compile_mode)
+    warmup_prompt_counts = tuple(cfg.get("decoder_warmup_prompt_counts", (2, 3, 4)))
+
+    # Re-use recent prompt encodings & mask predictions (e.g. when hovering back-and-forth)
+    prompt_cache = PromptPredictionCache(cfg.get("prompt_cache_size", 64))
+
+    def run_decoder(encoded_img, prompts):
+        return prompt_cache.generate_masks(
+            decoder_model, encoded_img, *prompts, mask_hint=None, blank_promptless_output=True
+        )
+
+    # Run the decoder on a background thread, so the UI keeps updating while the model runs
+    # -> The scheduler limits how often the decoder runs, so the UI stays responsive while prompts change quickly
+    decode_scheduler = DecoderScheduler(run_decoder, cfg.get("max_model_share", 0.5), cfg.get("max_latency_ms", 150))
+    inference_worker = InferenceWorker(decode_scheduler)
+
+    # Hold encodings of zoomed-in tiles, so moving around the image doesn't require constant re-encoding
+    # -> Tiles are encoded on a background thread (newest request only), so zooming/panning doesn't stall the UI
+    tile_cache = TileEncodingCache(encode_image, cfg.get("tile_cache_size", 8), tuple(image_encoder_dict.values()))
+    tile_worker = InferenceWorker(DecoderScheduler(tile_cache.encode_tile, max_model_share=1.0, max_latency_ms=0))
+
+    # Set up (optional) per-layer profiling of the model, which can be toggled while labeling (not for onnx models)
+    profiler = None
+    if not use_onnx:
+        from src.helpers.model_capture import ModelProfiler
+
+        profiler = ModelProfiler(model)
+    if cfg.get("profile_on_start", False) and profiler is not None:
+        profiler.enable()
+
+    def toggle_profiling():
+        if profiler is None:
+            print("", "Profiling is not supported with the onnx backend", sep="\n", flush=True)
+            return
+        if profiler.toggle():
+            print("", "Profiling enabled (press p again to stop)", sep="\n", flush=True)
+            return
+        print("", "Profiling results:", profiler.get_report_text(), sep="\n", flush=True)
+        trace_path = cfg.get("profile_trace_path", None)
+        if trace_path is not None:
+            print("", f"Saved trace: {profiler.save_chrome_trace(trace_path)}", sep="\n", flush=True)
+        profiler.clear()
 
 
     #-----------------------------------------------------------------------------------------------------------------------
@@ -49,17 +163,39 @@ def run_pipeline(cfg: DictConfig) -> None:
     track_video_btn = ImmediateButton("Next Image", color=(80, 140, 20))
 
     # Set up message bars to communicate data info & controls
-    model_name = osp.basename(cfg.model_path)
+    model_name = osp.basename(cfg.onnx_path if use_onnx else cfg.model_path)
     header_msgbar = StaticMessageBar(model_name, device, space_equally=True)
-    horizontal = HStack(record_prompt_btn, saved_masks_btn, track_video_btn)
+    status_txt = TextBlock("", max_characters=10)
+    horizontal = HStack(record_prompt_btn, saved_masks_btn, status_txt, track_video_btn)
 
 
     #-----------------------------------------------------------------------------------------------------------------------
     # Initialize the ui for the current image
 
-    while not video.is_finished():
+    user_quit = False
+    while not user_quit and video.claim_next():
         mask_preds = torch.zeros(1, 4, 256, 256)
-        full_image = video.current_image()
+
+        # Start prefetching the next set of images once the previous set is used up (e.g. newly claimed images)
+        if prefetch_depth > 0 and not prefetcher.has_pending():
+            prefetcher.stop()
+            prefetcher = ImagePrefetcher(encode_image, video.upcoming_image_paths(), prefetch_depth)
+        image_path = video.current_image_path()
+        full_image, (full_encoded_img, _, _) = prefetcher.get(image_path)
+        encoded_img, tile_hw = full_encoded_img, full_image.shape[0:2]
+        inference_worker.clear()
+        tile_worker.clear()
+
+        # Prepare the compiled decoder for the common prompt counts (built in the background, if not already built)
+        if decoder_compile_mode is not None:
+            decoder_model.warmup(full_encoded_img, warmup_prompt_counts)
+
+        # Set up zoom-in viewport, for labeling small objects in large images
+        # -> Masks are always made at full resolution (of the visible tile) & collected into a full-image mask
+        viewport = ImageViewport(full_image.shape, cfg.get("zoom_factor", 2.0), cfg.get("max_zoom_steps", 4))
+        mask_tile_xyxy = viewport.get_tile_xyxy()
+        labeled_mask_uint8 = viewport.make_full_mask()
+        have_labeled_regions = False
 
         # Set up shared UI elements & control logic
         ui_elems = PromptUI(full_image, mask_preds)
@@ -78,20 +214,56 @@ def run_pipeline(cfg: DictConfig) -> None:
         # Change tools on arrow keys and keypress for clearing prompts
         uictrl.attach_arrowkey_callbacks(window)
         window.attach_keypress_callback("c", ui_elems.tools.clear.click)
-
-        # Set up shared image encoder settings to be cached
-        image_encoder_dict = {"max_side_length": 1024, "use_square_sizing": False}
-        encoded_img, _, initial_hw = model.encode_image(full_image, **image_encoder_dict)
+        window.attach_keypress_callback("p", toggle_profiling)
+        uictrl.attach_viewport_callbacks(window, viewport)
 
         # Set up helper for managing display data
-        base_img_maker = ReusableBaseImage(full_image)
+        full_img_maker = ReusableBaseImage(full_image, build_in_background=True)
+        base_img_maker = full_img_maker
+        mselect_idx = 0
+        selected_mask_uint8 = uictrl.create_hires_mask_uint8(mask_preds, mselect_idx, tile_hw)
+        final_mask_uint8 = selected_mask_uint8
         label_is_finished = False
 
+        # Re-use mask outlines until the mask changes (the version is bumped on every mask update)
+        contour_cache = MaskContourCache()
+        mask_version, final_mask_version = 0, 0
+
         #-------------------------------------------------------------------------------------------------------------------
         # Perform Segment Anything on the current image
 
         # Read prompt input data & selected mask
         while not label_is_finished:
+
+            # Switch to the visible region when zooming/panning (existing prompts no longer apply)
+            is_view_changed, tile_xyxy = viewport.read()
+            if is_view_changed:
+
+                # Keep the (up-to-date) mask of the previous view, so labeling done there isn't lost
+                is_new_preds, new_preds = inference_worker.wait()
+                if is_new_preds:
+                    mask_preds, iou_preds = new_preds
+                    selected_mask_uint8 = uictrl.create_hires_mask_uint8(mask_preds, mselect_idx, tile_hw)
+                viewport.merge_mask(labeled_mask_uint8, selected_mask_uint8, mask_tile_xyxy)
+                have_labeled_regions = have_labeled_regions or bool(selected_mask_uint8.any())
+                mask_tile_xyxy = tile_xyxy
+
+                # Request the tile encoding in the background (there is no encoding to use until it's ready)
+                tile_image = viewport.crop(full_image)
+                tile_hw = tile_image.shape[0:2]
+                encoded_img, base_img_maker = full_encoded_img, full_img_maker
+                tile_worker.clear()
+                if viewport.is_zoomed():
+                    encoded_img = None
+                    tile_worker.submit(image_path, full_image, tile_xyxy, force_run=True)
+                    base_img_maker = ReusableBaseImage(tile_image, build_in_background=True)
+                inference_worker.clear()
+                ui_elems.clear_prompts()
+                mask_preds = torch.zeros_like(mask_preds)
+                selected_mask_uint8 = uictrl.create_hires_mask_uint8(mask_preds, 0, tile_hw)
+                uictrl.update_mask_previews(mask_preds)
+                mask_version += 1
+
             need_prompt_encode, prompts = uictrl.read_prompts()
             is_mask_changed, mselect_idx, selected_mask_btn = ui_elems.masks_constraint.read()
 
@@ -111,28 +283,52 @@ def run_pipeline(cfg: DictConfig) -> None:
                 saved_masks_btn.set_text(f"{n_masks}/{n_images}")
 
 
+            # Use the tile encoding once it's ready (wait for it before saving), any prompts given so far need decoding
+            need_tile_wait = label_is_finished and encoded_img is None
+            is_new_tile, tile_result = tile_worker.wait() if need_tile_wait else tile_worker.poll()
+            if is_new_tile:
+                encoded_img, _, _ = tile_result
+                need_prompt_encode = True
+                if decoder_compile_mode is not None:
+                    decoder_model.warmup(encoded_img, warmup_prompt_counts)
+
             # Only run the model when an input affecting the output has changed!
-            if need_prompt_encode:
-                encoded_prompts = model.encode_prompts(*prompts)
-                mask_preds, iou_preds = model.generate_masks(
-                    encoded_img, encoded_prompts, mask_hint=None, blank_promptless_output=True)
+            # -> Bursts of changes (e.g. hovering) are merged, so the model only runs on the latest prompts
+            if need_prompt_encode and encoded_img is not None:
+                inference_worker.submit(encoded_img, prompts)
+
+            # Use the newest predictions, if any (wait for up-to-date results before saving)
+            is_new_preds, new_preds = inference_worker.wait() if label_is_finished else inference_worker.poll()
+            if is_new_preds:
+                mask_preds, iou_preds = new_preds
+
+            # Show that the masks are out of date while the model is running (or the tile is being encoded)
+            status_msg = "updating..." if inference_worker.is_busy() else ""
+            status_txt.set_text("encoding..." if encoded_img is None else status_msg)
 
 
             # Update mask previews & selected mask for outlines
-            need_mask_update = any((need_prompt_encode, is_mask_changed))
+            need_mask_update = any((is_new_preds, is_mask_changed))
             if need_mask_update:
-                selected_mask_uint8 = uictrl.create_hires_mask_uint8(mask_preds, mselect_idx, initial_hw)
+                selected_mask_uint8 = uictrl.create_hires_mask_uint8(mask_preds, mselect_idx, tile_hw)
                 uictrl.update_mask_previews(mask_preds)
-
-            # Process contour data
-            final_mask_uint8 = selected_mask_uint8
-            _, mask_contours_norm = get_contours_from_mask(final_mask_uint8, normalize=True)
+                mask_version += 1
 
             # Re-generate display image at required display size
             # -> Not strictly needed, but can avoid constant re-sizing of base image (helpful for large images)
             display_hw = ui_elems.image.get_render_hw()
             disp_img = base_img_maker.regenerate(display_hw)
 
+            # Show the regions labeled in other views along with the current mask
+            if final_mask_version != mask_version:
+                final_mask_uint8 = selected_mask_uint8
+                if have_labeled_regions:
+                    final_mask_uint8 = np.maximum(selected_mask_uint8, viewport.crop(labeled_mask_uint8))
+                final_mask_version = mask_version
+
+            # Process contour data (only needs to be accurate at display resolution, since it's only used for drawing)
+            _, mask_contours_norm = contour_cache.get_contours(final_mask_uint8, mask_version, display_hw)
+
             # Update the main display image in the UI
             uictrl.update_main_display_image(disp_img, final_mask_uint8, mask_contours_norm)
 
@@ -140,7 +336,31 @@ def run_pipeline(cfg: DictConfig) -> None:
             display_image = image_layout.render(h=cfg.display_size)
             req_break, keypress = window.show(display_image)
 
-        video.save_mask(final_mask_uint8)
+            # Stop labeling (without saving the current mask) if the user quits
+            if req_break:
+                user_quit = True
+                cv2.destroyAllWindows()
+                break
+
+        if not user_quit:
+            # Combine the mask of the visible region with the regions labeled in other views
+            viewport.merge_mask(labeled_mask_uint8, selected_mask_uint8, mask_tile_xyxy)
+            video.save_mask(labeled_mask_uint8, image_path.name)
+
+    # Cancel any background processing & hand back unlabeled images before closing
+    inference_worker.stop()
+    tile_worker.stop()
+    prefetcher.stop()
+    video.close()
+
+    # Report on any profiling that was still running
+    if profiler is not None and profiler.is_enabled():
+        toggle_profiling()
+
+    # Save the usage order of cached image encodings & wait for any remaining masks to finish saving
+    if embedding_cache is not None:
+        embedding_cache.close()
+    image_writer.close()
 
 if __name__ == "__main__":
     run_pipeline()
@@ -0,0 +1,308 @@
+import os
+import sys
+import csv
+import json
+from time import perf_counter
+from threading import Thread, Event
+
+import numpy as np
+import torch
+
+from src.v2_sam.make_sam_v2 import make_sam_v2
+
+# For type hints
+from src.v2_sam.sam_v2_model import SAMV2Model
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Model configs
+
+# Sizing configs of the officially released SAMV2 models, meant for use with 'make_sam_v2'
+# See: https://github.com/facebookresearch/segment-anything-2/tree/main/sam2_configs
+STANDARD_MODEL_CONFIGS = {
+    "tiny": {
+        "features_per_image_token": 96,
+        "imgencoder_heads": 1,
+        "imgencoder_blocks_per_stage": (1, 2, 7, 2),
+        "imgencoder_global_attn_spacing_per_stage": (None, None, 2, None),
+        "imgencoder_window_size_per_stage": (8, 4, 14, 7),
+        "base_patch_grid_hw": (7, 7),
+    },
+    "small": {
+        "features_per_image_token": 96,
+        "imgencoder_heads": 1,
+        "imgencoder_blocks_per_stage": (1, 2, 11, 2),
+        "imgencoder_global_attn_spacing_per_stage": (None, None, 3, None),
+        "imgencoder_window_size_per_stage": (8, 4, 14, 7),
+        "base_patch_grid_hw": (7, 7),
+    },
+    "base_plus": {
+        "features_per_image_token": 112,
+        "imgencoder_heads": 2,
+        "imgencoder_blocks_per_stage": (2, 3, 16, 3),
+        "imgencoder_global_attn_spacing_per_stage": (None, None, 4, None),
+        "imgencoder_window_size_per_stage": (8, 4, 14, 7),
+        "base_patch_grid_hw": (14, 14),
+    },
+    "large": {
+        "features_per_image_token": 144,
+        "imgencoder_heads": 2,
+        "imgencoder_blocks_per_stage": (2, 6, 36, 4),
+        "imgencoder_global_attn_spacing_per_stage": (None, None, 10, None),
+        "imgencoder_window_size_per_stage": (8, 4, 16, 8),
+        "base_patch_grid_hw": (7, 7),
+    },
+}
+
+# Names of the model components that are timed, in the order they run
+COMPONENT_NAMES = ("image_encoder", "prompt_encoder", "mask_decoder", "memory_encoder", "memory_fusion")
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Classes
+
+
+class PeakRSSMonitor:
+    """
+    Helper used to measure the peak memory usage (resident set size) of the process
+    over a short section of code. The usage is sampled on a background thread, since
+    the OS only reports the peak over the whole lifetime of the process.
+    On systems without /proc, this falls back to the (lifetime) peak reported by the OS,
+    and if neither is available (e.g. on Windows) the peak is reported as None.
+
+    Example usage:
+        with PeakRSSMonitor() as rss_monitor:
+            run_model(...)
+        peak_mb = rss_monitor.peak_mb
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, sample_period_ms=2):
+        self._sample_period_sec = sample_period_ms / 1000.0
+        self._have_proc = os.path.exists("/proc/self/statm")
+        self._page_size_bytes = os.sysconf("SC_PAGE_SIZE") if self._have_proc else 1
+        self._stop_event = Event()
+        self._thread = None
+        self.peak_mb: float | None = None
+
+    # .................................................................................................................
+
+    def __enter__(self):
+        self.peak_mb = self.get_rss_mb()
+        self._stop_event.clear()
+        if self._have_proc:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    # .................................................................................................................
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        rss_mb = self.get_rss_mb()
+        self.peak_mb = None if rss_mb is None else max(self.peak_mb, rss_mb)
+        return False
+
+    # .................................................................................................................
+
+    def get_rss_mb(self) -> float | None:
+        """
+        Read the current memory usage of the process (or the lifetime peak, if /proc isn't available).
+        Returns None if memory usage can't be read on this system
+        """
+
+        if not self._have_proc:
+            # The resource module is unix-only, so it's imported here to keep the benchmark usable on windows
+            try:
+                import resource
+            except ImportError:
+                return None
+
+            # Note: ru_maxrss is reported in kilobytes on linux, but bytes on macos
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return maxrss / (1_000_000 if sys.platform == "darwin" else 1_000)
+
+        with open("/proc/self/statm", "r") as infile:
+            rss_pages = int(infile.read().split()[1])
+        return rss_pages * self._page_size_bytes / 1_000_000
+
+    # .................................................................................................................
+
+    def _run(self) -> None:
+        """Function run on the background thread, records the highest memory usage until stopped"""
+        while not self._stop_event.wait(self._sample_period_sec):
+            self.peak_mb = max(self.peak_mb, self.get_rss_mb())
+        return
+
+    # .................................................................................................................
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Functions
+
+
+def make_random_weight_model(size_name: str, seed=0) -> SAMV2Model:
+    """
+    Helper used to build a SAMV2 model, of one of the standard sizes, with random weights.
+    Random weights run at the same speed as the pretrained weights, so this is
+    enough for benchmarking, without needing to download model files.
+    """
+
+    if size_name not in STANDARD_MODEL_CONFIGS:
+        raise KeyError(f"Unknown model size: {size_name}, must be one of: {list(STANDARD_MODEL_CONFIGS.keys())}")
+
+    torch.manual_seed(seed)
+    return make_sam_v2(**STANDARD_MODEL_CONFIGS[size_name]).eval()
+
+
+def get_latency_stats(run_times_sec: list[float], items_per_run: int) -> dict:
+    """
+    Helper used to summarize a set of timing results
+    Returns:
+        {"p50_ms", "p95_ms", "mean_ms", "throughput_per_sec"}
+    """
+
+    run_times_ms = 1000.0 * np.float64(run_times_sec)
+    mean_ms = float(np.mean(run_times_ms))
+    return {
+        "p50_ms": round(float(np.percentile(run_times_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(run_times_ms, 95)), 3),
+        "mean_ms": round(mean_ms, 3),
+        "throughput_per_sec": round(1000.0 * items_per_run / mean_ms, 3) if mean_ms > 0 else 0.0,
+    }
+
+
+def time_function(func: callable, num_warmup=2, num_iters=10) -> tuple[list[float], float | None, object]:
+    """
+    Helper used to time repeated calls to a function (taking no arguments).
+    Warmup calls are not timed, but are included when measuring memory usage.
+    The peak memory usage is None if it can't be measured on this system.
+    Returns:
+        run_times_sec_list, peak_rss_mb, last_result
+    """
+
+    result = None
+    run_times_sec = []
+    with PeakRSSMonitor() as rss_monitor:
+        for _ in range(num_warmup):
+            result = func()
+        for _ in range(num_iters):
+            t1 = perf_counter()
+            result = func()
+            t2 = perf_counter()
+            run_times_sec.append(t2 - t1)
+
+    return run_times_sec, rss_monitor.peak_mb, result
+
+
+def benchmark_components(
+    model: SAMV2Model,
+    resolution: int,
+    batch_size=1,
+    dtype=torch.float32,
+    num_memory_frames=6,
+    num_warmup=2,
+    num_iters=10,
+) -> list[dict]:
+    """
+    Helper used to time each of the SAMV2 model components, at a single setting.
+    The image encoder is run on a batch of (random) square images at the given resolution,
+    while the remaining components are run with a batch of prompts on a single image,
+    matching the way the mask decoder handles batching. The memory fusion step is
+    given a single prompt memory along with 'num_memory_frames' previous frame memories.
+
+    Returns:
+        results_list
+        -> One dictionary per component, holding: component, batch_size, resolution & timing stats
+    """
+
+    # Make sure the input resolution is compatible with the image encoder
+    tiling_size = model.image_encoder.get_image_tiling_size_constraint()
+    resolution = max(tiling_size, tiling_size * round(resolution / tiling_size))
+
+    # Set up (random) inputs
+    device = next(model.parameters()).device
+    image_tensor = torch.randn((batch_size, 3, resolution, resolution), device=device, dtype=dtype)
+    box_tlbr_norm_list, fg_xy_norm_list, bg_xy_norm_list = [[(0.25, 0.25), (0.75, 0.75)]], [(0.5, 0.5)], []
+
+    # Define each component run, feeding the results of earlier components forward
+    results_dict = {}
+
+    def run_image_encoder():
+        return model.image_encoder(image_tensor)
+
+    def run_prompt_encoder():
+        return model.encode_prompts(box_tlbr_norm_list, fg_xy_norm_list, bg_xy_norm_list)
+
+    def run_mask_decoder():
+        encoded_imgs_list = [enc[0:1] for enc in results_dict["image_encoder"]]
+        encoded_prompts = results_dict["prompt_encoder"].expand(batch_size, -1, -1)
+        grid_posenc = model.coordinate_encoder.get_full_grid_encoding(encoded_imgs_list[0].shape[2:])
+        return model.mask_decoder(encoded_imgs_list, encoded_prompts, grid_posenc, None, False)
+
+    def run_memory_encoder():
+        lowres_imgenc = results_dict["image_encoder"][0][0:1].expand(batch_size, -1, -1, -1)
+        mask_preds, _, _, obj_score = results_dict["mask_decoder"]
+        return model.memory_encoder(lowres_imgenc, mask_preds[:, [1]], obj_score, is_prompt_encoding=True)
+
+    def run_memory_fusion():
+        lowres_imgenc = results_dict["image_encoder"][0][0:1].expand(batch_size, -1, -1, -1)
+        memory_encoding = results_dict["memory_encoder"]
+        obj_ptr = results_dict["mask_decoder"][2][:, [1]]
+        prev_memory_encodings, prev_obj_ptrs = [memory_encoding] * num_memory_frames, [obj_ptr] * num_memory_frames
+        return model.memory_fusion(lowres_imgenc, [memory_encoding], [obj_ptr], prev_memory_encodings, prev_obj_ptrs)
+
+    component_funcs = {
+        "image_encoder": run_image_encoder,
+        "prompt_encoder": run_prompt_encoder,
+        "mask_decoder": run_mask_decoder,
+        "memory_encoder": run_memory_encoder,
+        "memory_fusion": run_memory_fusion,
+    }
+
+    # Time each component in order (prompt encoding doesn't depend on batch size or resolution, but is timed anyway)
+    results_list = []
+    with torch.inference_mode():
+        for component_name in COMPONENT_NAMES:
+            run_times_sec, peak_rss_mb, result = time_function(component_funcs[component_name], num_warmup, num_iters)
+            results_dict[component_name] = result
+            results_list.append(
+                {
+                    "component": component_name,
+                    "resolution": resolution,
+                    "batch_size": batch_size,
+                    **get_latency_stats(run_times_sec, batch_size),
+                    "peak_rss_mb": None if peak_rss_mb is None else round(peak_rss_mb, 1),
+                }
+            )
+
+    return results_list
+
+
+def save_benchmark_results(results_list: list[dict], save_path_no_ext: str) -> tuple[str, str]:
+    """
+    Helper used to save benchmark results as both json & csv files
+    Returns:
+        json_save_path, csv_save_path
+    """
+
+    save_folder = os.path.dirname(save_path_no_ext)
+    if save_folder != "":
+        os.makedirs(save_folder, exist_ok=True)
+
+    json_save_path = f"{save_path_no_ext}.json"
+    with open(json_save_path, "w") as outfile:
+        json.dump(results_list, outfile, indent=2)
+
+    csv_save_path = f"{save_path_no_ext}.csv"
+    with open(csv_save_path, "w", newline="") as outfile:
+        fieldnames = list(results_list[0].keys()) if len(results_list) > 0 else []
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(results_list)
+
+    return json_save_path, csv_save_path
@@ -0,0 +1,265 @@
+import warnings
+from collections import OrderedDict
+from queue import Queue
+from threading import Thread, Lock
+
+import torch
+import torch.nn as nn
+
+# For type hints
+from torch import Tensor
+from src.v2_sam.sam_v2_model import SAMV2Model
+from src.v2_sam.mask_decoder_model import SAMV2MaskDecoder
+
+
+class MaskDecoderForward(nn.Module):
+    """
+    Simple wrapper around the mask decoder, which takes only tensor inputs & outputs
+    (as needed for tracing/compiling), for the common case of running the decoder
+    with prompts but without a mask hint.
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, mask_decoder: SAMV2MaskDecoder):
+        super().__init__()
+        self.mask_decoder = mask_decoder
+
+    # .................................................................................................................
+
+    def forward(
+        self, lowres_tokens: Tensor, hires_tokens_x2: Tensor, hires_tokens_x4: Tensor, prompts: Tensor, posenc: Tensor
+    ) -> tuple[Tensor, Tensor]:
+        encoded_images_list = [lowres_tokens, hires_tokens_x2, hires_tokens_x4]
+        mask_preds, iou_preds, _, _ = self.mask_decoder(encoded_images_list, prompts, posenc, None, False)
+        return mask_preds, iou_preds
+
+    # .................................................................................................................
+
+
+class CompiledDecoderModel:
+    """
+    Helper used to speed up the prompt-to-mask path of a SAMV2 model, which is made of
+    many small operations and so is mostly limited by python overhead (especially on CPU).
+    The mask decoder is either traced (TorchScript, frozen & optimized for inference) or compiled
+    (using torch.compile). Traced decoders are specialized to the input shapes, so a separate
+    trace is made (and kept) for each combination of prompt count & image encoding size.
+
+    Decoders are built on a background thread, since tracing or compiling can take several
+    seconds. Until the decoder for a given shape is ready, the original (eager) mask decoder
+    is used instead, so new shapes never stall the caller. Freezing is skipped for decoders
+    containing quantized layers (see quantize_samv2_model), which TorchScript doesn't reliably support.
+
+    This is meant as a drop-in replacement for the model when generating masks. Cases which
+    aren't supported by the compiled decoder (mask hints & blank outputs for missing prompts)
+    fall back to the original model.
+
+    Example usage:
+
+        compiled_model = CompiledDecoderModel(model, mode="trace")
+        compiled_model.warmup(encoded_img, prompt_counts=(2, 3, 4))
+        encoded_prompts = compiled_model.encode_prompts(boxes, fg_points, bg_points)
+        mask_preds, iou_preds = compiled_model.generate_masks(encoded_img, encoded_prompts)
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, model: SAMV2Model, mode="trace", max_cached_decoders=16):
+
+        # Sanity check
+        valid_modes = ("trace", "compile")
+        if mode not in valid_modes:
+            raise ValueError(f"Unknown decoder compile mode: {mode}, must be one of: {valid_modes}")
+
+        # Store model & settings
+        self._model = model
+        self._mode = mode
+        self._max_cached_decoders = max(1, max_cached_decoders)
+        self._decoder_forward = MaskDecoderForward(model.mask_decoder).eval()
+
+        # Storage for built decoders, keyed by input shape (torch.compile handles shape changes itself)
+        # -> The lut lock is only held briefly, the build lock is held while tracing/compiling
+        self._decoders_lut: OrderedDict[tuple, nn.Module] = OrderedDict()
+        self._pending_keys: set[tuple] = set()
+        self._compiled_decoder = torch.compile(self._decoder_forward, dynamic=False) if mode == "compile" else None
+        self._lut_lock = Lock()
+        self._build_lock = Lock()
+
+        # Build decoders in the background, so that new shapes don't stall the caller
+        self._build_queue = Queue()
+        self._build_thread = Thread(target=self._run_builds, daemon=True)
+        self._build_thread.start()
+
+    # .................................................................................................................
+
+    def __repr__(self):
+        name = self.__class__.__name__
+        return f"{name}(mode={self._mode}, built_shapes={list(self._decoders_lut.keys())})"
+
+    # .................................................................................................................
+
+    def encode_prompts(self, box_tlbr_norm_list: list, fg_xy_norm_list: list, bg_xy_norm_list: list) -> Tensor:
+        """Same as the original model 'encode_prompts' function"""
+        return self._model.encode_prompts(box_tlbr_norm_list, fg_xy_norm_list, bg_xy_norm_list)
+
+    # .................................................................................................................
+
+    def generate_masks(
+        self,
+        encoded_image_features_list: list[Tensor],
+        encoded_prompts: Tensor,
+        mask_hint: Tensor | int | None = None,
+        blank_promptless_output: bool = True,
+    ) -> tuple[Tensor, Tensor]:
+        """
+        Same as the original model 'generate_masks' function, but uses a compiled mask decoder if possible
+        Returns:
+            mask_predictions, iou_predictions
+        """
+
+        # Use the original model for cases that the compiled decoder doesn't handle
+        no_prompts = encoded_prompts.shape[1] == 0
+        if mask_hint is not None or (no_prompts and blank_promptless_output):
+            return self._model.generate_masks(
+                encoded_image_features_list, encoded_prompts, mask_hint, blank_promptless_output
+            )
+
+        with torch.inference_mode():
+            decoder_inputs = self._make_decoder_inputs(encoded_image_features_list, encoded_prompts)
+            mask_preds, iou_preds = self._run_decoder(decoder_inputs)
+
+        return mask_preds, iou_preds
+
+    # .................................................................................................................
+
+    def warmup(self, encoded_image_features_list: list[Tensor], prompt_counts=(2, 3, 4), wait=False):
+        """
+        Request decoders for the given image encoding size & prompt counts, so that they're ready
+        before they're needed. Prompt counts are the number of prompt tokens, for example, a single
+        point uses 2 tokens (the point + a padding token), as does a single box. Decoders are built
+        in the background (unless waiting) & shapes that have already been built are skipped,
+        so this is cheap to call on every new image (or zoomed-in tile).
+        """
+
+        lowres_tokens = encoded_image_features_list[0]
+        device, dtype = lowres_tokens.device, lowres_tokens.dtype
+        features_per_prompt = lowres_tokens.shape[1]
+        with torch.inference_mode():
+            for num_prompts in prompt_counts:
+                dummy_prompts = torch.zeros((1, num_prompts, features_per_prompt), device=device, dtype=dtype)
+                self._get_decoder(self._make_decoder_inputs(encoded_image_features_list, dummy_prompts))
+
+        if wait:
+            self._build_queue.join()
+
+        return self
+
+    # .................................................................................................................
+
+    def __getattr__(self, name):
+        """Pass along anything else (e.g. 'get_best_mask_index') to the original model"""
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._model, name)
+
+    # .................................................................................................................
+
+    def _make_decoder_inputs(self, encoded_image_features_list: list[Tensor], encoded_prompts: Tensor) -> tuple:
+        """Helper used to bundle up the (tensor-only) inputs to the decoder. Should be called in inference mode"""
+        lowres_tokens, hires_tokens_x2, hires_tokens_x4 = encoded_image_features_list
+        grid_posenc = self._model.coordinate_encoder.get_full_grid_encoding(lowres_tokens.shape[2:])
+        return (lowres_tokens, hires_tokens_x2, hires_tokens_x4, encoded_prompts, grid_posenc)
+
+    # .................................................................................................................
+
+    def _get_decoder(self, decoder_inputs: tuple[Tensor]) -> nn.Module | None:
+        """Helper used to get the built decoder for the given inputs, or request a (background) build if missing"""
+
+        key = tuple((tuple(data.shape), data.dtype, data.device) for data in decoder_inputs)
+        with self._lut_lock:
+            decoder = self._decoders_lut.get(key, None)
+            if decoder is not None:
+                self._decoders_lut.move_to_end(key)
+            elif key not in self._pending_keys:
+                self._pending_keys.add(key)
+                self._build_queue.put((key, decoder_inputs))
+
+        return decoder
+
+    # .................................................................................................................
+
+    def _run_decoder(self, decoder_inputs: tuple[Tensor]) -> tuple[Tensor, Tensor]:
+        """Helper used to run the compiled decoder on the given inputs, using the eager decoder if it isn't built"""
+
+        decoder = self._get_decoder(decoder_inputs)
+        if decoder is None:
+            return self._decoder_forward(*decoder_inputs)
+
+        # Compiled decoders can't run while compiling other shapes (not thread-safe), so use eager while building
+        if self._compiled_decoder is not None:
+            if not self._build_lock.acquire(blocking=False):
+                return self._decoder_forward(*decoder_inputs)
+            try:
+                return decoder(*decoder_inputs)
+            finally:
+                self._build_lock.release()
+
+        return decoder(*decoder_inputs)
+
+    # .................................................................................................................
+
+    def _run_builds(self) -> None:
+        """Function run on the background thread, builds requested decoders one at a time"""
+
+        while True:
+            key, decoder_inputs = self._build_queue.get()
+            try:
+                with self._build_lock:
+                    decoder = self._build_decoder(decoder_inputs)
+            except Exception as err:
+                # Keep using the eager decoder for shapes that can't be built, rather than retrying every run
+                warning_msg = f"Unable to {self._mode} mask decoder, using eager decoder instead: {err}"
+                warnings.warn(warning_msg, RuntimeWarning)
+                decoder = self._decoder_forward
+
+            with self._lut_lock:
+                self._decoders_lut[key] = decoder
+                self._pending_keys.discard(key)
+                while len(self._decoders_lut) > self._max_cached_decoders:
+                    self._decoders_lut.popitem(last=False)
+            self._build_queue.task_done()
+
+        return
+
+    # .................................................................................................................
+
+    def _build_decoder(self, decoder_inputs: tuple[Tensor]) -> nn.Module:
+        """Helper used to make a new (shape-specialized) decoder. Should only be called while holding the build lock"""
+
+        # Compiling happens on the first run for each shape, so run it the same way it'll be used
+        if self._compiled_decoder is not None:
+            with torch.inference_mode():
+                self._compiled_decoder(*decoder_inputs)
+            return self._compiled_decoder
+
+        # Tracing doesn't work with inference-mode tensors, so trace using (non-inference) copies
+        with torch.inference_mode(False), torch.no_grad():
+            example_inputs = tuple(data.clone() for data in decoder_inputs)
+            traced = torch.jit.trace(self._decoder_forward, example_inputs, check_trace=False).eval()
+
+            # Freezing isn't reliable with (int8) quantized layers, so only freeze plain float decoders
+            if has_quantized_layers(self._decoder_forward):
+                return traced
+            return torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+    # .................................................................................................................
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Functions
+
+
+def has_quantized_layers(model: nn.Module) -> bool:
+    """Helper used to check if a model contains any quantized layers (e.g. from dynamic or static quantization)"""
+    quantized_prefixes = ("torch.ao.nn.quantized", "torch.nn.quantized", "torch.ao.nn.intrinsic.quantized")
+    return any(type(module).__module__.startswith(quantized_prefixes) for module in model.modules())
@@ -1,3 +1,5 @@
+import zlib
+
 import cv2
 import numpy as np
 
@@ -191,7 +193,12 @@ def normalize_contours(contours_px_list, frame_shape):
     frame_h, frame_w = frame_shape[0:2]
     norm_scale_factor = 1.0 / np.float32((frame_w - 1, frame_h - 1))
 
-    return [np.float32(contour) * norm_scale_factor for contour in contours_px_list]
+    # Scale all contours together if possible, since this is much faster than scaling each contour separately
+    all_xy_px, split_idxs = concatenate_contours(contours_px_list)
+    if all_xy_px is None:
+        return [np.float32(contour) * norm_scale_factor for contour in contours_px_list]
+
+    return np.split(np.float32(all_xy_px) * norm_scale_factor, split_idxs)
 
 
 # .....................................................................................................................
@@ -203,4 +210,104 @@ def pixelize_contours(contours_norm_list, frame_shape):
     frame_h, frame_w = frame_shape[0:2]
     scale_factor = np.float32((frame_w - 1, frame_h - 1))
 
-    return [np.int32(np.round(contour * scale_factor)) for contour in contours_norm_list]
+    # Scale all contours together if possible, since this is much faster than scaling each contour separately
+    all_xy_norm, split_idxs = concatenate_contours(contours_norm_list)
+    if all_xy_norm is None:
+        return [np.int32(np.round(contour * scale_factor)) for contour in contours_norm_list]
+
+    return np.split(np.int32(np.round(all_xy_norm * scale_factor)), split_idxs)
+
+
+# .....................................................................................................................
+
+
+def concatenate_contours(contours_list) -> [np.ndarray | None, np.ndarray | None]:
+    """
+    Helper used to combine a list of contours into a single array, so that they can be processed all at once.
+    The combined array can be split back into separate contours using: np.split(all_xy, split_idxs)
+    Contours must all have the same (trailing) shape, for example Nx1x2 (as given by cv2.findContours).
+
+    Returns:
+        all_xy, split_idxs
+        -> Returns None, None if the contours can't be combined (e.g. no contours or mixed shapes)
+    """
+
+    if len(contours_list) == 0:
+        return None, None
+
+    trailing_shape = np.shape(contours_list[0])[1:]
+    if any(np.shape(contour)[1:] != trailing_shape for contour in contours_list):
+        return None, None
+
+    split_idxs = np.cumsum([len(contour) for contour in contours_list[:-1]])
+    return np.concatenate(contours_list, axis=0), split_idxs
+
+
+# .....................................................................................................................
+
+
+class MaskContourCache:
+    """
+    Helper used to re-use the (normalized) contours of a mask that hasn't changed, for example
+    when drawing mask outlines on every frame of a display loop. Masks are identified by a
+    version number given by the caller (e.g. incremented whenever the mask is updated), or
+    by a checksum of the mask data if no version is given.
+
+    Since the contours are only meant for display, masks larger than the given working size
+    are downscaled before finding contours, which is much faster for very large masks.
+
+    Example usage:
+        contour_cache = MaskContourCache()
+        have_contours, contours_norm = contour_cache.get_contours(mask_uint8, mask_version, display_hw)
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, minimum_contour_area_norm=0):
+        self._min_area_norm = minimum_contour_area_norm
+        self._key = None
+        self._result = (False, tuple())
+
+    # .................................................................................................................
+
+    def get_contours(self, mask_binary_uint8, mask_version=None, working_hw=None) -> [bool, tuple]:
+        """
+        Get normalized contours of the given mask, re-using the previous result if the mask hasn't changed.
+        If a working height & width is given, contours are found at (up to) this size, which is
+        meant to be used when contours only need to be accurate at display resolution.
+
+        Returns:
+            have_contours (boolean), mask_contours_norm_as_tuple
+        """
+
+        # Identify the mask by a checksum of its data, if we aren't given a version
+        if mask_version is None:
+            mask_version = zlib.adler32(np.ascontiguousarray(mask_binary_uint8).data)
+
+        # Re-use previous result if possible
+        mask_h, mask_w = mask_binary_uint8.shape[0:2]
+        key = (mask_version, mask_h, mask_w, None if working_hw is None else tuple(working_hw))
+        if key == self._key:
+            return self._result
+
+        # Downscale mask if it's larger than the working size (we only need contours at the working resolution)
+        if working_hw is not None:
+            work_h, work_w = working_hw
+            if work_h < mask_h and work_w < mask_w:
+                mask_binary_uint8 = cv2.resize(mask_binary_uint8, dsize=(work_w, work_h), interpolation=cv2.INTER_AREA)
+                mask_binary_uint8 = np.uint8(mask_binary_uint8 > 127) * np.uint8(255)
+
+        self._result = get_contours_from_mask(mask_binary_uint8, self._min_area_norm, normalize=True)
+        self._key = key
+
+        return self._result
+
+    # .................................................................................................................
+
+    def clear(self):
+        """Remove the stored result, forcing contours to be re-computed on the next call"""
+        self._key = None
+        self._result = (False, tuple())
+        return self
+
+    # .................................................................................................................
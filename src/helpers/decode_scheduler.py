@@ -0,0 +1,112 @@
+from time import perf_counter
+
+
+class DecoderScheduler:
+    """
+    Helper used to limit how often the mask decoder runs in interactive loops.
+
+    Prompt changes (e.g. every mouse movement while hovering) are coalesced, so that
+    only the most recent prompts are processed and bursts of updates result in a single
+    model run. After each run, the model is held back for a cooldown period, based on
+    how long the model takes to run, so that the UI gets a share of the processing time
+    (i.e. keeps re-drawing smoothly) even when the model is slow. Pending prompts are
+    never held back for longer than the given latency budget.
+
+    Example usage:
+
+        scheduler = DecoderScheduler(lambda prompts: run_model(prompts), max_model_share=0.5)
+        while True:
+            need_update, prompts = read_prompts()
+            is_new_result, result = scheduler.step(need_update, prompts)
+            if is_new_result:
+                ... use result ...
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, run_func: callable, max_model_share=0.5, max_latency_ms=150, smoothing_factor=0.25):
+
+        # Store model function & timing settings
+        self._run_func = run_func
+        self._max_model_share = min(max(max_model_share, 0.01), 1.0)
+        self._max_latency_sec = max_latency_ms / 1000.0
+        self._smoothing_factor = smoothing_factor
+
+        # Storage for the latest (not yet processed) request
+        self._pending_args = None
+        self._is_pending = False
+        self._pending_start_sec = 0.0
+
+        # Storage for model timing, used to decide when the model can run again
+        self._avg_run_time_sec = 0.0
+        self._last_run_end_sec = -1e9
+
+    # .................................................................................................................
+
+    def step(self, need_update: bool, *args, force_run=False) -> tuple[bool, object]:
+        """
+        Record new inputs (if they've changed) & run the model if it's allowed to.
+        Inputs that are never run, because newer inputs arrived first, are discarded.
+        The force_run flag can be used to run on pending inputs immediately
+        (e.g. to make sure results are up-to-date before saving).
+
+        Returns:
+            is_new_result, result
+            -> The result is None if the model did not run on this step
+        """
+
+        # Keep only the newest inputs, but remember how long we've been waiting to run
+        time_now_sec = perf_counter()
+        if need_update:
+            if not self._is_pending:
+                self._pending_start_sec = time_now_sec
+            self._pending_args = args
+            self._is_pending = True
+
+        # Bail if there's nothing to do or we're still cooling down from the last run (and within the latency budget)
+        if not self._is_pending:
+            return False, None
+        cooldown_sec = self._avg_run_time_sec * (1.0 - self._max_model_share) / self._max_model_share
+        is_cooled_down = (time_now_sec - self._last_run_end_sec) >= cooldown_sec
+        is_over_budget = (time_now_sec - self._pending_start_sec) >= self._max_latency_sec
+        if not (is_cooled_down or is_over_budget or force_run):
+            return False, None
+
+        # Run model on the newest inputs & keep track of how long it takes
+        run_args, self._pending_args, self._is_pending = self._pending_args, None, False
+        result = self._run_func(*run_args)
+        self._last_run_end_sec = perf_counter()
+        self._record_run_time(self._last_run_end_sec - time_now_sec)
+
+        return True, result
+
+    # .................................................................................................................
+
+    def has_pending(self) -> bool:
+        """Check whether there are inputs waiting to be run"""
+        return self._is_pending
+
+    # .................................................................................................................
+
+    def clear(self):
+        """Discard any pending inputs (e.g. when switching images)"""
+        self._pending_args = None
+        self._is_pending = False
+        return self
+
+    # .................................................................................................................
+
+    def get_average_run_time_ms(self) -> float:
+        """Returns the (smoothed) time taken by the model on each run, in milliseconds"""
+        return self._avg_run_time_sec * 1000.0
+
+    # .................................................................................................................
+
+    def _record_run_time(self, run_time_sec: float) -> None:
+        """Helper used to update the (exponentially smoothed) model run time"""
+        is_first_run = self._avg_run_time_sec == 0.0
+        new_weight = 1.0 if is_first_run else self._smoothing_factor
+        self._avg_run_time_sec = (1.0 - new_weight) * self._avg_run_time_sec + new_weight * run_time_sec
+        return
+
+    # .................................................................................................................
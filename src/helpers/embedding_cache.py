@@ -0,0 +1,346 @@
+import os
+import os.path as osp
+import json
+import atexit
+import shutil
+import hashlib
+import tempfile
+from time import perf_counter
+from collections import OrderedDict
+from threading import RLock
+
+import numpy as np
+import torch
+
+# For type hints
+from torch import Tensor
+from numpy import ndarray
+
+
+class ImageEmbeddingCache:
+    """
+    Helper used to store image encodings on disk, so that re-visiting an image
+    (or restarting a labeling session) doesn't require re-running the image encoder.
+
+    Entries are content-addressed, using a hash of the image data along with the
+    model checkpoint and the image encoder sizing settings. Each entry stores the
+    3 multi-resolution feature maps from the image encoder as separate .npy files,
+    which are memory-mapped when loaded. The cache has a size limit, and will evict
+    the least-recently-used entries once the limit is exceeded.
+
+    The usage order is tracked in memory, and written to disk when entries are added or
+    evicted, at most every 'index_save_period_sec' seconds after cache hits, and on close
+    (or when the program exits). The cache is meant to be used by a single process, since
+    there is no locking between processes, so separate processes (e.g. several annotators)
+    should each use their own cache folder.
+
+    Example usage:
+
+        # Set up cache & use it in place of 'model.encode_image(...)'
+        cache = ImageEmbeddingCache("cache/embeddings", make_model_key("path/to/model.pt"))
+        encoded_img, patch_grid_hw, preencoded_hw = cache.encode_image(model, image_bgr, 1024, False)
+        print(cache)
+
+        # Save the usage order of entries (also happens automatically on exit)
+        cache.close()
+    """
+
+    # Names of the files used to store each of the image encoder feature maps
+    feature_file_names = ("lowres.npy", "hires_x2.npy", "hires_x4.npy")
+    index_file_name = "index.json"
+
+    # .................................................................................................................
+
+    def __init__(
+        self, cache_folder_path: str, model_key: str = "", max_size_mb: float = 2048, index_save_period_sec=30.0
+    ):
+
+        # Store cache settings
+        self._folder_path = cache_folder_path
+        self._index_path = osp.join(cache_folder_path, self.index_file_name)
+        self._model_key = str(model_key)
+        self._max_size_bytes = int(max_size_mb * 1_000_000)
+        self._index_save_period_sec = index_save_period_sec
+
+        # Storage for hit/miss counters
+        self.hits = 0
+        self.misses = 0
+
+        # Index of stored entries, ordered from least-to-most recently used
+        # -> Lock is needed since the cache may be shared with background (prefetch) threads
+        self._lock = RLock()
+        self._index: OrderedDict[str, dict] = OrderedDict()
+        os.makedirs(cache_folder_path, exist_ok=True)
+        self._load_index()
+
+        # Storage for changes to the usage order that haven't been written to disk
+        self._is_index_changed = False
+        self._last_index_save_sec = perf_counter()
+        atexit.register(self.close)
+
+    # .................................................................................................................
+
+    def __repr__(self):
+        name = self.__class__.__name__
+        size_mb = self.get_size_bytes() / 1_000_000
+        max_mb = self._max_size_bytes / 1_000_000
+        size_str = f"size={size_mb:.1f}/{max_mb:.0f} MB"
+        return f"{name}(entries={len(self)}, {size_str}, hits={self.hits}, misses={self.misses})"
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    # .................................................................................................................
+
+    def encode_image(
+        self,
+        model,
+        image_bgr: ndarray,
+        max_side_length=1024,
+        use_square_sizing=True,
+    ) -> tuple[list[Tensor], tuple[int, int], tuple[int, int]]:
+        """
+        Drop-in replacement for 'model.encode_image(...)' which re-uses stored
+        encodings when available, and otherwise runs the model and stores the result.
+
+        Returns:
+            encoded_images_list, patch_grid_hw, preencoded_image_hw
+        """
+
+        # Re-use existing encoding if possible
+        key = self.make_key(image_bgr, max_side_length, use_square_sizing)
+        device, dtype = model.image_encoder.mean_rgb.device, model.image_encoder.mean_rgb.dtype
+        ok_load, encoding_result = self.load(key, device, dtype)
+        if ok_load:
+            return encoding_result
+
+        # If we get here, we need to run the model and store the result for future use
+        encoding_result = model.encode_image(image_bgr, max_side_length, use_square_sizing)
+        encoded_img, _, preencoded_hw = encoding_result
+        self.store(key, encoded_img, preencoded_hw)
+
+        return encoding_result
+
+    # .................................................................................................................
+
+    def make_key(self, image_bgr: ndarray, max_side_length=1024, use_square_sizing=True) -> str:
+        """Helper used to build a unique key for an image + model + encoder settings combination"""
+
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(self._model_key.encode())
+        hasher.update(f"{max_side_length}_{use_square_sizing}_{image_bgr.shape}_{image_bgr.dtype}".encode())
+        hasher.update(np.ascontiguousarray(image_bgr).data)
+
+        return hasher.hexdigest()
+
+    # .................................................................................................................
+
+    def load(self, key: str, device="cpu", dtype=None) -> tuple[bool, tuple]:
+        """
+        Load a stored encoding, if available. Feature maps are memory-mapped from disk
+        and only copied if the target device/dtype doesn't match the stored data.
+
+        Returns:
+            ok_load, (encoded_images_list, patch_grid_hw, preencoded_image_hw)
+        """
+
+        with self._lock:
+
+            # Bail if we don't have the entry
+            entry = self._index.get(key, None)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            # Load each of the feature maps, in case the files have gone missing
+            entry_path = osp.join(self._folder_path, key)
+            try:
+                features_list = []
+                for file_name in self.feature_file_names:
+                    feature_array = np.load(osp.join(entry_path, file_name), mmap_mode="c")
+                    feature_tensor = torch.from_numpy(feature_array).to(device=device, dtype=dtype)
+                    features_list.append(feature_tensor)
+            except (FileNotFoundError, ValueError):
+                self._remove_entry(key)
+                self._save_index()
+                self.misses += 1
+                return False, None
+
+            # Mark entry as most recently used (only written to disk periodically, since hits are frequent)
+            self._index.move_to_end(key)
+            self._is_index_changed = True
+            self.hits += 1
+            if (perf_counter() - self._last_index_save_sec) > self._index_save_period_sec:
+                self._save_index()
+
+        patch_grid_hw = features_list[0].shape[2:]
+        preencoded_hw = tuple(entry["preencoded_hw"])
+
+        return True, (features_list, patch_grid_hw, preencoded_hw)
+
+    # .................................................................................................................
+
+    def store(self, key: str, encoded_image_features_list: list[Tensor], preencoded_image_hw: tuple[int, int]):
+        """Save image encoder feature maps to disk, evicting old entries if the cache is full"""
+
+        # Convert features to numpy (bfloat16 isn't supported by numpy, so fall back to float32)
+        features_np_list = []
+        for feature_tensor in encoded_image_features_list:
+            if feature_tensor.dtype == torch.bfloat16:
+                feature_tensor = feature_tensor.float()
+            features_np_list.append(feature_tensor.cpu().numpy())
+        size_bytes = sum(arr.nbytes for arr in features_np_list)
+
+        # Don't bother storing entries that could never fit
+        if size_bytes > self._max_size_bytes:
+            return self
+
+        with self._lock:
+
+            # Write each feature map into a (temporary) folder, then move into place once complete
+            # -> Avoids leaving partially written entries if we're interrupted
+            entry_path = osp.join(self._folder_path, key)
+            temp_path = f"{entry_path}.tmp"
+            os.makedirs(temp_path, exist_ok=True)
+            for file_name, feature_array in zip(self.feature_file_names, features_np_list):
+                np.save(osp.join(temp_path, file_name), feature_array)
+            shutil.rmtree(entry_path, ignore_errors=True)
+            os.replace(temp_path, entry_path)
+
+            # Record new entry as most recently used & remove old entries if we're over the size limit
+            self._index[key] = {"size_bytes": size_bytes, "preencoded_hw": [int(val) for val in preencoded_image_hw]}
+            self._index.move_to_end(key)
+            self._evict_to_size(self._max_size_bytes)
+            self._save_index()
+
+        return self
+
+    # .................................................................................................................
+
+    def clear(self):
+        """Remove all stored entries & reset hit/miss counters"""
+
+        with self._lock:
+            for key in list(self._index.keys()):
+                self._remove_entry(key)
+            self._save_index()
+            self.hits = 0
+            self.misses = 0
+
+        return self
+
+    # .................................................................................................................
+
+    def close(self) -> None:
+        """Write out any changes to the usage order of entries"""
+
+        with self._lock:
+            if self._is_index_changed:
+                self._save_index()
+
+        return
+
+    # .................................................................................................................
+
+    def get_size_bytes(self) -> int:
+        """Returns the total size of all stored feature maps, in bytes"""
+        return sum(entry["size_bytes"] for entry in self._index.values())
+
+    # .................................................................................................................
+
+    def get_stats(self) -> dict:
+        """Returns a dictionary summarizing cache usage"""
+
+        num_lookups = self.hits + self.misses
+        hit_rate = self.hits / num_lookups if num_lookups > 0 else 0.0
+        return {
+            "entries": len(self),
+            "size_bytes": self.get_size_bytes(),
+            "max_size_bytes": self._max_size_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": hit_rate,
+        }
+
+    # .................................................................................................................
+
+    def _evict_to_size(self, target_size_bytes: int) -> None:
+        """Helper used to remove least-recently-used entries until the cache fits the target size"""
+
+        total_size_bytes = self.get_size_bytes()
+        while total_size_bytes > target_size_bytes and len(self._index) > 0:
+            oldest_key = next(iter(self._index))
+            total_size_bytes -= self._index[oldest_key]["size_bytes"]
+            self._remove_entry(oldest_key)
+
+        return
+
+    # .................................................................................................................
+
+    def _remove_entry(self, key: str) -> None:
+        """Helper used to delete an entry from both the index and disk"""
+        self._index.pop(key, None)
+        shutil.rmtree(osp.join(self._folder_path, key), ignore_errors=True)
+        return
+
+    # .................................................................................................................
+
+    def _load_index(self) -> None:
+        """Helper used to load the index of stored entries from disk (if present)"""
+
+        try:
+            with open(self._index_path, "r") as infile:
+                index_list = json.load(infile)
+        except (FileNotFoundError, json.JSONDecodeError):
+            index_list = []
+
+        # Index is stored as a list of [key, entry] pairs, ordered from least-to-most recently used
+        self._index = OrderedDict((key, entry) for key, entry in index_list)
+
+        return
+
+    # .................................................................................................................
+
+    def _save_index(self) -> None:
+        """
+        Helper used to write out the index of stored entries, ordered from least-to-most recently used.
+        The index is written to a (uniquely named) temporary file & renamed into place, so it's never partially written
+        """
+
+        temp_fd, temp_path = tempfile.mkstemp(dir=self._folder_path, prefix=f"{self.index_file_name}.", suffix=".tmp")
+        try:
+            with os.fdopen(temp_fd, "w") as outfile:
+                json.dump(list(self._index.items()), outfile)
+            os.replace(temp_path, self._index_path)
+        except BaseException:
+            if osp.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self._is_index_changed = False
+        self._last_index_save_sec = perf_counter()
+
+        return
+
+    # .................................................................................................................
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Functions
+
+
+def make_model_key(model_path: str, num_bytes_to_hash=1_000_000) -> str:
+    """
+    Helper used to build an identifier for a model checkpoint, for use with the embedding cache.
+    Only the start of the file is hashed (along with the file size), since checkpoints can be large!
+    """
+
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(str(osp.getsize(model_path)).encode())
+    with open(model_path, "rb") as infile:
+        hasher.update(infile.read(num_bytes_to_hash))
+
+    return hasher.hexdigest()
@@ -0,0 +1,166 @@
+import os
+import os.path as osp
+import uuid
+import atexit
+from queue import Queue
+from threading import Thread, Lock
+
+import cv2
+import numpy as np
+
+# For type hints
+from numpy import ndarray
+
+
+class AsyncImageWriter:
+    """
+    Helper used to encode & write images to disk on background threads, so that
+    saving results doesn't block the UI. Pending writes are held in a bounded queue,
+    so that saving faster than the disk can keep up with will eventually wait
+    for space (rather than holding an unbounded number of images in memory).
+
+    Files are written to a (uniquely named) temporary path and then renamed into place,
+    so that other readers never see partially written files, even when the same path is
+    saved several times in a row. Any remaining writes are finished when the program
+    exits (or when calling 'flush' or 'close'). Writes can't be queued after closing.
+
+    Example usage:
+
+        writer = AsyncImageWriter(num_workers=2, png_compression=1)
+        writer.write_image("path/to/mask.png", mask_uint8)
+
+        # Wait for all writes to finish (also happens automatically on exit)
+        writer.close()
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, num_workers=2, queue_size=16, png_compression=1):
+
+        # Store encoding settings (png compression ranges from 0 (fastest) to 9 (smallest files))
+        self._png_compression = int(np.clip(png_compression, 0, 9))
+
+        # Storage for errors raised on the background threads, which are reported on flush
+        self._errors_list = []
+        self._errors_lock = Lock()
+
+        # Start worker threads, which run until given a 'None' job
+        self._queue = Queue(maxsize=max(1, queue_size))
+        self._threads = [Thread(target=self._run, daemon=True) for _ in range(max(1, num_workers))]
+        for thread in self._threads:
+            thread.start()
+        self._is_closed = False
+
+        # Make sure pending writes are completed before exiting
+        atexit.register(self.close)
+
+    # .................................................................................................................
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # .................................................................................................................
+
+    def write_image(self, save_path: str, image: ndarray) -> None:
+        """
+        Queue up an image to be written to the given path. The file format is
+        determined by the path extension (as with cv2.imwrite). A copy of the
+        image is stored, so the given image can be modified after this call.
+        """
+        self.submit(self._encode_and_write, str(save_path), np.copy(image))
+
+    # .................................................................................................................
+
+    def submit(self, func: callable, *args) -> None:
+        """Queue up some other saving function, to be run on a background thread (e.g. for saving json data)"""
+
+        # Jobs queued after closing would never run (or block forever on a full queue), so treat this as an error
+        if self._is_closed:
+            raise RuntimeError("Cannot queue writes after the image writer is closed")
+        self._queue.put((func, args))
+
+        return
+
+    # .................................................................................................................
+
+    def flush(self) -> None:
+        """Wait for all queued writes to finish, then re-raises the first error that occurred (if any)"""
+
+        self._queue.join()
+
+        with self._errors_lock:
+            errors_list, self._errors_list = self._errors_list, []
+        if len(errors_list) > 0:
+            raise errors_list[0]
+
+        return
+
+    # .................................................................................................................
+
+    def close(self) -> None:
+        """Finish all queued writes & stop the worker threads"""
+
+        if self._is_closed:
+            return
+        self._is_closed = True
+
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        atexit.unregister(self.close)
+
+        self.flush()
+
+        return
+
+    # .................................................................................................................
+
+    def _encode_and_write(self, save_path: str, image: ndarray) -> None:
+        """Helper used to encode an image & write it to disk, using a temporary file for an atomic update"""
+
+        # Encode image based on the file extension
+        file_ext = osp.splitext(save_path)[1]
+        encode_params = [cv2.IMWRITE_PNG_COMPRESSION, self._png_compression] if file_ext.lower() == ".png" else []
+        ok_encode, encoded_image = cv2.imencode(file_ext, image, encode_params)
+        if not ok_encode:
+            raise IOError(f"Unable to encode image: {save_path}")
+
+        # Write to temporary file & rename into place once complete
+        # -> Temp file is uniquely named, since several workers may be writing to the same path
+        temp_path = f"{save_path}.{uuid.uuid4().hex[:12]}.tmp"
+        try:
+            with open(temp_path, "wb") as outfile:
+                outfile.write(encoded_image.tobytes())
+            os.replace(temp_path, save_path)
+        except BaseException:
+            if osp.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return
+
+    # .................................................................................................................
+
+    def _run(self) -> None:
+        """Function run on the background threads, processes queued jobs until given a 'None' job"""
+
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    break
+                func, args = job
+                func(*args)
+            except Exception as err:
+                with self._errors_lock:
+                    self._errors_list.append(err)
+            finally:
+                self._queue.task_done()
+
+        return
+
+    # .................................................................................................................
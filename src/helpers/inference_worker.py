@@ -0,0 +1,186 @@
+from queue import Queue, Empty
+from threading import Thread, Event, Lock
+
+from .decode_scheduler import DecoderScheduler
+
+
+class InferenceWorker:
+    """
+    Helper used to run model inference on a background thread, so that slow model
+    runs don't block UI rendering or mouse/keyboard callbacks.
+
+    Requests are handed to a DecoderScheduler (running on the background thread),
+    so only the newest request is processed when several arrive while the model
+    is busy, and the model is throttled to leave processing time for the UI.
+    Results are collected without blocking, by polling on every frame:
+
+        scheduler = DecoderScheduler(run_model_func, max_model_share=0.5)
+        worker = InferenceWorker(scheduler)
+        while True:
+            if need_update:
+                worker.submit(model_inputs)
+            is_new_result, result = worker.poll()
+            show_updating_indicator = worker.is_busy()
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, scheduler: DecoderScheduler, idle_wait_sec=0.1, busy_wait_sec=0.002):
+
+        # Store scheduler, which decides when the model actually runs
+        self._scheduler = scheduler
+        self._idle_wait_sec = idle_wait_sec
+        self._busy_wait_sec = busy_wait_sec
+
+        # Storage for the newest request (only accessed while holding the lock)
+        self._lock = Lock()
+        self._request_args = None
+        self._request_id = 0
+        self._force_run = False
+        self._min_valid_id = 0
+        self._completed_id = 0
+
+        # Results are passed back to the UI thread through a queue, as: (request_id, result, error)
+        self._new_request_event = Event()
+        self._responses = Queue()
+
+        # Start processing requests in the background
+        self._stop_event = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # .................................................................................................................
+
+    def submit(self, *args, force_run=False) -> int:
+        """
+        Request a model run with the given inputs. This replaces any request that hasn't started yet.
+        The force_run flag skips any throttling (e.g. to get up-to-date results before saving).
+        Returns: request_id
+        """
+
+        with self._lock:
+            self._request_id += 1
+            self._request_args = args
+            self._force_run = self._force_run or force_run
+            request_id = self._request_id
+        self._new_request_event.set()
+
+        return request_id
+
+    # .................................................................................................................
+
+    def poll(self) -> tuple[bool, object]:
+        """
+        Get the newest result, without waiting. Results of requests made before
+        the most recent call to 'clear' are discarded. Errors raised by the model
+        are re-raised here.
+
+        Returns:
+            is_new_result, result
+        """
+
+        is_new_result, newest_result = False, None
+        while True:
+            try:
+                request_id, result, error = self._responses.get_nowait()
+            except Empty:
+                break
+
+            if request_id < self._min_valid_id:
+                continue
+            if error is not None:
+                raise error
+            is_new_result, newest_result = True, result
+
+        return is_new_result, newest_result
+
+    # .................................................................................................................
+
+    def wait(self, timeout_sec=None) -> tuple[bool, object]:
+        """Wait for all requests to finish, then get the newest result. Returns: is_new_result, result"""
+
+        with self._lock:
+            self._force_run = True
+        self._new_request_event.set()
+
+        wait_step_sec = 0.005
+        total_wait_sec = 0.0
+        while self.is_busy() and self._thread.is_alive():
+            self._stop_event.wait(wait_step_sec)
+            total_wait_sec += wait_step_sec
+            if timeout_sec is not None and total_wait_sec > timeout_sec:
+                break
+
+        return self.poll()
+
+    # .................................................................................................................
+
+    def is_busy(self) -> bool:
+        """Check whether any requests are waiting or running (e.g. to show an 'updating' indicator)"""
+        with self._lock:
+            return self._completed_id < self._request_id
+
+    # .................................................................................................................
+
+    def clear(self):
+        """Discard pending requests & results (e.g. when switching images)"""
+
+        with self._lock:
+            self._request_args = None
+            self._force_run = False
+            self._min_valid_id = self._request_id + 1
+            self._completed_id = self._request_id
+
+        return self
+
+    # .................................................................................................................
+
+    def stop(self, timeout_sec=5.0):
+        """Stop the background thread (any in-progress model run is allowed to finish)"""
+
+        self._stop_event.set()
+        self._new_request_event.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout_sec)
+
+        return self
+
+    # .................................................................................................................
+
+    def _run(self) -> None:
+        """Function run on the background thread, passes requests to the scheduler until stopped"""
+
+        pending_id = 0
+        while not self._stop_event.is_set():
+
+            # Wait for new requests, or check back soon if the scheduler is holding a request
+            wait_sec = self._busy_wait_sec if self._scheduler.has_pending() else self._idle_wait_sec
+            self._new_request_event.wait(wait_sec)
+            self._new_request_event.clear()
+
+            # Grab newest request
+            with self._lock:
+                have_new_request = self._request_args is not None
+                request_args, self._request_args = self._request_args, None
+                force_run, self._force_run = self._force_run, False
+                if have_new_request:
+                    pending_id = self._request_id
+                elif pending_id < self._min_valid_id:
+                    self._scheduler.clear()
+
+            # Run the model, if the scheduler allows it (errors are passed on to be raised by the UI thread)
+            try:
+                args = request_args if have_new_request else tuple()
+                is_new_result, result = self._scheduler.step(have_new_request, *args, force_run=force_run)
+                error = None
+            except Exception as err:
+                is_new_result, result, error = True, None, err
+
+            if is_new_result:
+                self._responses.put((pending_id, result, error))
+                with self._lock:
+                    self._completed_id = max(self._completed_id, pending_id)
+
+        return
+
+    # .................................................................................................................
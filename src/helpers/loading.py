@@ -1,6 +1,7 @@
 import os
 import os.path as osp
 import json
+import csv
 
 # .....................................................................................................................
 
@@ -242,3 +243,70 @@ def load_init_prompts(path_to_json: str | None):
         print("", "Warning: Unable to load prompt json", f"@ {path_to_json}", "", str(err), sep="\n")
 
     return ok_prompts, prompts_dict
+
+
+# .....................................................................................................................
+
+
+def load_batch_prompts(path_to_prompts: str | None) -> tuple[bool, dict[str, dict]]:
+    """
+    Helper used to load prompts for labeling many images at once. Supports either
+    JSON or CSV files, using the same prompt format as 'load_init_prompts'.
+
+    JSON files can either hold a single set of prompts, which is applied to every image,
+    or a dictionary of prompts, keyed by image name (e.g. '00005.jpg') or class name
+    (matching the 'class' column of metadata.csv), for example:
+        {"00005.jpg": {"boxes": [...], "fg_points": [...], "bg_points": [...]}, "full_bag": {...}}
+
+    CSV files must have a 'name' column (holding image or class names), along with
+    'boxes', 'fg_points' & 'bg_points' columns, each holding JSON-formatted lists.
+
+    Prompts that apply to every image are stored under the '*' key.
+
+    Returns:
+        ok_prompts, prompts_lut
+    """
+
+    # Initialize outputs
+    ok_prompts = False
+    prompts_lut = {}
+
+    # Bail if the given path isn't valid
+    if path_to_prompts is None or not osp.exists(path_to_prompts):
+        print("", "Warning: Not using batch prompts, path is invalid", f"@ {path_to_prompts}", sep="\n")
+        return ok_prompts, prompts_lut
+
+    req_keys = ("boxes", "fg_points", "bg_points")
+    try:
+        # Read CSV rows, with each row holding the prompts for one image or class name
+        is_csv = osp.splitext(path_to_prompts)[1].lower() == ".csv"
+        if is_csv:
+            with open(path_to_prompts, "r", newline="") as infile:
+                for row in csv.DictReader(infile, skipinitialspace=True):
+                    name = row["name"].strip()
+                    prompts_lut[name] = {key: json.loads(row[key]) if row[key] else [] for key in req_keys}
+
+        else:
+            # Try to load the given file as json data, expecting a dictionary!
+            with open(path_to_prompts, "r") as infile:
+                json_data = json.load(infile)
+            if not isinstance(json_data, dict):
+                raise TypeError("Prompt JSON must be a dictionary")
+
+            # Treat a single set of prompts as applying to every image
+            is_single_prompt = all(key in json_data.keys() for key in req_keys)
+            prompts_lut = {"*": json_data} if is_single_prompt else json_data
+
+        # Make sure every entry has the expected keys
+        for name, prompts_dict in prompts_lut.items():
+            if not isinstance(prompts_dict, dict) or not all(key in prompts_dict.keys() for key in req_keys):
+                raise ValueError(f"Prompts for '{name}' must contain keys: {req_keys}")
+
+        # If we get here, the prompt data is ok to use
+        ok_prompts = len(prompts_lut) > 0
+
+    except Exception as err:
+        print("", "Warning: Unable to load batch prompts", f"@ {path_to_prompts}", "", str(err), sep="\n")
+        prompts_lut = {}
+
+    return ok_prompts, prompts_lut
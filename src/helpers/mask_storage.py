@@ -0,0 +1,177 @@
+import os
+import json
+import uuid
+from io import BytesIO
+
+import cv2
+import numpy as np
+
+# For type hints
+from numpy import ndarray
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Constants
+
+# File name suffix used for each mask storage format (added to the end of the image file name)
+# -> 'image' stores masks as regular image files (e.g. png), using the image file name as-is
+# -> 'rle' stores masks as COCO-style (uncompressed) run-length encodings in json format
+# -> 'packbits' stores masks as bit-packed arrays (1 bit per pixel) in compressed numpy .npz format
+MASK_FORMAT_SUFFIXES = {
+    "image": "",
+    "rle": ".rle.json",
+    "packbits": ".bits.npz",
+}
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Functions
+
+
+def get_mask_file_name(image_name: str, mask_format="image") -> str:
+    """Helper used to get the file name of the mask for a given image, for a given storage format"""
+    return f"{image_name}{MASK_FORMAT_SUFFIXES[mask_format]}"
+
+
+# .....................................................................................................................
+
+
+def get_image_name_from_mask_file(mask_file_name: str) -> str:
+    """Helper used to get the name of the image that a mask file belongs to (reverse of 'get_mask_file_name')"""
+
+    for suffix in MASK_FORMAT_SUFFIXES.values():
+        if len(suffix) > 0 and mask_file_name.endswith(suffix):
+            return mask_file_name[: -len(suffix)]
+
+    return mask_file_name
+
+
+# .....................................................................................................................
+
+
+def encode_mask_rle(mask_uint8: ndarray) -> dict:
+    """
+    Helper used to encode a binary mask using (uncompressed) COCO-style run-length encoding.
+    Pixels are read in column-major order and counts alternate between background and
+    foreground runs, always starting with background (so the first count may be 0).
+
+    Returns:
+        rle_dict (with keys: "size", "counts")
+    """
+
+    # Find where the pixel values change, when reading down each column
+    mask_h, mask_w = mask_uint8.shape[0:2]
+    flat_mask = mask_uint8.T.ravel() > 0
+    change_idxs = np.flatnonzero(flat_mask[1:] != flat_mask[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], change_idxs, [flat_mask.size])))
+
+    # Counts always start with background pixels
+    if flat_mask.size > 0 and flat_mask[0]:
+        counts = np.concatenate(([0], counts))
+
+    return {"size": [int(mask_h), int(mask_w)], "counts": counts.tolist()}
+
+
+# .....................................................................................................................
+
+
+def decode_mask_rle(rle_dict: dict) -> ndarray:
+    """Helper used to decode a run-length encoded mask (see 'encode_mask_rle'). Returns: mask_uint8 (0 or 255)"""
+
+    mask_h, mask_w = rle_dict["size"]
+    counts = np.array(rle_dict["counts"], dtype=np.int64)
+    run_values = (np.arange(len(counts)) % 2).astype(np.uint8) * 255
+    flat_mask = np.repeat(run_values, counts)
+
+    return np.ascontiguousarray(flat_mask.reshape(mask_w, mask_h).T)
+
+
+# .....................................................................................................................
+
+
+def encode_mask_packbits(mask_uint8: ndarray) -> tuple[ndarray, tuple[int, int]]:
+    """Helper used to pack a binary mask into 1 bit per pixel. Returns: packed_bits, mask_hw"""
+    return np.packbits(mask_uint8 > 0), tuple(mask_uint8.shape[0:2])
+
+
+# .....................................................................................................................
+
+
+def decode_mask_packbits(packed_bits: ndarray, mask_hw: tuple[int, int]) -> ndarray:
+    """Helper used to unpack a bit-packed mask (see 'encode_mask_packbits'). Returns: mask_uint8 (0 or 255)"""
+    mask_h, mask_w = mask_hw
+    return np.unpackbits(packed_bits, count=mask_h * mask_w).reshape(mask_h, mask_w) * np.uint8(255)
+
+
+# .....................................................................................................................
+
+
+def encode_mask_bytes(mask_uint8: ndarray, mask_format="image", image_ext=".png") -> bytes:
+    """
+    Helper used to encode a mask into the file data for a given storage format.
+    The image_ext is only used with the 'image' format, to pick the image encoding.
+    """
+
+    if mask_format == "rle":
+        return json.dumps(encode_mask_rle(mask_uint8)).encode()
+
+    if mask_format == "packbits":
+        packed_bits, mask_hw = encode_mask_packbits(mask_uint8)
+        with BytesIO() as data_buffer:
+            np.savez_compressed(data_buffer, bits=packed_bits, hw=np.array(mask_hw))
+            return data_buffer.getvalue()
+
+    if mask_format == "image":
+        ok_encode, encoded_image = cv2.imencode(image_ext, mask_uint8)
+        if not ok_encode:
+            raise IOError(f"Unable to encode mask as: {image_ext}")
+        return encoded_image.tobytes()
+
+    raise ValueError(f"Unknown mask format: {mask_format} (must be one of: {list(MASK_FORMAT_SUFFIXES.keys())})")
+
+
+# .....................................................................................................................
+
+
+def save_mask_file(save_path: str, mask_uint8: ndarray, mask_format="image") -> str:
+    """
+    Helper used to save a mask in the given storage format. The file is written to a (uniquely named)
+    temporary path first and then renamed into place, so readers never see partial files.
+    For the 'image' format, the image type is determined by the save path extension.
+
+    Returns:
+        save_path
+    """
+
+    save_path = str(save_path)
+    image_ext = os.path.splitext(save_path)[1]
+    file_data = encode_mask_bytes(mask_uint8, mask_format, image_ext)
+
+    temp_path = f"{save_path}.{uuid.uuid4().hex[:12]}.tmp"
+    with open(temp_path, "wb") as outfile:
+        outfile.write(file_data)
+    os.replace(temp_path, save_path)
+
+    return save_path
+
+
+# .....................................................................................................................
+
+
+def load_mask_file(load_path: str) -> ndarray:
+    """
+    Helper used to load a mask saved in any of the supported storage formats,
+    based on the file name suffix. Returns: mask_uint8 (HxW)
+    """
+
+    load_path = str(load_path)
+
+    if load_path.endswith(MASK_FORMAT_SUFFIXES["rle"]):
+        with open(load_path, "r") as infile:
+            return decode_mask_rle(json.load(infile))
+
+    if load_path.endswith(MASK_FORMAT_SUFFIXES["packbits"]):
+        with np.load(load_path) as npz_data:
+            return decode_mask_packbits(npz_data["bits"], tuple(npz_data["hw"]))
+
+    return cv2.imread(load_path, cv2.IMREAD_GRAYSCALE)
@@ -0,0 +1,106 @@
+import numpy as np
+import torch
+
+# For type hints
+from numpy import ndarray
+from torch import Tensor
+
+
+class MaskUpscaler:
+    """
+    Helper used to make high-resolution binary (uint8) masks from low-resolution mask predictions.
+    Gives the same result as bilinear upscaling (with align_corners=False) of the full
+    prediction followed by thresholding, but is much cheaper for large output sizes:
+        - Only the region around the thresholded low-res mask is upscaled
+          (bilinear outputs can't be above the threshold unless a neighboring input is)
+        - Upscaling is done separably on the mask device, in half precision on GPUs
+        - The output is written into a re-used (pre-allocated) buffer
+
+    Note that the returned mask is over-written by the next call! Copy it if it needs to be kept.
+
+    Example usage:
+        upscaler = MaskUpscaler()
+        mask_uint8 = upscaler.upscale(mask_predictions[0, 1], output_hw=(4000, 6000))
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, use_half_precision_on_gpu=True):
+        self._use_half_on_gpu = use_half_precision_on_gpu
+        self._out_buffer = np.zeros((1, 1), dtype=np.uint8)
+
+    # .................................................................................................................
+
+    def upscale(self, mask_prediction: Tensor, output_hw: tuple[int, int], mask_threshold=0.0) -> ndarray:
+        """
+        Upscale & threshold a single mask prediction (of shape: HxW, 1xHxW or 1x1xHxW)
+        Returns:
+            mask_uint8 (0 or 255, with shape: output_hw)
+        """
+
+        # Re-use output buffer if possible
+        out_h, out_w = (int(val) for val in output_hw)
+        if self._out_buffer.shape != (out_h, out_w):
+            self._out_buffer = np.zeros((out_h, out_w), dtype=np.uint8)
+        out_mask = self._out_buffer
+        out_mask.fill(0)
+
+        # Find the region of the low-res mask that is above the threshold (output is blank if there isn't any!)
+        preds = mask_prediction.reshape(mask_prediction.shape[-2:])
+        in_h, in_w = preds.shape
+        lowres_fg = preds > mask_threshold
+        is_fg_row = lowres_fg.any(dim=1).nonzero()
+        if len(is_fg_row) == 0:
+            return out_mask
+        is_fg_col = lowres_fg.any(dim=0).nonzero()
+        fg_y1, fg_y2 = int(is_fg_row[0]), int(is_fg_row[-1])
+        fg_x1, fg_x2 = int(is_fg_col[0]), int(is_fg_col[-1])
+
+        # Figure out which output pixels sample from the foreground region & the input indexing they need
+        y0_idx, y1_idx, y_weight, out_y1, out_y2 = get_bilinear_sampling(fg_y1, fg_y2, in_h, out_h, preds.device)
+        x0_idx, x1_idx, x_weight, out_x1, out_x2 = get_bilinear_sampling(fg_x1, fg_x2, in_w, out_w, preds.device)
+
+        # Upscale only the needed region (rows first, then columns), then threshold
+        use_half = self._use_half_on_gpu and preds.device.type == "cuda"
+        preds = preds.to(torch.float16 if use_half else torch.float32)
+        y_weight, x_weight = y_weight.to(preds.dtype).unsqueeze(1), x_weight.to(preds.dtype).unsqueeze(0)
+        rows = torch.lerp(preds[y0_idx], preds[y1_idx], y_weight)
+        upscaled = torch.lerp(rows[:, x0_idx], rows[:, x1_idx], x_weight)
+        is_fg = (upscaled > mask_threshold).cpu().numpy()
+        out_mask[out_y1:out_y2, out_x1:out_x2][is_fg] = 255
+
+        return out_mask
+
+    # .................................................................................................................
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Functions
+
+
+def get_bilinear_sampling(
+    fg_start: int, fg_end: int, in_size: int, out_size: int, device
+) -> tuple[Tensor, Tensor, Tensor, int, int]:
+    """
+    Helper used to figure out the bilinear sampling (matching align_corners=False) needed to
+    compute all output pixels (along one axis) which sample from the given input range (inclusive).
+    Returns:
+        index_0, index_1, weight, out_start, out_end
+        -> Output values are found using: input[index_0] * (1 - weight) + input[index_1] * weight
+        -> The output indices are: out_start <= idx < out_end
+    """
+
+    # Output pixels map to input coordinates using: in = (out + 0.5) * scale - 0.5
+    # -> Any output pixel within 1 input pixel of the range may sample from it (we add 1 extra for safety)
+    scale = in_size / out_size
+    out_start = max(0, int(np.floor((fg_start - 1 + 0.5) / scale - 0.5)) - 1)
+    out_end = min(out_size, int(np.ceil((fg_end + 1 + 0.5) / scale - 0.5)) + 2)
+
+    # Compute input sampling coordinates, which are clamped to the input edges
+    out_idx = torch.arange(out_start, out_end, device=device, dtype=torch.float32)
+    in_coord = ((out_idx + 0.5) * scale - 0.5).clamp(min=0)
+    index_0 = in_coord.floor().long().clamp(max=in_size - 1)
+    index_1 = (index_0 + 1).clamp(max=in_size - 1)
+    weight = (in_coord - index_0).clamp(0, 1)
+
+    return index_0, index_1, weight, out_start, out_end
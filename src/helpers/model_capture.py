@@ -1,4 +1,17 @@
+import os
+import json
+from time import perf_counter
+from functools import partial
+from collections import deque
+from threading import Lock, local, get_ident
+
+import torch
 import torch.nn as nn
+import torch.ao.nn.quantized as nnq
+import torch.ao.nn.quantized.dynamic as nnqd
+
+# For type hints
+from torch import Tensor
 
 
 
@@ -52,3 +65,334 @@ class ModelOutputCapture:
             pass
 
         return
+
+
+class ModelProfiler:
+    """
+    Helper used to measure the run time, (estimated) FLOPs and output tensor sizes of
+    target modules/layers within a given model. Like the ModelOutputCapture, this relies
+    on pytorch module hooks, though both 'pre' and 'post' forward hooks are used, so
+    that the time spent inside each target module can be measured.
+
+    FLOPs are estimated by counting the multiply-adds of all linear & convolution layers
+    that run inside of each target module (attention matrix multiplies aren't counted).
+    Nested target modules are included in the counts of their parent modules.
+    Hooks can be attached & removed at any time (e.g. to toggle profiling while the model is in use),
+    and the model can be run from several threads (each thread is shown separately in traces).
+
+    Example usage:
+
+        profiler = ModelProfiler(model).enable()
+
+        # Run model (timing will be recorded during processing)
+        model(input_data)
+
+        # Check out the results
+        print(profiler.get_report_text())
+        profiler.save_chrome_trace("trace.json")  # View using chrome://tracing or https://ui.perfetto.dev
+    """
+
+    # .................................................................................................................
+
+    def __init__(
+        self,
+        model_ref: nn.Module,
+        target_modules: nn.Module | tuple[nn.Module] | None = None,
+        sync_cuda=True,
+        max_records=100_000,
+    ):
+
+        # Store model & profiling settings
+        self._model = model_ref
+        self._target_modules = get_default_profiler_targets() if target_modules is None else target_modules
+        self._sync_cuda = sync_cuda and torch.cuda.is_available()
+
+        # Storage for hooks, which are only attached while profiling is enabled
+        self._hook_handles = []
+
+        # Storage for results, which may be recorded from multiple threads
+        self._records = deque(maxlen=max_records)
+        self._lock = Lock()
+        self._thread_data = local()
+        self._start_time_sec = perf_counter()
+        self._enable_count = 0
+
+    # .................................................................................................................
+
+    def __repr__(self):
+        name = self.__class__.__name__
+        return f"{name}(enabled={self.is_enabled()}, records={len(self._records)})"
+
+    # .................................................................................................................
+
+    def is_enabled(self) -> bool:
+        return len(self._hook_handles) > 0
+
+    # .................................................................................................................
+
+    def enable(self):
+        """Attach hooks to the model, so that target modules are profiled whenever the model runs"""
+
+        # Don't double-up hooks if we're already enabled
+        if self.is_enabled():
+            return self
+
+        # Keep track of how many times we've been enabled, so calls left unfinished by disabling can be discarded
+        self._enable_count += 1
+        for module_name, module in self._model.named_modules():
+            if isinstance(module, self._target_modules):
+                pre_hook = partial(self._pre_hook, module_name)
+                post_hook = partial(self._post_hook, module_name)
+                self._hook_handles.append(module.register_forward_pre_hook(pre_hook))
+                self._hook_handles.append(module.register_forward_hook(post_hook))
+            elif isinstance(module, FLOP_COUNTED_LAYERS):
+                self._hook_handles.append(module.register_forward_hook(self._flop_hook))
+
+        return self
+
+    # .................................................................................................................
+
+    def disable(self):
+        """Remove all hooks from the model (existing results are kept)"""
+        for handle in self._hook_handles:
+            handle.remove()
+        self._hook_handles = []
+        return self
+
+    # .................................................................................................................
+
+    def toggle(self) -> bool:
+        """Switch profiling on/off. Returns: is_enabled"""
+        if self.is_enabled():
+            self.disable()
+        else:
+            self.enable()
+        return self.is_enabled()
+
+    # .................................................................................................................
+
+    def clear(self):
+        """Remove all recorded results"""
+        with self._lock:
+            self._records.clear()
+            self._start_time_sec = perf_counter()
+        return self
+
+    # .................................................................................................................
+
+    def get_records(self) -> list[dict]:
+        """
+        Get a copy of all recorded (per-call) results.
+        Each record holds: name, type, thread_id, start_ms, duration_ms, flops, output_bytes
+        """
+        with self._lock:
+            return list(self._records)
+
+    # .................................................................................................................
+
+    def make_report(self) -> list[dict]:
+        """
+        Aggregate the per-call results for each profiled module, sorted by total run time
+        Returns:
+            report_list
+            -> Each entry holds: name, type, calls, total_ms, mean_ms, max_ms, gflops_per_call,
+               gflops_per_sec & output_mb_per_call
+        """
+
+        # Group records by module
+        records_by_name = {}
+        for record in self.get_records():
+            records_by_name.setdefault(record["name"], []).append(record)
+
+        report_list = []
+        for module_name, records in records_by_name.items():
+            num_calls = len(records)
+            total_ms = sum(record["duration_ms"] for record in records)
+            total_gflops = sum(record["flops"] for record in records) / 1e9
+            total_out_mb = sum(record["output_bytes"] for record in records) / 1e6
+            report_list.append(
+                {
+                    "name": module_name,
+                    "type": records[0]["type"],
+                    "calls": num_calls,
+                    "total_ms": round(total_ms, 3),
+                    "mean_ms": round(total_ms / num_calls, 3),
+                    "max_ms": round(max(record["duration_ms"] for record in records), 3),
+                    "gflops_per_call": round(total_gflops / num_calls, 3),
+                    "gflops_per_sec": round(1000.0 * total_gflops / total_ms, 3) if total_ms > 0 else 0.0,
+                    "output_mb_per_call": round(total_out_mb / num_calls, 3),
+                }
+            )
+
+        return sorted(report_list, key=lambda item: item["total_ms"], reverse=True)
+
+    # .................................................................................................................
+
+    def get_report_text(self) -> str:
+        """Helper used to format the aggregated report as a (printable) table"""
+
+        headings = ("name", "calls", "total_ms", "mean_ms", "max_ms", "gflops_per_call", "gflops_per_sec")
+        rows = [headings] + [tuple(str(item[key]) for key in headings) for item in self.make_report()]
+        col_widths = [max(len(row[idx]) for row in rows) for idx in range(len(headings))]
+        row_strs = ["  ".join(val.ljust(width) for val, width in zip(row, col_widths)) for row in rows]
+
+        return "\n".join(row_strs)
+
+    # .................................................................................................................
+
+    def save_chrome_trace(self, save_path: str) -> str:
+        """
+        Save all recorded results in the 'trace event' format, which can be viewed using
+        chrome://tracing or https://ui.perfetto.dev
+        Returns:
+            save_path
+        """
+
+        process_id = os.getpid()
+        trace_events = []
+        for record in self.get_records():
+            trace_events.append(
+                {
+                    "name": record["name"],
+                    "cat": record["type"],
+                    "ph": "X",
+                    "ts": round(1000.0 * record["start_ms"], 1),
+                    "dur": round(1000.0 * record["duration_ms"], 1),
+                    "pid": process_id,
+                    "tid": record["thread_id"],
+                    "args": {"gflops": record["flops"] / 1e9, "output_mb": record["output_bytes"] / 1e6},
+                }
+            )
+
+        save_folder = os.path.dirname(save_path)
+        if save_folder != "":
+            os.makedirs(save_folder, exist_ok=True)
+        with open(save_path, "w") as outfile:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, outfile)
+
+        return save_path
+
+    # .................................................................................................................
+
+    def _get_call_stack(self) -> list:
+        """Helper used to get the stack of (in-progress) target module calls, for the current thread"""
+
+        # Start a new stack if profiling was re-enabled, since calls that were in-progress will never finish
+        is_stale = getattr(self._thread_data, "enable_count", None) != self._enable_count
+        if is_stale:
+            self._thread_data.call_stack = []
+            self._thread_data.enable_count = self._enable_count
+
+        return self._thread_data.call_stack
+
+    # .................................................................................................................
+
+    def _pre_hook(self, module_name, module, module_in) -> None:
+        """Hook run before each target module, used to start timing"""
+        if self._sync_cuda:
+            torch.cuda.synchronize()
+        self._get_call_stack().append([module_name, perf_counter(), 0])
+        return None
+
+    # .................................................................................................................
+
+    def _post_hook(self, module_name, module, module_in, module_out) -> None:
+        """Hook run after each target module, used to record results"""
+
+        if self._sync_cuda:
+            torch.cuda.synchronize()
+        end_time_sec = perf_counter()
+
+        # Bail if we didn't see the start of this call (e.g. profiling was enabled mid-way through a model run)
+        call_stack = self._get_call_stack()
+        if len(call_stack) == 0 or call_stack[-1][0] != module_name:
+            return None
+        _, start_time_sec, flops = call_stack.pop()
+
+        # Include flops in the (still running) parent module, if any
+        if len(call_stack) > 0:
+            call_stack[-1][2] += flops
+
+        record = {
+            "name": module_name,
+            "type": module.__class__.__name__,
+            "thread_id": get_ident(),
+            "start_ms": 1000.0 * (start_time_sec - self._start_time_sec),
+            "duration_ms": 1000.0 * (end_time_sec - start_time_sec),
+            "flops": flops,
+            "output_bytes": get_tensor_bytes(module_out),
+        }
+        with self._lock:
+            self._records.append(record)
+
+        return None
+
+    # .................................................................................................................
+
+    def _flop_hook(self, module, module_in, module_out) -> None:
+        """Hook run after linear & conv layers, used to add up the FLOPs inside each target module"""
+
+        # Only count layers running inside of a target module
+        call_stack = self._get_call_stack()
+        if len(call_stack) > 0:
+            call_stack[-1][2] += estimate_layer_flops(module, module_in, module_out)
+
+        return None
+
+    # .................................................................................................................
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Functions
+
+# Layers used to estimate FLOPs (including int8 quantized layers)
+FLOP_COUNTED_LAYERS = (nn.Linear, nn.Conv2d, nn.ConvTranspose2d, nnqd.Linear, nnq.Conv2d)
+
+
+
+def get_default_profiler_targets() -> tuple[nn.Module]:
+    """
+    Helper used to get the module types profiled by default. These are the main
+    per-stage/per-layer building blocks of the SAMV2 model components.
+    """
+
+    # Import here, so that capturing model outputs doesn't require the SAMV2 model code
+    from src.v2_sam.components.hiera_model import HieraStage
+    from src.v2_sam.components.cross_attention_transformer import CrossAttentionBlock
+    from src.v2_sam.components.memfuse_components import MemoryFusionTransformerLayer
+    from src.v2_sam.mask_decoder_model import MaskGen, ObjectPointerGen, MLP3Layers
+
+    return (HieraStage, CrossAttentionBlock, MemoryFusionTransformerLayer, MaskGen, ObjectPointerGen, MLP3Layers)
+
+
+def estimate_layer_flops(module: nn.Module, module_in: tuple, module_out: Tensor) -> int:
+    """
+    Helper used to estimate the number of floating point operations used by a single
+    linear or convolution layer (each multiply-add counts as 2 FLOPs, biases are ignored)
+    """
+
+    if isinstance(module, (nn.Linear, nnqd.Linear)):
+        return 2 * module_out.numel() * module.in_features
+
+    if isinstance(module, (nn.Conv2d, nnq.Conv2d)):
+        kernel_h, kernel_w = module.kernel_size
+        return 2 * module_out.numel() * (module.in_channels // module.groups) * kernel_h * kernel_w
+
+    if isinstance(module, nn.ConvTranspose2d):
+        kernel_h, kernel_w = module.kernel_size
+        return 2 * module_in[0].numel() * (module.out_channels // module.groups) * kernel_h * kernel_w
+
+    return 0
+
+
+def get_tensor_bytes(data) -> int:
+    """Helper used to add up the memory size of all tensors in (possibly nested) module outputs"""
+
+    if isinstance(data, Tensor):
+        return data.numel() * data.element_size()
+    if isinstance(data, (list, tuple)):
+        return sum(get_tensor_bytes(item) for item in data)
+    if isinstance(data, dict):
+        return sum(get_tensor_bytes(item) for item in data.values())
+
+    return 0
@@ -0,0 +1,157 @@
+from queue import Queue, Empty, Full
+from threading import Thread, Event
+
+import cv2
+
+# For type hints
+from numpy import ndarray
+
+
+class ImagePrefetcher:
+    """
+    Helper used to load & encode upcoming images on a background thread, so that
+    moving on to the next image doesn't need to wait on the image encoder.
+
+    Images are processed in the order given, and results are held in a bounded
+    queue, so that at most 'queue_depth' images are prepared ahead of time.
+    The encoding function is expected to take in a (bgr) image and return
+    the image encoding result, for example:
+
+        encode_func = lambda image_bgr: model.encode_image(image_bgr, 1024, False)
+        prefetcher = ImagePrefetcher(encode_func, list_of_image_paths, queue_depth=2)
+
+        # Get image & encoding (waits for the background thread if needed)
+        image_bgr, encoding_result = prefetcher.get(list_of_image_paths[0])
+
+        # Stop the background thread when finished
+        prefetcher.stop()
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, encode_func: callable, image_paths: list, queue_depth=2):
+
+        # Store encoding function for processing images
+        self._encode_func = encode_func
+
+        # Storage for background processing results & paths that are still expected from the queue
+        # -> A queue depth of 0 disables prefetching (all images are loaded when requested)
+        self._queue = Queue(maxsize=max(1, queue_depth))
+        self._pending_paths = [str(path) for path in image_paths] if queue_depth > 0 else []
+        self._stop_event = Event()
+
+        # Start processing in the background
+        self._thread = Thread(target=self._run, args=(list(self._pending_paths),), daemon=True)
+        if len(self._pending_paths) > 0:
+            self._thread.start()
+
+    # .................................................................................................................
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    # .................................................................................................................
+
+    def get(self, image_path) -> tuple[ndarray, tuple]:
+        """
+        Get the image & encoding result for the given image path. If the image
+        was queued for prefetching, this will wait until it is ready, otherwise
+        the image is loaded and encoded immediately (on the calling thread).
+        Any queued results for images before the given path are discarded.
+
+        Returns:
+            image_bgr, encoding_result
+        """
+
+        # Load directly if the image isn't (or is no longer) going to be prefetched
+        image_path = str(image_path)
+        if image_path not in self._pending_paths:
+            return self._load_and_encode(image_path)
+
+        # Pull results until we get the target path, discarding any results we skipped over
+        while True:
+            try:
+                queued_path, image_bgr, encoding_result, error = self._queue.get(timeout=0.1)
+            except Empty:
+                # Fall back to direct loading if the background thread ended before reaching our image
+                if not self._thread.is_alive() and self._queue.empty():
+                    self._pending_paths = []
+                    return self._load_and_encode(image_path)
+                continue
+
+            self._pending_paths.remove(queued_path)
+            if queued_path != image_path:
+                continue
+
+            # Re-raise background errors on the calling thread, so that they are visible to the user
+            if error is not None:
+                raise error
+
+            return image_bgr, encoding_result
+
+    # .................................................................................................................
+
+    def has_pending(self) -> bool:
+        """Check whether there are any images still queued for prefetching"""
+        return len(self._pending_paths) > 0
+
+    # .................................................................................................................
+
+    def stop(self, timeout_sec=5.0):
+        """Cancel background processing & wait for the background thread to finish"""
+
+        self._stop_event.set()
+
+        # Empty out the queue, in case the background thread is waiting for space
+        while not self._queue.empty():
+            try:
+                self._queue.get_nowait()
+            except Empty:
+                break
+
+        if self._thread.is_alive():
+            self._thread.join(timeout_sec)
+        self._pending_paths = []
+
+        return self
+
+    # .................................................................................................................
+
+    def _load_and_encode(self, image_path: str) -> tuple[ndarray, tuple]:
+        """Helper used to load & encode an image. Returns: image_bgr, encoding_result"""
+        image_bgr = cv2.imread(image_path)
+        return image_bgr, self._encode_func(image_bgr)
+
+    # .................................................................................................................
+
+    def _run(self, image_paths: list[str]) -> None:
+        """Function run on the background thread, loads & encodes images until finished or stopped"""
+
+        for image_path in image_paths:
+
+            # Stop early if we're cancelled
+            if self._stop_event.is_set():
+                break
+
+            # Process image, but hold on to errors so they can be reported when the result is requested
+            image_bgr, encoding_result, error = None, None, None
+            try:
+                image_bgr, encoding_result = self._load_and_encode(image_path)
+            except Exception as err:
+                error = err
+
+            # Wait for space in the queue, while checking for cancellation
+            queue_item = (image_path, image_bgr, encoding_result, error)
+            while not self._stop_event.is_set():
+                try:
+                    self._queue.put(queue_item, timeout=0.1)
+                    break
+                except Full:
+                    continue
+
+        return
+
+    # .................................................................................................................
@@ -0,0 +1,169 @@
+from collections import OrderedDict
+
+# For type hints
+from torch import Tensor
+
+
+class PromptPredictionCache:
+    """
+    Helper used to avoid re-running the prompt encoder & mask decoder for prompts that
+    were recently used (e.g. when hovering back-and-forth over the same part of an image).
+
+    Prompt coordinates are quantized to a grid (1024 steps across the image by default)
+    before being used as cache keys, and the quantized coordinates are what is given
+    to the model, so that a given key always produces the same result. Encoded prompts
+    don't depend on the image and are kept across images, while mask predictions are
+    cleared whenever the image changes (see 'set_image').
+
+    Example usage:
+
+        cache = PromptPredictionCache(max_entries=64)
+        cache.set_image(encoded_img)
+        mask_preds, iou_preds = cache.generate_masks(model, encoded_img, boxes, fg_points, bg_points)
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, max_entries=64, quantization_steps=1024):
+
+        # Store cache settings
+        self._max_entries = max(1, max_entries)
+        self._quant_steps = quantization_steps
+
+        # Storage for cached results, ordered from least-to-most recently used
+        self._prompts_lut: OrderedDict[tuple, Tensor] = OrderedDict()
+        self._predictions_lut: OrderedDict[tuple, tuple[Tensor, Tensor]] = OrderedDict()
+        self._image_ref = None
+
+        # Storage for hit/miss counters
+        self.hits = 0
+        self.misses = 0
+
+    # .................................................................................................................
+
+    def __repr__(self):
+        name = self.__class__.__name__
+        num_prompts, num_preds = len(self._prompts_lut), len(self._predictions_lut)
+        return f"{name}(prompts={num_prompts}, predictions={num_preds}, hits={self.hits}, misses={self.misses})"
+
+    # .................................................................................................................
+
+    def set_image(self, encoded_image_features_list: list[Tensor]):
+        """Set the current image encoding. Cached mask predictions are cleared if the image has changed"""
+
+        # Hold on to the image features, so we can check for changes by identity
+        image_ref = encoded_image_features_list[0]
+        if image_ref is not self._image_ref:
+            self._predictions_lut.clear()
+            self._image_ref = image_ref
+
+        return self
+
+    # .................................................................................................................
+
+    def clear(self):
+        """Remove all cached results & reset hit/miss counters"""
+
+        self._prompts_lut.clear()
+        self._predictions_lut.clear()
+        self._image_ref = None
+        self.hits = 0
+        self.misses = 0
+
+        return self
+
+    # .................................................................................................................
+
+    def encode_prompts(self, model, box_tlbr_norm_list: list, fg_xy_norm_list: list, bg_xy_norm_list: list) -> Tensor:
+        """Drop-in replacement for 'model.encode_prompts(...)', which re-uses recently encoded prompts"""
+
+        key = self.make_key(box_tlbr_norm_list, fg_xy_norm_list, bg_xy_norm_list)
+        encoded_prompts = self._prompts_lut.get(key, None)
+        if encoded_prompts is None:
+            encoded_prompts = model.encode_prompts(*self._dequantize(key))
+            self._store(self._prompts_lut, key, encoded_prompts)
+        else:
+            self._prompts_lut.move_to_end(key)
+
+        return encoded_prompts
+
+    # .................................................................................................................
+
+    def generate_masks(
+        self,
+        model,
+        encoded_image_features_list: list[Tensor],
+        box_tlbr_norm_list: list,
+        fg_xy_norm_list: list,
+        bg_xy_norm_list: list,
+        mask_hint: int | None = None,
+        blank_promptless_output: bool = True,
+    ) -> tuple[Tensor, Tensor]:
+        """
+        Encode prompts & generate masks for the given image, re-using recent predictions when possible.
+        Equivalent to calling 'model.encode_prompts(...)' followed by 'model.generate_masks(...)'.
+        Only mask hints given as an index (or None) are supported, since hint tensors can't be cached.
+
+        Returns:
+            mask_predictions, iou_predictions
+        """
+
+        # Make sure we don't re-use predictions from other images
+        self.set_image(encoded_image_features_list)
+
+        # Use cached predictions if possible
+        prompts_key = self.make_key(box_tlbr_norm_list, fg_xy_norm_list, bg_xy_norm_list)
+        key = (prompts_key, mask_hint, blank_promptless_output)
+        cached_result = self._predictions_lut.get(key, None)
+        if cached_result is not None:
+            self._predictions_lut.move_to_end(key)
+            self.hits += 1
+            return cached_result
+
+        # If we get here, we need to run the model
+        self.misses += 1
+        encoded_prompts = self.encode_prompts(model, box_tlbr_norm_list, fg_xy_norm_list, bg_xy_norm_list)
+        mask_preds, iou_preds = model.generate_masks(
+            encoded_image_features_list, encoded_prompts, mask_hint, blank_promptless_output
+        )
+        self._store(self._predictions_lut, key, (mask_preds, iou_preds))
+
+        return mask_preds, iou_preds
+
+    # .................................................................................................................
+
+    def make_key(self, box_tlbr_norm_list: list, fg_xy_norm_list: list, bg_xy_norm_list: list) -> tuple:
+        """Helper used to build a cache key from (quantized) prompt coordinates"""
+        return tuple(self._quantize(coords) for coords in (box_tlbr_norm_list, fg_xy_norm_list, bg_xy_norm_list))
+
+    # .................................................................................................................
+
+    def _quantize(self, coords) -> tuple | int:
+        """Helper used to convert (nested lists of) normalized coordinates into (nested tuples of) integers"""
+        if coords is None:
+            return tuple()
+        if hasattr(coords, "tolist"):
+            coords = coords.tolist()
+        if isinstance(coords, (list, tuple)):
+            return tuple(self._quantize(item) for item in coords)
+        return int(round(float(coords) * self._quant_steps))
+
+    # .................................................................................................................
+
+    def _dequantize(self, quantized_coords: tuple) -> list | float:
+        """Helper used to convert quantized coordinates back into (nested lists of) normalized coordinates"""
+        if isinstance(quantized_coords, tuple):
+            return [self._dequantize(item) for item in quantized_coords]
+        return quantized_coords / self._quant_steps
+
+    # .................................................................................................................
+
+    def _store(self, lut: OrderedDict, key: tuple, value) -> None:
+        """Helper used to store a value as most recently used, removing the oldest entries if needed"""
+        lut[key] = value
+        lut.move_to_end(key)
+        while len(lut) > self._max_entries:
+            lut.popitem(last=False)
+        return
+
+    # .................................................................................................................
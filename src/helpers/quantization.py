@@ -0,0 +1,134 @@
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.ao.quantization import QuantWrapper, get_default_qconfig, prepare, convert, quantize_dynamic
+
+# For type hints
+from numpy import ndarray
+from src.v2_sam.sam_v2_model import SAMV2Model
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Functions
+
+
+def quantize_samv2_model(model: SAMV2Model, calibration_func: callable | None = None) -> SAMV2Model:
+    """
+    Helper used to convert a SAMV2 model for (faster) int8 inference on CPU. The linear layers
+    of the image encoder (hiera blocks), mask decoder (cross-attention transformer & output MLPs)
+    and memory fusion model are dynamically quantized, which doesn't require any calibration.
+
+    If a calibration function is given, then the (plain) convolution layers of the image encoder
+    & mask decoder are also statically quantized. The calibration function should take the model
+    as an input and run it on a few representative images, so that activation ranges can be recorded.
+    The mask hint encoder is left as-is, since calibration is done without mask hints.
+
+    Note that the model is modified in-place and is moved to the cpu, using float32
+    (quantized layers don't support other devices or dtypes).
+
+    Returns:
+        quantized_model
+    """
+
+    model.to(device="cpu", dtype=torch.float32)
+    model.eval()
+
+    # Static quantization needs activation ranges, so must happen before other layers are quantized
+    if calibration_func is not None:
+        target_submodels = (model.image_encoder, model.mask_decoder)
+        excluded_submodels = (model.mask_decoder.maskhint_encoder,)
+        quantize_convs_static(model, target_submodels, calibration_func, excluded_submodels)
+
+    for submodel in (model.image_encoder, model.mask_decoder, model.memory_fusion):
+        if submodel is None:
+            continue
+        quantize_dynamic(submodel, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+    return model
+
+
+def quantize_convs_static(
+    model: nn.Module,
+    target_submodels: tuple[nn.Module],
+    calibration_func: callable,
+    excluded_submodels: tuple[nn.Module] = (),
+) -> None:
+    """
+    Helper used to statically quantize the convolution layers of the given parts of a model.
+    Each conv layer is wrapped, so that its inputs are quantized & outputs de-quantized,
+    which allows it to be mixed with the (non-quantized) layers around it.
+    Only layers that are plain nn.Conv2d are quantized, since subclasses
+    (with custom forward functions) aren't supported by the quantized conversion.
+
+    Layers inside of the excluded submodels are skipped. This should include any parts of the
+    model that don't run during calibration, since their activation ranges would never be recorded
+    (and the quantized layers would end up using meaningless scaling values).
+    """
+
+    qconfig = get_default_qconfig(torch.backends.quantized.engine)
+
+    # Wrap each conv layer (parents are gathered first, since we're modifying the model while iterating)
+    excluded_ids = set(id(module) for submodel in excluded_submodels for module in submodel.modules())
+    parents_list = [parent for submodel in target_submodels for parent in submodel.modules()]
+    parents_list = [parent for parent in parents_list if id(parent) not in excluded_ids]
+    for parent in parents_list:
+        for child_name, child in list(parent.named_children()):
+            if type(child) is nn.Conv2d:
+                wrapped_conv = QuantWrapper(child)
+                wrapped_conv.qconfig = qconfig
+                setattr(parent, child_name, wrapped_conv)
+
+    # Record activation ranges & convert the wrapped layers
+    prepare(model, inplace=True)
+    with torch.inference_mode():
+        calibration_func(model)
+    convert(model, inplace=True)
+
+    return
+
+
+def run_calibration_images(
+    model: SAMV2Model, image_paths: list[str], max_side_length=1024, use_square_sizing=False
+) -> None:
+    """
+    Helper used to run a model on a set of images (using a single center point prompt),
+    meant for recording activation ranges when calibrating quantized layers
+    """
+
+    for image_path in image_paths:
+        image_bgr = cv2.imread(str(image_path))
+        if image_bgr is None:
+            continue
+        encoded_img, _, _ = model.encode_image(image_bgr, max_side_length, use_square_sizing)
+        encoded_prompts = model.encode_prompts([], [(0.5, 0.5)], [])
+        model.generate_masks(encoded_img, encoded_prompts, mask_hint=None, blank_promptless_output=False)
+
+    return
+
+
+def get_box_prompt_from_mask(mask_uint8: ndarray) -> list:
+    """
+    Helper used to make a bounding box prompt (in normalized coordinates) around a mask.
+    Returns:
+        box_tlbr_norm_list (empty if the mask is blank)
+    """
+
+    ys, xs = np.nonzero(mask_uint8 > 127)
+    if len(xs) == 0:
+        return []
+
+    # Normalize by the last pixel index (clamped, so 1-pixel wide/tall masks don't divide by zero)
+    mask_h, mask_w = mask_uint8.shape[0:2]
+    x_scale, y_scale = max(1, mask_w - 1), max(1, mask_h - 1)
+    x1, x2 = float(xs.min()) / x_scale, float(xs.max()) / x_scale
+    y1, y2 = float(ys.min()) / y_scale, float(ys.max()) / y_scale
+
+    return [[(x1, y1), (x2, y2)]]
+
+
+def get_mask_iou(mask_a: ndarray, mask_b: ndarray) -> float:
+    """Helper used to compute the intersection-over-union of two binary masks (1.0 if both masks are blank)"""
+    union = np.count_nonzero(np.logical_or(mask_a, mask_b))
+    intersection = np.count_nonzero(np.logical_and(mask_a, mask_b))
+    return intersection / union if union > 0 else 1.0
@@ -1,13 +1,13 @@
 import os
 import os.path as osp
 import json
-import tarfile
-from io import BytesIO
 
 import cv2
 import numpy as np
 
 from .contours import pixelize_contours
+from .image_writer import AsyncImageWriter
+from .video_frame_writer import StreamingFramesWriter
 
 # For type hints
 from numpy import ndarray
@@ -24,8 +24,12 @@ def save_image_segmentation(
     is_inverted=False,
     yx_crop_slices: tuple[slice, slice] | None = None,
     base_save_folder: str | None = None,
+    image_writer: AsyncImageWriter | None = None,
 ) -> None:
-    """Helper used to handle saving of image segmentation results"""
+    """
+    Helper used to handle saving of image segmentation results
+    If an image writer is given, files are written in the background (without waiting)
+    """
 
     # Make sure we're only using valid contours!
     cleaned_contours_norm = remove_invalid_contours(mask_contours_norm)
@@ -84,12 +88,18 @@ def save_image_segmentation(
     for name, image_data in name_to_image_lut.items():
         if image_data is not None:
             save_file_path = osp.join(save_folder_path, f"{save_index}_{name}.png")
-            cv2.imwrite(save_file_path, image_data)
+            if image_writer is not None:
+                image_writer.write_image(save_file_path, image_data)
+            else:
+                cv2.imwrite(save_file_path, image_data)
 
     # Save all dictionary/json results
     for name, data_dict in name_to_dict_lut.items():
         if data_dict is not None:
-            save_json_data(save_folder_path, save_index, name, data_dict)
+            if image_writer is not None:
+                image_writer.submit(save_json_data, save_folder_path, save_index, name, data_dict)
+            else:
+                save_json_data(save_folder_path, save_index, name, data_dict)
 
     return
 
@@ -103,21 +113,23 @@ def save_video_frames(
     object_index: int,
     save_frames_dict: dict,
     base_save_folder: str | None = None,
+    frame_file_ext: str = ".png",
 ) -> str:
-    """Helper used to handle saving of video segmentation results. Returns save file pathing"""
+    """
+    Helper used to handle saving of video segmentation results. Returns save file pathing
+    Frames are expected to already be encoded (e.g. png encodings). Other mask storage formats
+    can be saved by encoding frames with 'encode_mask_bytes' and using a matching frame_file_ext
+    (e.g. '.rle.json' or '.bits.npz', see helpers/mask_storage.py)
 
-    # Get frame index range for file name
-    all_frame_idxs = list(save_frames_dict.keys())
-    min_frame_idx, max_frame_idx = min(all_frame_idxs), max(all_frame_idxs)
+    This requires all frames to be held in memory! For long videos, use the StreamingFramesWriter
+    (see helpers/video_frame_writer.py) to save frames as they're produced instead
+    """
 
     # Save tarfile containing all frames
-    file_name = f"{save_index}_obj{1+object_index}_{min_frame_idx}_to_{max_frame_idx}_frames.tar"
-    save_file_path = os.path.join(save_folder_path, file_name)
-    with tarfile.open(save_file_path, "w") as tar:
+    with StreamingFramesWriter(save_folder_path, save_index, object_index, frame_file_ext) as writer:
         for frame_idx, png_encoding in save_frames_dict.items():
-            tarinfo = tarfile.TarInfo(name=f"{frame_idx:0>8}.png")
-            tarinfo.size = len(png_encoding)
-            tar.addfile(tarinfo, BytesIO(png_encoding.tobytes()))
+            writer.add_frame(frame_idx, png_encoding)
+    save_file_path = writer.get_save_paths()[0]
 
     return save_file_path
 
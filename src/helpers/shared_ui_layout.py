@@ -1,4 +1,6 @@
 from dataclasses import dataclass
+from collections import OrderedDict
+from threading import Thread
 
 from src.ui.window import KEY
 from src.ui.layout import HStack, VStack, OverlayStack
@@ -7,6 +9,7 @@ from src.ui.overlays import HoverOverlay, BoxSelectOverlay, PointSelectOverlay,
 from src.ui.images import ExpandingImage
 from src.ui.base import force_same_max_height, force_same_min_height
 from src.ui.helpers.images import CheckerPattern, blank_mask
+from src.helpers.mask_upscale import MaskUpscaler
 
 import cv2
 import numpy as np
@@ -259,6 +262,7 @@ class BaseUIControl:
     def __init__(self, ui_elements: PromptUI):
         self.elems = ui_elements
         self._checker_pattern = CheckerPattern()
+        self._mask_upscaler = MaskUpscaler()
 
     # .................................................................................................................
 
@@ -305,11 +309,13 @@ class BaseUIControl:
 
     # .................................................................................................................
 
-    @staticmethod
-    def create_hires_mask_uint8(mask_predictions, mask_select_index, output_hw, mask_threshold=0.0) -> ndarray:
-        """Draws binary mask matching the given output height & width. Returns: mask_uint8_1ch"""
-        mask_select = mask_predictions[:, mask_select_index].float()
-        return make_hires_mask_uint8(mask_select, output_hw, mask_threshold).squeeze(0)
+    def create_hires_mask_uint8(self, mask_predictions, mask_select_index, output_hw, mask_threshold=0.0) -> ndarray:
+        """
+        Draws binary mask matching the given output height & width. Returns: mask_uint8_1ch
+        -> The result is over-written on the next call (it must be copied if it needs to be kept)
+        """
+        mask_select = mask_predictions[0, mask_select_index]
+        return self._mask_upscaler.upscale(mask_select, output_hw, mask_threshold)
 
     # .................................................................................................................
 
@@ -363,6 +369,30 @@ class PromptUIControl(BaseUIControl):
 
     # .................................................................................................................
 
+    def attach_viewport_callbacks(self, window: DisplayWindow, viewport):
+        """
+        Helper used to attach keypress callbacks for zooming in/out (z/x) & panning (w/a/s/d) the image.
+        Zooming in is centered on the hovered point (when using the hover tool)
+        """
+
+        window.attach_keypress_callback("z", lambda: viewport.zoom(1, self.get_hover_xy_norm()))
+        window.attach_keypress_callback("x", lambda: viewport.zoom(-1))
+        window.attach_keypress_callback("w", lambda: viewport.pan(0, -0.5))
+        window.attach_keypress_callback("a", lambda: viewport.pan(-0.5, 0))
+        window.attach_keypress_callback("s", lambda: viewport.pan(0, 0.5))
+        window.attach_keypress_callback("d", lambda: viewport.pan(0.5, 0))
+
+        return self
+
+    # .................................................................................................................
+
+    def get_hover_xy_norm(self) -> tuple[float, float] | None:
+        """Helper used to get the (normalized) hover position on the main image. Returns None if not hovering"""
+        hover_xy_event = self.elems.olays.hover.get_event_xy()
+        return hover_xy_event.xy_norm if hover_xy_event.is_in_region else None
+
+    # .................................................................................................................
+
     def read_prompts(self) -> tuple[bool, list, list, list]:
         """
         Helper used to manage prompt reading, as well as quality-of-life behaviors when interpretting prompts
@@ -387,14 +417,26 @@ class ReusableBaseImage:
     This can help reduce cpu load since we avoid using
     (and repeatedly downscaling) the original image which may
     be much larger/heavier to work with!
+
+    An image pyramid (repeated half-sized copies of the original) is built once,
+    so that display images can be made by resizing the nearest (larger) pyramid level,
+    rather than the full original. The pyramid can optionally be built on a background
+    thread, in which case the original image is used until the pyramid is ready.
     """
 
     # .................................................................................................................
 
-    def __init__(self, full_image_bgr: ndarray):
+    def __init__(self, full_image_bgr: ndarray, min_side_length=256, max_cached_sizes=4, build_in_background=False):
+
+        # Store pyramid/cache settings
+        self._min_side_length = min_side_length
+        self._max_cached_sizes = max(1, max_cached_sizes)
+        self._build_in_background = build_in_background
 
         # Initialize state values
-        self._full_img = self._disp_img = self._prev_h = self._prev_w = None
+        self._full_img = None
+        self._pyramid_list = []
+        self._disp_cache = OrderedDict()
         self.set_new_image(full_image_bgr)
 
     def set_new_image(self, new_image_bgr: ndarray):
@@ -404,21 +446,60 @@ class ReusableBaseImage:
         """
 
         self._full_img = new_image_bgr
-        self._disp_img = new_image_bgr.copy()
-        self._prev_h, self._prev_w = new_image_bgr.shape[0:2]
+        self._disp_cache.clear()
+
+        # Start new pyramid with the original image, then fill in smaller levels
+        # -> Each image gets its own list, so an in-progress (background) build of an old image can't interfere
+        self._pyramid_list = [new_image_bgr]
+        if self._build_in_background:
+            Thread(target=self._build_pyramid, args=(self._pyramid_list,), daemon=True).start()
+        else:
+            self._build_pyramid(self._pyramid_list)
 
         return self
 
     def regenerate(self, new_display_hw):
         """Resizes the original input image to the given display size or re-uses a cached copy at the given size"""
 
-        # Resize original image to given display size and store for re-use
+        # Re-use existing display image if possible
         disp_h, disp_w = new_display_hw
-        if disp_h != self._prev_h or disp_w != self._prev_w:
-            self._disp_img = cv2.resize(self._full_img, dsize=(disp_w, disp_h))
-            prev_disp_h, prev_disp_w = self._disp_img.shape[0:2]
+        cache_key = (disp_h, disp_w)
+        disp_img = self._disp_cache.get(cache_key, None)
+        if disp_img is not None:
+            self._disp_cache.move_to_end(cache_key)
+            return disp_img
+
+        # Resize from the smallest pyramid level that is still at least as large as the display size
+        # -> Pyramid is ordered largest-to-smallest, and levels may still be added by a background build
+        src_img = self._full_img
+        for level_img in tuple(self._pyramid_list):
+            level_h, level_w = level_img.shape[0:2]
+            if level_h < disp_h or level_w < disp_w:
+                break
+            src_img = level_img
+
+        # Use area-averaging when downscaling, since it gives cleaner results
+        src_h, src_w = src_img.shape[0:2]
+        is_downscaling = disp_h < src_h and disp_w < src_w
+        interpolation = cv2.INTER_AREA if is_downscaling else cv2.INTER_LINEAR
+        disp_img = cv2.resize(src_img, dsize=(disp_w, disp_h), interpolation=interpolation)
+
+        # Store result for re-use, removing the least recently used size if needed
+        self._disp_cache[cache_key] = disp_img
+        while len(self._disp_cache) > self._max_cached_sizes:
+            self._disp_cache.popitem(last=False)
+
+        return disp_img
+
+    def _build_pyramid(self, pyramid_list: list[ndarray]) -> None:
+        """Helper used to fill in the (half-sized) pyramid levels below the original image"""
+
+        level_img = pyramid_list[0]
+        while min(level_img.shape[0:2]) >= 2 * self._min_side_length:
+            level_img = cv2.pyrDown(level_img)
+            pyramid_list.append(level_img)
 
-        return self._disp_img
+        return
 
     # .................................................................................................................
 
@@ -541,8 +622,9 @@ def update_mask_preview_buttons(
     Returns nothing!
     """
 
-    # Update mask selection images
-    mask_preds_uint8 = ((mask_predictions.squeeze(0) > mask_threshold) * 255).byte().cpu().numpy()
+    # Update mask selection images (thresholding before copying to the cpu, to keep data transfer small)
+    mask_preds_bool = (mask_predictions.squeeze(0) > mask_threshold).cpu().numpy()
+    mask_preds_uint8 = mask_preds_bool.view(np.uint8) * np.uint8(255)
     for pred_idx, (mpred_uint8, mbtn) in enumerate(zip(mask_preds_uint8, mask_buttons)):
         mbtn.set_image(mpred_uint8 if not invert_mask else np.bitwise_not(mpred_uint8))
 
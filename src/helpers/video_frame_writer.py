@@ -0,0 +1,122 @@
+import os
+import os.path as osp
+import uuid
+import tarfile
+from io import BytesIO
+
+# For type hints
+from numpy import ndarray
+
+
+class StreamingFramesWriter:
+    """
+    Helper used to save (encoded) video segmentation frames into tar archives as they
+    are produced, so that long tracks don't need to hold every frame in memory.
+
+    Frames are written into a temporary archive, which is renamed once closed to
+    include the range of frame indices it contains, for example:
+        "{save_index}_obj1_{min_frame_idx}_to_{max_frame_idx}_frames.tar"
+
+    If 'max_frames_per_archive' is given, the output is split into several archives
+    (shards), each holding up to that many frames and named by its own frame range.
+
+    Example usage:
+
+        with StreamingFramesWriter(save_folder, save_index, object_index) as writer:
+            for frame_idx, mask_uint8 in ...:
+                ok_encode, png_encoding = cv2.imencode(".png", mask_uint8)
+                writer.add_frame(frame_idx, png_encoding)
+        print("Saved:", writer.get_save_paths())
+    """
+
+    # .................................................................................................................
+
+    def __init__(
+        self,
+        save_folder_path: str,
+        save_index: str,
+        object_index: int,
+        frame_file_ext: str = ".png",
+        max_frames_per_archive: int | None = None,
+    ):
+
+        # Store naming info
+        self._save_folder_path = save_folder_path
+        self._name_prefix = f"{save_index}_obj{1+object_index}"
+        self._frame_file_ext = frame_file_ext
+        self._max_frames_per_archive = max_frames_per_archive
+
+        # Storage for the archive currently being written & the paths of completed archives
+        self._tar = None
+        self._temp_path = None
+        self._frame_idxs = []
+        self._save_paths_list = []
+
+    # .................................................................................................................
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # .................................................................................................................
+
+    def add_frame(self, frame_idx: int, encoded_frame: ndarray | bytes) -> None:
+        """Append an (already encoded) frame to the output archive"""
+
+        # Start a new archive if needed
+        # -> Temp file is uniquely named, so other writers (or files left by a crash) aren't written into
+        if self._tar is None:
+            temp_name = f"{self._name_prefix}_frames.{uuid.uuid4().hex[:12]}.tar.partial"
+            self._temp_path = osp.join(self._save_folder_path, temp_name)
+            self._tar = tarfile.open(self._temp_path, "w")
+            self._frame_idxs = []
+
+        # Write frame data directly into the archive
+        frame_bytes = bytes(encoded_frame)
+        tarinfo = tarfile.TarInfo(name=f"{frame_idx:0>8}{self._frame_file_ext}")
+        tarinfo.size = len(frame_bytes)
+        self._tar.addfile(tarinfo, BytesIO(frame_bytes))
+        self._frame_idxs.append(frame_idx)
+
+        # Finish the archive if it's full, so that following frames start a new archive
+        is_full = self._max_frames_per_archive is not None and len(self._frame_idxs) >= self._max_frames_per_archive
+        if is_full:
+            self._finish_archive()
+
+        return
+
+    # .................................................................................................................
+
+    def close(self) -> list[str]:
+        """Finish writing & name the final archive. Returns: list of saved archive paths"""
+        self._finish_archive()
+        return self.get_save_paths()
+
+    # .................................................................................................................
+
+    def get_save_paths(self) -> list[str]:
+        """Returns the paths of all completed archives"""
+        return list(self._save_paths_list)
+
+    # .................................................................................................................
+
+    def _finish_archive(self) -> None:
+        """Helper used to close the current archive & rename it based on the frame index range it contains"""
+
+        if self._tar is None:
+            return
+        self._tar.close()
+        self._tar = None
+
+        # Rename archive to include the range of frames
+        min_frame_idx, max_frame_idx = min(self._frame_idxs), max(self._frame_idxs)
+        file_name = f"{self._name_prefix}_{min_frame_idx}_to_{max_frame_idx}_frames.tar"
+        save_file_path = osp.join(self._save_folder_path, file_name)
+        os.replace(self._temp_path, save_file_path)
+        self._save_paths_list.append(save_file_path)
+
+        return
+
+    # .................................................................................................................
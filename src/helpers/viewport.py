@@ -0,0 +1,257 @@
+from collections import OrderedDict
+
+import numpy as np
+
+# For type hints
+from numpy import ndarray
+from torch import Tensor
+
+
+class ImageViewport:
+    """
+    Helper used to manage a zoomed-in region (viewport) of a large image, so that
+    labeling can be done at a higher resolution than is possible when the full
+    image is squashed down to the size of the image encoder input.
+
+    The visible region is given as a 'tile' bounding box, in full-resolution pixel
+    coordinates. Zoom steps scale the tile down by the zoom factor on each step,
+    while keeping the aspect ratio of the full image (so the display layout doesn't change).
+    Changes are reported through 'read', following the other UI elements:
+
+        viewport = ImageViewport(full_image.shape, zoom_factor=2)
+        viewport.zoom(1, xy_norm=(0.25, 0.75))
+        is_changed, (x1, y1, x2, y2) = viewport.read()
+        if is_changed:
+            tile_image = viewport.crop(full_image)
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, full_image_shape: tuple[int, int], zoom_factor=2.0, max_zoom_steps=4, min_tile_side=256):
+
+        # Store sizing settings
+        self._full_h, self._full_w = full_image_shape[0:2]
+        self._zoom_factor = max(1.01, zoom_factor)
+        self._max_zoom_steps = max(0, max_zoom_steps)
+        self._min_tile_side = min_tile_side
+
+        # Storage for viewport state (center is in normalized full-image coordinates)
+        self._zoom_steps = 0
+        self._center_xy_norm = (0.5, 0.5)
+        self._is_changed = False
+
+    # .................................................................................................................
+
+    def __repr__(self):
+        name = self.__class__.__name__
+        return f"{name}(zoom_steps={self._zoom_steps}, tile_xyxy={self.get_tile_xyxy()})"
+
+    # .................................................................................................................
+
+    def read(self) -> tuple[bool, tuple[int, int, int, int]]:
+        """Returns: is_changed, tile_xyxy_px"""
+        is_changed = self._is_changed
+        self._is_changed = False
+        return is_changed, self.get_tile_xyxy()
+
+    # .................................................................................................................
+
+    def is_zoomed(self) -> bool:
+        """Check whether the viewport is showing less than the full image"""
+        return self._zoom_steps > 0
+
+    # .................................................................................................................
+
+    def get_tile_xyxy(self) -> tuple[int, int, int, int]:
+        """Get the visible region of the full image, in pixel coordinates. Returns: (x1, y1, x2, y2)"""
+
+        if self._zoom_steps == 0:
+            return (0, 0, self._full_w, self._full_h)
+
+        # Figure out tile sizing, while keeping the full image aspect ratio
+        scale = self._zoom_factor**self._zoom_steps
+        tile_w = max(1, min(self._full_w, round(self._full_w / scale)))
+        tile_h = max(1, min(self._full_h, round(self._full_h / scale)))
+
+        # Position tile around the center point, but keep it inside the image
+        center_x_norm, center_y_norm = self._center_xy_norm
+        x1 = min(max(0, round(center_x_norm * self._full_w - tile_w / 2)), self._full_w - tile_w)
+        y1 = min(max(0, round(center_y_norm * self._full_h - tile_h / 2)), self._full_h - tile_h)
+
+        return (x1, y1, x1 + tile_w, y1 + tile_h)
+
+    # .................................................................................................................
+
+    def zoom(self, num_steps: int, xy_norm: tuple[float, float] | None = None):
+        """
+        Zoom in (positive steps) or out (negative steps). If a point is given, in normalized
+        coordinates relative to the currently visible tile, the viewport is centered on it
+        """
+
+        # Re-center on the given point before zooming
+        if xy_norm is not None and num_steps > 0:
+            self._center_xy_norm = self.tile_to_full_xy_norm(xy_norm)
+
+        # Limit zooming, so that tiles don't get smaller than the encoder can make use of
+        new_steps = min(max(0, self._zoom_steps + num_steps), self._max_zoom_steps)
+        while new_steps > 0:
+            min_side = min(self._full_h, self._full_w) / (self._zoom_factor**new_steps)
+            if min_side >= self._min_tile_side:
+                break
+            new_steps -= 1
+
+        self._is_changed |= new_steps != self._zoom_steps
+        self._zoom_steps = new_steps
+        if new_steps == 0:
+            self._center_xy_norm = (0.5, 0.5)
+
+        return self
+
+    # .................................................................................................................
+
+    def pan(self, dx_tiles: float, dy_tiles: float):
+        """Move the viewport by the given amount, in units of the visible tile size (e.g. 0.5 moves half a tile)"""
+
+        # Panning only makes sense when zoomed in
+        if not self.is_zoomed():
+            return self
+
+        # Move center, but keep it where the tile can actually be placed (so panning back is immediate)
+        old_xyxy = self.get_tile_xyxy()
+        x1, y1, x2, y2 = old_xyxy
+        half_w_norm, half_h_norm = 0.5 * (x2 - x1) / self._full_w, 0.5 * (y2 - y1) / self._full_h
+        center_x_norm = (x1 + x2) / (2 * self._full_w) + dx_tiles * 2 * half_w_norm
+        center_y_norm = (y1 + y2) / (2 * self._full_h) + dy_tiles * 2 * half_h_norm
+        center_x_norm = min(max(half_w_norm, center_x_norm), 1 - half_w_norm)
+        center_y_norm = min(max(half_h_norm, center_y_norm), 1 - half_h_norm)
+        self._center_xy_norm = (center_x_norm, center_y_norm)
+        self._is_changed |= self.get_tile_xyxy() != old_xyxy
+
+        return self
+
+    # .................................................................................................................
+
+    def reset(self):
+        """Zoom all the way out, to show the full image"""
+        self._is_changed |= self._zoom_steps != 0
+        self._zoom_steps = 0
+        self._center_xy_norm = (0.5, 0.5)
+        return self
+
+    # .................................................................................................................
+
+    def tile_to_full_xy_norm(self, xy_norm: tuple[float, float]) -> tuple[float, float]:
+        """Helper used to convert normalized coordinates within the visible tile into full-image coordinates"""
+        x1, y1, x2, y2 = self.get_tile_xyxy()
+        x_norm, y_norm = xy_norm
+        return ((x1 + x_norm * (x2 - x1)) / self._full_w, (y1 + y_norm * (y2 - y1)) / self._full_h)
+
+    # .................................................................................................................
+
+    def crop(self, full_image: ndarray) -> ndarray:
+        """Get the visible tile from the full image (as a view, not a copy)"""
+        x1, y1, x2, y2 = self.get_tile_xyxy()
+        return full_image[y1:y2, x1:x2]
+
+    # .................................................................................................................
+
+    def make_full_mask(self) -> ndarray:
+        """Helper used to make a blank full-resolution mask, for collecting the masks of several tiles"""
+        return np.zeros((self._full_h, self._full_w), dtype=np.uint8)
+
+    # .................................................................................................................
+
+    def merge_mask(
+        self, full_mask_uint8: ndarray, tile_mask_uint8: ndarray, tile_xyxy: tuple[int, int, int, int] | None = None
+    ) -> ndarray:
+        """
+        Helper used to combine (union) a mask of a tile into a full-resolution mask, in-place,
+        so that labeling done in one tile isn't lost when moving to another tile. The tile mask
+        must be made at the full-resolution tile size, since re-sizing would give a blocky mask.
+        Uses the visible tile if a tile bounding box isn't given.
+        Returns:
+            full_mask_uint8
+        """
+
+        x1, y1, x2, y2 = self.get_tile_xyxy() if tile_xyxy is None else tile_xyxy
+        full_region = full_mask_uint8[y1:y2, x1:x2]
+        if tuple(tile_mask_uint8.shape[0:2]) != tuple(full_region.shape[0:2]):
+            raise ValueError(f"Tile mask shape {tile_mask_uint8.shape} does not match tile size {full_region.shape}")
+        np.maximum(full_region, tile_mask_uint8, out=full_region)
+
+        return full_mask_uint8
+
+    # .................................................................................................................
+
+
+class TileEncodingCache:
+    """
+    Helper used to hold recent image encodings of zoomed-in tiles in memory, so that
+    moving back-and-forth between tiles (or zoom levels) doesn't require re-encoding.
+    Entries are keyed on the image (e.g. its file path), the tile bounding box and the
+    encoder settings key (e.g. the max. side length, which sets the scale of the encoding).
+
+    Example usage:
+
+        tile_cache = TileEncodingCache(lambda img: model.encode_image(img, 1024), encoder_key=1024)
+        encoded_img, patch_grid_hw, preencoded_hw = tile_cache.encode_tile(image_path, full_image, tile_xyxy)
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, encode_func: callable, max_entries=8, encoder_key=None):
+
+        # Store cache settings
+        self._encode_func = encode_func
+        self._max_entries = max(1, max_entries)
+        self._encoder_key = encoder_key
+
+        # Storage for cached results, ordered from least-to-most recently used
+        self._encodings_lut: OrderedDict[tuple, tuple[list[Tensor], tuple, tuple]] = OrderedDict()
+
+        # Storage for hit/miss counters
+        self.hits = 0
+        self.misses = 0
+
+    # .................................................................................................................
+
+    def __repr__(self):
+        name = self.__class__.__name__
+        return f"{name}(entries={len(self._encodings_lut)}, hits={self.hits}, misses={self.misses})"
+
+    # .................................................................................................................
+
+    def encode_tile(
+        self, image_key, full_image: ndarray, tile_xyxy: tuple[int, int, int, int]
+    ) -> tuple[list[Tensor], tuple[int, int], tuple[int, int]]:
+        """
+        Encode the given tile of the full image, re-using a recent result if possible.
+        Returns:
+            encoded_images_list, patch_grid_hw, preencoded_image_hw
+        """
+
+        key = (str(image_key), tuple(tile_xyxy), self._encoder_key)
+        encoding_result = self._encodings_lut.get(key, None)
+        if encoding_result is not None:
+            self._encodings_lut.move_to_end(key)
+            self.hits += 1
+            return encoding_result
+
+        # If we get here, we need to run the model
+        self.misses += 1
+        x1, y1, x2, y2 = tile_xyxy
+        encoding_result = self._encode_func(np.ascontiguousarray(full_image[y1:y2, x1:x2]))
+        self._encodings_lut[key] = encoding_result
+        while len(self._encodings_lut) > self._max_entries:
+            self._encodings_lut.popitem(last=False)
+
+        return encoding_result
+
+    # .................................................................................................................
+
+    def clear(self):
+        """Remove all cached encodings"""
+        self._encodings_lut.clear()
+        return self
+
+    # .................................................................................................................
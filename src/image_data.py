@@ -1,77 +1,329 @@
 """Module that manages the image and their corresponding segmentation masks."""
 from tqdm import tqdm
 import cv2
+import csv
+import json
 import os
 import random
+import tempfile
 
 import numpy as np
 import numpy.typing as npt
 from pathlib import Path
-from dataclasses import dataclass
+from threading import Lock, Thread, Event
+from dataclasses import dataclass, field
+
+from src.image_status import ImageStatusIndex
+from src.helpers.image_writer import AsyncImageWriter
+from src.helpers.mask_storage import get_mask_file_name, get_image_name_from_mask_file, save_mask_file, load_mask_file
 
 @dataclass
 class ImageData:
-    """Class to manage the images and the segmentation masks."""
+    """
+    Class to manage the images and the segmentation masks.
+
+    The image folder is scanned once (on creation) to build a sorted index of the images,
+    while the labeled state of each image is tracked in memory and updated as masks are saved.
+    When 'use_manifest' is enabled, the index is also stored in the storage folder, so that
+    later sessions can skip scanning the image and mask folders entirely (useful with very
+    large datasets or network storage). Use 'refresh_index' to re-scan after adding images.
+
+    When an 'annotator_id' is given, images are instead handed out through a status index
+    shared by every annotator working on the same storage folder. Each annotator claims
+    'claim_size' images at a time (in sorted or random order), so several labeling sessions
+    can run at once without labeling the same images. Images are only claimed by calling
+    'claim_next', the other functions just report on the claimed images. Claims expire after
+    'lease_sec' seconds, but are renewed on a background thread until they're released (see 'close'),
+    so images stay claimed no matter how long it takes to label them.
+
+    When an 'image_writer' is given, masks are written to disk in the background.
+    Masks are stored as images by default, but can instead use a compact 'rle' or 'packbits'
+    'mask_format' (see helpers/mask_storage.py), which is much smaller and faster to load.
+    """
 
     storage_path: str | None = None
     video_path: str | None = None
+    use_manifest: bool = False
+    annotator_id: str | None = None
+    lease_sec: float = 900.0
+    claim_size: int = 4
+    random_order: bool = False
+    image_writer: AsyncImageWriter | None = None
+    mask_format: str = 'image'
+
+    # Index of image names (sorted) and the names of images that have a mask
+    _image_names: list[str] = field(default_factory=list, init=False, repr=False)
+    _labeled_names: set[str] = field(default_factory=set, init=False, repr=False)
+    _next_idx: int = field(default=0, init=False, repr=False)
+    _lock: Lock = field(default_factory=Lock, init=False, repr=False)
+
+    # Shared status index & images claimed from it (only used with an annotator id)
+    _status: ImageStatusIndex | None = field(default=None, init=False, repr=False)
+    _claimed_names: list[str] = field(default_factory=list, init=False, repr=False)
+    _renew_thread: Thread | None = field(default=None, init=False, repr=False)
+    _renew_stop: Event = field(default_factory=Event, init=False, repr=False)
+
+    # Names of the manifest files: the image index and an append-only log of labeled images
+    manifest_name = 'manifest.json'
+    labeled_log_name = 'manifest_labeled.txt'
+    status_db_name = 'status.sqlite3'
+
+    def __post_init__(self):
+
+        # Load the index from the manifest if possible, otherwise scan the folders
+        is_loaded = self.use_manifest and self._load_manifest()
+        if not is_loaded:
+            self.refresh_index()
+
+        # Register the images with the shared status index, so they can be claimed by annotators
+        if self.annotator_id is not None:
+            db_path = Path(self.storage_path) / self.status_db_name
+            self._status = ImageStatusIndex(db_path, self.annotator_id, self.lease_sec)
+            self._status.sync(self._image_names, self._labeled_names)
+
+            # Keep the leases on claimed images alive, for as long as they're being labeled
+            self._renew_thread = Thread(target=self._renew_claims, daemon=True)
+            self._renew_thread.start()
+
+
+    def refresh_index(self) -> None:
+        """Scan the image and mask folders to rebuild the index (and manifest, if enabled)."""
+
+        with self._lock:
+            self._image_names = sorted(os.listdir(Path(self.storage_path) / 'images'))
+            mask_names = os.listdir(Path(self.storage_path) / 'masks')
+            self._labeled_names = set(get_image_name_from_mask_file(name) for name in mask_names
+                                      if not name.endswith('.tmp'))
+            self._next_idx = 0
+            self._advance_next_idx()
+
+            if self.use_manifest:
+                self._save_manifest()
+
 
     def saved_masks(self) -> int:
         """Returns the number of segmentation masks created"""
 
-        masks = Path(self.storage_path) / 'masks'
-        return len(os.listdir(masks))
+        if self._status is not None:
+            return self._status.count(ImageStatusIndex.LABELED)
+        return len(self._labeled_names)
 
     def saved_images(self) -> int:
         """Returns the number of images created"""
 
-        images = Path(self.storage_path) / 'images'
-        return len(os.listdir(images))
+        return len(self._image_names)
 
 
-    def current_image(self) -> npt.NDArray[np.uint8]:
-        """Extract the current image to perform segmentation."""
+    def claim_next(self) -> bool:
+        """
+        Claim more images from the shared status index, once all claimed images are labeled.
+        Without a status index, this only checks for remaining images. Returns: True if there are images to label
+        """
+
+        if self._status is not None:
+            with self._lock:
+                if len(self._claimed_names) == 0:
+                    self._claimed_names = self._status.claim(self.claim_size, self.random_order)
+
+        return not self.is_finished()
+
+
+    def current_image_path(self) -> Path:
+        """Returns the path to the current image to perform segmentation (see 'claim_next' with a status index)."""
+
+        # The current image is the first claimed image or the first image (in sorted order) without a mask
+        directory = Path(self.storage_path) / 'images'
+        if self._status is not None:
+            with self._lock:
+                return directory / self._claimed_names[0]
+        return directory / self._image_names[self._next_idx]
 
-        # Extract the paths to the images
+
+    def upcoming_image_paths(self) -> list[Path]:
+        """Returns the paths to the current and all following images, in labeling order."""
+
+        # With a shared status index, only the claimed images are known ahead of time
         directory = Path(self.storage_path) / 'images'
-        image_names = sorted(os.listdir(directory))
+        if self._status is not None:
+            with self._lock:
+                return [directory / name for name in self._claimed_names]
+        return [directory / name for name in self.unlabeled_image_names()]
 
-        # Initialize the path to the current image
-        current_idx = self.saved_masks()
-        image_path = directory / image_names[current_idx]
+
+    def current_image(self) -> npt.NDArray[np.uint8]:
+        """Extract the current image to perform segmentation."""
 
         # Extract and return the image using opencv
-        return cv2.imread(image_path)
+        return cv2.imread(self.current_image_path())
 
 
     def is_finished(self) -> bool:
-        """Check whether all the images in the dataset are labeled."""
+        """Check whether all the images in the dataset (or all claimed images, with a status index) are labeled."""
 
-        image_path = Path(self.storage_path) / 'images'
-        current_idx = self.saved_masks()
-        return current_idx == len(os.listdir(image_path))
+        if self._status is not None:
+            with self._lock:
+                return len(self._claimed_names) == 0
+        return self._next_idx >= len(self._image_names)
 
 
-    def save_mask(self, mask: npt.NDArray[np.uint8]):
-        """Save the segmentation mask of the current image."""
+    def unlabeled_image_names(self) -> list[str]:
+        """Returns the names of all images that don't have a segmentation mask yet."""
+
+        # Images before the current index are all labeled, so only check the following images
+        following_names = self._image_names[self._next_idx:]
+        return [name for name in following_names if name not in self._labeled_names]
+
+
+    def load_image(self, image_name: str) -> npt.NDArray[np.uint8]:
+        """Extract an image from the dataset by name."""
+
+        image_path = Path(self.storage_path) / 'images' / image_name
+        return cv2.imread(image_path)
+
+
+    def load_mask(self, image_name: str) -> npt.NDArray[np.uint8] | None:
+        """Extract the saved segmentation mask of an image by name, in any storage format (None if missing)."""
+
+        mask_directory = Path(self.storage_path) / 'masks'
+        for mask_format in ('image', 'rle', 'packbits'):
+            mask_path = mask_directory / get_mask_file_name(image_name, mask_format)
+            if mask_path.exists():
+                return load_mask_file(mask_path)
+
+        return None
+
+
+    def load_metadata(self) -> dict[str, str]:
+        """Returns the class of each image, as listed in the metadata.csv file (if present)."""
+
+        # Return no classes if the dataset doesn't have metadata
+        metadata_path = Path(self.storage_path) / 'metadata.csv'
+        if not metadata_path.exists():
+            return {}
+
+        # Map each image name to its class
+        with open(metadata_path, 'r', newline='') as infile:
+            reader = csv.DictReader(infile, skipinitialspace=True)
+            return {row['image_name'].strip(): row['class'].strip() for row in reader}
+
+
+    def save_mask(self, mask: npt.NDArray[np.uint8], image_name: str | None = None):
+        """Save the segmentation mask of the given image (or the current image, if no name is given)."""
+
+        # Extract the name of the current image, if needed
+        if image_name is None:
+            image_name = self.current_image_path().name
+
+        # Save the mask with the same name (plus a suffix for compact formats)
+        mask_path = Path(self.storage_path) / "masks" / get_mask_file_name(image_name, self.mask_format)
+        if self.mask_format == 'image' and self.image_writer is not None:
+            self.image_writer.write_image(mask_path, mask)
+        elif self.mask_format == 'image':
+            cv2.imwrite(mask_path, mask)
+        elif self.image_writer is not None:
+            self.image_writer.submit(save_mask_file, mask_path, np.copy(mask), self.mask_format)
+        else:
+            save_mask_file(mask_path, mask, self.mask_format)
+
+        # Mark the image as labeled and move on to the next unlabeled image
+        with self._lock:
+            is_new_label = image_name not in self._labeled_names
+            self._labeled_names.add(image_name)
+            self._advance_next_idx()
+
+            # Record newly labeled images in the manifest log
+            if is_new_label and self.use_manifest:
+                with open(Path(self.storage_path) / self.labeled_log_name, 'a') as outfile:
+                    outfile.write(f"{image_name}\n")
+
+            # Update the shared status & keep the claims on our remaining images alive
+            if self._status is not None:
+                self._status.mark_labeled(image_name)
+                if image_name in self._claimed_names:
+                    self._claimed_names.remove(image_name)
+                self._claimed_names = self._status.renew(self._claimed_names)
+
+
+    def release_claims(self) -> None:
+        """Give up any claimed (but unlabeled) images, so other annotators can label them."""
+
+        if self._status is not None:
+            with self._lock:
+                self._status.release(self._claimed_names)
+                self._claimed_names = []
+
+
+    def close(self) -> None:
+        """Give up any claimed images & stop renewing claims (if using a status index)."""
+
+        self._renew_stop.set()
+        if self._renew_thread is not None:
+            self._renew_thread.join()
+            self._renew_thread = None
+        self.release_claims()
+
+
+    def _renew_claims(self) -> None:
+        """Function run on a background thread, which renews the leases on claimed images until stopped."""
+
+        renew_period_sec = max(1.0, self.lease_sec / 3)
+        while not self._renew_stop.wait(renew_period_sec):
+            with self._lock:
+                if len(self._claimed_names) > 0:
+                    self._claimed_names = self._status.renew(self._claimed_names)
+
+
+    def _advance_next_idx(self) -> None:
+        """Helper used to move the current image index past any labeled images."""
+
+        while self._next_idx < len(self._image_names) and self._image_names[self._next_idx] in self._labeled_names:
+            self._next_idx += 1
 
-        # Extract the paths and names of the images
-        directory = Path(self.storage_path) / 'images'
-        image_names = sorted(os.listdir(directory))
 
-        # Extract the name of the corresponding image
-        current_idx = self.saved_masks()
-        image_name = image_names[current_idx]
+    def _load_manifest(self) -> bool:
+        """Helper used to load the index from the manifest files. Returns: True if the manifest was loaded"""
 
-        # Save the mask with the same name
-        mask_path = Path(self.storage_path) / "masks"
-        cv2.imwrite(mask_path/image_name, mask)
+        manifest_path = Path(self.storage_path) / self.manifest_name
+        labeled_log_path = Path(self.storage_path) / self.labeled_log_name
+        try:
+            with open(manifest_path, 'r') as infile:
+                image_names = json.load(infile)['images']
+            with open(labeled_log_path, 'r') as infile:
+                labeled_names = set(line.strip() for line in infile if line.strip() != '')
+        except (FileNotFoundError, KeyError, json.JSONDecodeError):
+            return False
 
+        with self._lock:
+            self._image_names = sorted(image_names)
+            self._labeled_names = labeled_names
+            self._next_idx = 0
+            self._advance_next_idx()
 
+        return True
 
 
+    def _save_manifest(self) -> None:
+        """Helper used to write the image index & labeled log, replacing any existing manifest."""
 
+        manifest_path = Path(self.storage_path) / self.manifest_name
+        labeled_log_path = Path(self.storage_path) / self.labeled_log_name
 
+        # Write to (uniquely named) temporary files first, so an interrupted write doesn't leave a broken manifest
+        # -> Unique names are needed, since several labeling sessions may share the same storage folder
+        self._write_file_atomic(labeled_log_path, ''.join(f"{name}\n" for name in sorted(self._labeled_names)))
+        self._write_file_atomic(manifest_path, json.dumps({'images': self._image_names}))
 
 
+    @staticmethod
+    def _write_file_atomic(file_path: Path, text: str) -> None:
+        """Helper used to write text to a temporary file & rename it into place, removing the temp file on failure."""
 
+        temp_fd, temp_path = tempfile.mkstemp(dir=file_path.parent, prefix=f"{file_path.name}.", suffix='.tmp')
+        try:
+            with os.fdopen(temp_fd, 'w') as outfile:
+                outfile.write(text)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
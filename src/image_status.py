@@ -0,0 +1,152 @@
+"""Module that tracks the labeling status of each image, shared between several annotators."""
+import sqlite3
+import time
+from pathlib import Path
+
+
+class ImageStatusIndex:
+    """
+    Class to track the status (unlabeled, claimed or labeled) of every image in a SQLite database.
+
+    Annotators claim images before labeling them. A claim is a lease that expires after
+    'lease_sec' seconds, so images claimed by an annotator that stopped (or crashed) are
+    handed out again. Claims are made inside a write transaction, so several processes
+    (or machines sharing the storage folder) always receive disjoint images.
+    """
+
+    UNLABELED = 'unlabeled'
+    CLAIMED = 'claimed'
+    LABELED = 'labeled'
+
+    def __init__(self, db_path: str | Path, annotator_id: str, lease_sec: float = 900.0):
+
+        self.annotator_id = str(annotator_id)
+        self.lease_sec = float(lease_sec)
+
+        # Autocommit mode, transactions are started explicitly where needed
+        self._db = sqlite3.connect(str(db_path), timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS images ('
+            'name TEXT PRIMARY KEY, status TEXT NOT NULL, owner TEXT, lease_expires REAL, updated REAL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS images_status ON images (status, name)')
+
+
+    def sync(self, image_names: list[str], labeled_names: set[str]) -> None:
+        """
+        Add new images to the index, and update the status of images based on the saved masks.
+
+        Images labeled within the last 'lease_sec' seconds are kept as labeled, even if their mask is missing,
+        since the mask may still be waiting to be written by the (background) writer of another annotator.
+        """
+
+        now = time.time()
+        with self._transaction():
+
+            # Register any new images
+            get_status = lambda name: self.LABELED if name in labeled_names else self.UNLABELED
+            status_rows = [(name, get_status(name), now) for name in image_names]
+            self._db.executemany('INSERT OR IGNORE INTO images (name, status, updated) VALUES (?, ?, ?)', status_rows)
+
+            # Mark images that have a mask as labeled, and images whose mask was deleted as unlabeled
+            rows = self._db.execute('SELECT name, updated FROM images WHERE status = ?', (self.LABELED,)).fetchall()
+            db_labeled_names = set(row[0] for row in rows)
+            expired_names = set(name for name, updated in rows if updated is None or updated < now - self.lease_sec)
+            update_rows = [(self.LABELED, now, name) for name in labeled_names if name not in db_labeled_names]
+            update_rows += [(self.UNLABELED, now, name) for name in expired_names if name not in labeled_names]
+            self._db.executemany(
+                'UPDATE images SET status = ?, owner = NULL, lease_expires = NULL, updated = ? WHERE name = ?',
+                update_rows,
+            )
+
+
+    def claim(self, num_images: int = 1, random_order: bool = False) -> list[str]:
+        """Claim up to the given number of unlabeled images (or images with expired leases). Returns: names"""
+
+        now = time.time()
+        order_by = 'random()' if random_order else 'name'
+        with self._transaction():
+            rows = self._db.execute(
+                'SELECT name FROM images WHERE status = ? OR (status = ? AND lease_expires < ?) '
+                f'ORDER BY {order_by} LIMIT ?',
+                (self.UNLABELED, self.CLAIMED, now, int(num_images)),
+            ).fetchall()
+            claimed_names = [row[0] for row in rows]
+            self._db.executemany(
+                'UPDATE images SET status = ?, owner = ?, lease_expires = ?, updated = ? WHERE name = ?',
+                [(self.CLAIMED, self.annotator_id, now + self.lease_sec, now, name) for name in claimed_names],
+            )
+
+        return claimed_names
+
+
+    def renew(self, image_names: list[str]) -> list[str]:
+        """Extend the lease on images claimed by this annotator. Returns: names of images still held"""
+
+        now = time.time()
+        with self._transaction():
+            held_names = []
+            for name in image_names:
+                cursor = self._db.execute(
+                    'UPDATE images SET lease_expires = ?, updated = ? WHERE name = ? AND status = ? AND owner = ?',
+                    (now + self.lease_sec, now, name, self.CLAIMED, self.annotator_id),
+                )
+                if cursor.rowcount > 0:
+                    held_names.append(name)
+
+        return held_names
+
+
+    def release(self, image_names: list[str]) -> None:
+        """Give up the claim on images held by this annotator, so others can label them."""
+
+        with self._transaction():
+            self._db.executemany(
+                'UPDATE images SET status = ?, owner = NULL, lease_expires = NULL, updated = ? '
+                'WHERE name = ? AND status = ? AND owner = ?',
+                [(self.UNLABELED, time.time(), name, self.CLAIMED, self.annotator_id) for name in image_names],
+            )
+
+
+    def mark_labeled(self, image_name: str) -> None:
+        """Record that the given image has a saved mask."""
+
+        self._db.execute(
+            'UPDATE images SET status = ?, owner = ?, lease_expires = NULL, updated = ? WHERE name = ?',
+            (self.LABELED, self.annotator_id, time.time(), image_name),
+        )
+
+
+    def count(self, status: str | None = None) -> int:
+        """Returns the number of images with the given status (or all images, if no status is given)."""
+
+        if status is None:
+            return self._db.execute('SELECT COUNT(*) FROM images').fetchone()[0]
+        return self._db.execute('SELECT COUNT(*) FROM images WHERE status = ?', (status,)).fetchone()[0]
+
+
+    def close(self) -> None:
+        """Close the connection to the database."""
+
+        self._db.close()
+
+
+    def _transaction(self):
+        """Helper used to run statements in a write transaction, which blocks other writers until finished."""
+
+        return _WriteTransaction(self._db)
+
+
+class _WriteTransaction:
+    """Context manager that starts a write transaction, committing on success and rolling back on errors."""
+
+    def __init__(self, db: sqlite3.Connection):
+        self._db = db
+
+    def __enter__(self):
+        self._db.execute('BEGIN IMMEDIATE')
+        return self._db
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._db.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+        return False
@@ -157,6 +157,10 @@ class BaseCallback:
         self._cb_parent_list: BaseCallback = []
         self._cb_child_list: BaseCallback = []
 
+        # Storage for the most recent rendering, which is re-used if the element hasn't changed
+        self._render_cache_key = None
+        self._render_cache_frame = None
+
         # To help with debugging/printouts
         self._debug_name = self.__class__.__name__
 
@@ -336,7 +340,7 @@ class BaseCallback:
 
     def render(self, h=None, w=None):
         render_size = self._update_render_sizing(h, w)
-        frame = self._render_up_to_size(render_size.h, render_size.w)
+        frame = self._render_cached(render_size.h, render_size.w)
 
         # Sanity check that render target did what it was told to do...
         if len(self._cb_parent_list) > 0:
@@ -355,6 +359,57 @@ class BaseCallback:
         class_name = self.__class__.__name__
         raise NotImplementedError(f"Must implement '_render_up_to_size' function ({class_name})")
 
+    def _render_cached(self, h, w):
+        """
+        Helper used to render an element, while re-using the previous rendering if the element
+        reports that its appearance hasn't changed (see '_get_render_state') and the size is the same.
+        Layout containers use this when rendering children, so that only changed elements are re-drawn
+        """
+
+        # Always re-draw elements that don't report their render state
+        render_state = self._get_render_state()
+        if render_state is None:
+            self._render_cache_key = None
+            self._render_cache_frame = None
+            return self._render_up_to_size(h, w)
+
+        cache_key = (h, w, render_state)
+        if cache_key != self._render_cache_key:
+            self._render_cache_frame = self._render_up_to_size(h, w)
+            self._render_cache_key = cache_key
+
+        return self._render_cache_frame
+
+    def _get_render_state(self):
+        """
+        Function used to report everything (other than sizing) that affects how an element is drawn.
+        If the reported state matches the state from the previous render, the previous rendering is re-used.
+        Returning None means the element is always re-drawn, which is the default behavior
+        """
+        return None
+
+    def _get_children_render_state(self):
+        """
+        Helper used by layout containers to report their render state, which depends on the
+        state, sizing & placement of all children. Returns None if any child must always be re-drawn
+        """
+
+        children_state_list = []
+        for child in self._cb_child_list:
+            child_state = child._get_render_state()
+            if child_state is None:
+                return None
+            children_state_list.append((child._rdr.size.h, child._rdr.size.w, child_state))
+
+        return (self._cb_region.x1, self._cb_region.y1, tuple(children_state_list))
+
+    def mark_dirty(self):
+        """Force an element (and its parents) to re-draw on the next render, e.g. after changing styling"""
+        self._render_cache_key = None
+        for parent in self._cb_parent_list:
+            parent.mark_dirty()
+        return self
+
     def _update_render_sizing(self, h=None, w=None) -> RenderTargetSize:
 
         if h is not None and w is not None:
@@ -399,6 +454,7 @@ class BaseImageCallback(BaseCallback):
         self._render_image = image_3ch
         self._targ_h = -1
         self._targ_w = -1
+        self._image_version = 0
 
         # Set up sizing limits
         img_hw = image.shape[0:2]
@@ -430,6 +486,11 @@ class BaseImageCallback(BaseCallback):
 
     # .................................................................................................................
 
+    def _get_render_state(self):
+        return self._image_version
+
+    # .................................................................................................................
+
     def _get_width_given_height(self, h):
         h = min(h, self._rdr.limits.max_h)
         img_h, img_w = self._full_image.shape[0:2]
@@ -119,7 +119,7 @@ class ToggleButton(Toggleable):
         if text_off_color is not None:
             self._txt_dim.style(color=text_off_color)
 
-        return self
+        return self.mark_dirty()
 
     # .................................................................................................................
 
@@ -163,6 +163,11 @@ class ToggleButton(Toggleable):
 
     # .................................................................................................................
 
+    def _get_render_state(self):
+        return (self._is_on, self.is_hovered())
+
+    # .................................................................................................................
+
     def on_left_click(self, cbxy, cbflags) -> None:
         self.toggle()
 
@@ -236,6 +241,12 @@ class ToggleImage(ExpandingImage):
 
     # .................................................................................................................
 
+    def _get_render_state(self):
+        txt_state = (self._text, self._txt_xy_norm, self._txt_anchor_xy_norm, self._txt_offset_xy_px)
+        return (self._image_version, self._toggable._is_on, self.is_hovered(), txt_state)
+
+    # .................................................................................................................
+
     # 'Inherit' methods from togglable class
     # -> Doing it this way because we already need to inherit from the image class
     # -> Need to reconsider how functionality is structured/inherited
@@ -271,9 +282,11 @@ class ToggleImage(ExpandingImage):
     ):
         """Set overlay text to display on top of toggle image"""
 
-        # Update text & drawing style
+        # Update text & drawing style (forcing a re-draw if styling changes)
         self._text = text
-        self._txtdraw.style(scale, thickness, color, bg_color)
+        if any(arg is not None for arg in (scale, thickness, color, bg_color)):
+            self._txtdraw.style(scale, thickness, color, bg_color)
+            self.mark_dirty()
 
         # Update text positioning
         if xy_norm is not None:
@@ -323,7 +336,7 @@ class ImmediateButton(BaseCallback):
         if text_scale is not None:
             self._txtdraw.style(scale=text_scale)
 
-        return self
+        return self.mark_dirty()
 
     # .................................................................................................................
 
@@ -353,6 +366,11 @@ class ImmediateButton(BaseCallback):
 
     # .................................................................................................................
 
+    def _get_render_state(self):
+        return self.is_hovered()
+
+    # .................................................................................................................
+
     def read(self) -> bool:
         is_changed = self._is_changed
         self._is_changed = False
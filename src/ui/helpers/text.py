@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 import cv2
 import numpy as np
 
@@ -14,6 +16,10 @@ class TextDrawer:
     """
     Helper used to handle text-drawing onto images
     If a background color is given, text will be drawn with a thicker background for better contrast
+
+    Text is rasterized once into a small (pre-multiplied alpha) bitmap, which is cached and
+    blended into the target image on later draws. Bitmaps are keyed on the text and all styling
+    settings, so changes to the text or styling automatically lead to new bitmaps being drawn.
     """
 
     # .................................................................................................................
@@ -26,6 +32,7 @@ class TextDrawer:
         bg_color: COLOR | None = None,
         font=cv2.FONT_HERSHEY_SIMPLEX,
         line_type=cv2.LINE_AA,
+        max_cached_labels=64,
     ):
         self._fg_color = color
         self._fg_thick = thickness
@@ -34,13 +41,18 @@ class TextDrawer:
         self._scale = scale
         self._ltype = cv2.LINE_AA
 
+        # Storage for re-using text sizing & rasterized text, ordered from least-to-most recently used
+        self._max_cached_labels = max(1, max_cached_labels)
+        self._size_cache = OrderedDict()
+        self._label_cache = OrderedDict()
+
     # .................................................................................................................
 
     @classmethod
     def from_existing(cls, other_text_drawer):
         assert isinstance(other_text_drawer, cls), "Must be created from another text drawer instance!"
         o = other_text_drawer
-        return cls(o._scale, o._fg_thick, o._fg_color, o._bg_color, o._font, o._ltype)
+        return cls(o._scale, o._fg_thick, o._fg_color, o._bg_color, o._font, o._ltype, o._max_cached_labels)
 
     # .................................................................................................................
 
@@ -69,6 +81,12 @@ class TextDrawer:
             self._fg_color = color
         elif bg_color is not None:
             self._bg_color = bg_color if bg_color != -1 else None
+
+        # Cached text no longer matches the styling, so clear it out
+        if any(arg is not None for arg in (scale, thickness, color, bg_color)):
+            self._size_cache.clear()
+            self._label_cache.clear()
+
         return self
 
     # .................................................................................................................
@@ -92,11 +110,27 @@ class TextDrawer:
         if thickness is None:
             thickness = self._fg_thick
 
-        if self._bg_color is not None:
-            bg_thick = min(thickness + 3, thickness * 3)
-            image = cv2.putText(image, text, xy_px, self._font, scale, self._bg_color, bg_thick, self._ltype)
-
-        return cv2.putText(image, text, xy_px, self._font, scale, color, thickness, self._ltype)
+        # Blend (cached) text bitmap into the image, clipping to the image boundaries
+        label_bgr, label_inv_alpha, (origin_x, origin_y) = self._get_label_bitmap(text, scale, thickness, color)
+        label_h, label_w = label_inv_alpha.shape[0:2]
+        img_h, img_w = image.shape[0:2]
+        x1, y1 = xy_px[0] - origin_x, xy_px[1] - origin_y
+        img_x1, img_y1 = max(x1, 0), max(y1, 0)
+        img_x2, img_y2 = min(x1 + label_w, img_w), min(y1 + label_h, img_h)
+        if img_x2 <= img_x1 or img_y2 <= img_y1:
+            return image
+
+        lbl_x1, lbl_y1 = img_x1 - x1, img_y1 - y1
+        lbl_x2, lbl_y2 = lbl_x1 + (img_x2 - img_x1), lbl_y1 + (img_y2 - img_y1)
+        img_region = image[img_y1:img_y2, img_x1:img_x2]
+        lbl_bgr = label_bgr[lbl_y1:lbl_y2, lbl_x1:lbl_x2]
+        lbl_inv_alpha = label_inv_alpha[lbl_y1:lbl_y2, lbl_x1:lbl_x2]
+        if image.ndim == 2:
+            lbl_bgr, lbl_inv_alpha = lbl_bgr[:, :, 0], lbl_inv_alpha[:, :, 0]
+        blended = img_region * lbl_inv_alpha + lbl_bgr
+        image[img_y1:img_y2, img_x1:img_x2] = np.clip(blended + 0.5, 0, 255).astype(image.dtype)
+
+        return image
 
     # .................................................................................................................
 
@@ -222,8 +256,72 @@ class TextDrawer:
         if thickness is None:
             thickness = self._fg_thick
 
-        (txt_w, txt_h), txt_base = cv2.getTextSize(text, self._font, scale, thickness)
-        return txt_w, txt_h, txt_base
+        # Re-use sizing of recently drawn text
+        key = (text, scale, thickness)
+        txt_size = self._size_cache.get(key, None)
+        if txt_size is None:
+            (txt_w, txt_h), txt_base = cv2.getTextSize(text, self._font, scale, thickness)
+            txt_size = (txt_w, txt_h, txt_base)
+            self._store_cached(self._size_cache, key, txt_size)
+        else:
+            self._size_cache.move_to_end(key)
+
+        return txt_size
+
+    # .................................................................................................................
+
+    def _get_label_bitmap(self, text: str, scale: float, thickness: int, color: COLOR):
+        """
+        Helper used to get a rasterized copy of the given text, re-using previous results if possible.
+        The bitmap is stored as a color image pre-multiplied by the text alpha, along with
+        the inverted alpha, so that it can be blended into an image using:
+            new_image = image * inv_alpha + bgr
+        Returns:
+            label_bgr, label_inv_alpha, origin_xy_px
+            -> The origin is the location of the bottom-left of the text (as used by cv2.putText)
+        """
+
+        # Colors are converted to tuples, so that they can be used as cache keys (e.g. if given as lists)
+        bg_color_key = None if self._bg_color is None else tuple(np.atleast_1d(self._bg_color).tolist())
+        key = (text, scale, thickness, tuple(np.atleast_1d(color).tolist()), bg_color_key)
+        cached_label = self._label_cache.get(key, None)
+        if cached_label is not None:
+            self._label_cache.move_to_end(key)
+            return cached_label
+
+        # Size bitmap to fit text, including the thicker background outline & the text below the baseline
+        bg_thick = min(thickness + 3, thickness * 3)
+        pad = 1 + (bg_thick if self._bg_color is not None else thickness)
+        txt_w, txt_h, txt_base = self.get_text_size(text, scale, thickness)
+        label_h, label_w = txt_h + txt_base + 2 * pad, txt_w + 2 * pad
+        origin_xy_px = (pad, pad + txt_h)
+
+        # Draw background & foreground text as alpha masks and layer them (pre-multiplied) to form the bitmap
+        label_bgr = np.zeros((label_h, label_w, 3), dtype=np.float32)
+        label_alpha = np.zeros((label_h, label_w, 1), dtype=np.float32)
+        layers_list = [] if self._bg_color is None else [(self._bg_color, bg_thick)]
+        layers_list.append((color, thickness))
+        for layer_color, layer_thick in layers_list:
+            alpha_uint8 = np.zeros((label_h, label_w), dtype=np.uint8)
+            cv2.putText(alpha_uint8, text, origin_xy_px, self._font, scale, 255, layer_thick, self._ltype)
+            alpha = np.float32(1.0 / 255.0) * alpha_uint8[:, :, None]
+            label_bgr = label_bgr * (1.0 - alpha) + alpha * np.float32(layer_color)
+            label_alpha = label_alpha * (1.0 - alpha) + alpha
+
+        cached_label = (label_bgr, 1.0 - label_alpha, origin_xy_px)
+        self._store_cached(self._label_cache, key, cached_label)
+
+        return cached_label
+
+    # .................................................................................................................
+
+    def _store_cached(self, cache: OrderedDict, key: tuple, value) -> None:
+        """Helper used to store a value as most recently used, removing the oldest entries if needed"""
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self._max_cached_labels:
+            cache.popitem(last=False)
+        return
 
     # .................................................................................................................
 
@@ -42,6 +42,7 @@ class ExpandingImage(BaseImageCallback):
         # Reset cache settings to force a re-render
         self._targ_h = -1
         self._targ_w = -1
+        self._image_version += 1
 
         return self
 
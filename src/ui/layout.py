@@ -47,7 +47,7 @@ class HStack(BaseCallback):
         # Have each child item draw itself
         imgs_list = []
         for child, ch_render_w in zip(self, child_render_w_list):
-            frame = child._render_up_to_size(h, ch_render_w)
+            frame = child._render_cached(h, ch_render_w)
             orig_frame_h, orig_frame_w = frame.shape[0:2]
 
             # Adjust frame height if needed
@@ -85,6 +85,11 @@ class HStack(BaseCallback):
 
     # .................................................................................................................
 
+    def _get_render_state(self):
+        return self._get_children_render_state()
+
+    # .................................................................................................................
+
     def _get_height_and_width_without_hint(self) -> [int, int]:
         """Set height to tallest child height and then calculate width from given height"""
         tallest_h = max(child._rdr.limits.min_h for child in self)
@@ -211,7 +216,7 @@ class VStack(BaseCallback):
         # Have each child item draw itself
         imgs_list = []
         for child, ch_render_h in zip(self, child_render_h_list):
-            frame = child._render_up_to_size(ch_render_h, w)
+            frame = child._render_cached(ch_render_h, w)
             orig_frame_h, orig_frame_w = frame.shape[0:2]
 
             # Adjust frame width if needed
@@ -249,6 +254,11 @@ class VStack(BaseCallback):
 
     # .................................................................................................................
 
+    def _get_render_state(self):
+        return self._get_children_render_state()
+
+    # .................................................................................................................
+
     def _get_height_and_width_without_hint(self) -> [int, int]:
         """When not given a size, render width to the widest child and sum of all child heights at this width"""
         widest_w = max(child._rdr.limits.min_w for child in self)
@@ -467,7 +477,7 @@ class GridStack(BaseCallback):
             col_images_list = []
             for col_idx, child in enumerate(children_per_row):
                 col_width = w_per_col[col_idx]
-                frame = child._render_up_to_size(row_height, col_width)
+                frame = child._render_cached(row_height, col_width)
                 orig_frame_h, orig_frame_w = frame.shape[0:2]
 
                 # Adjust frame width if needed
@@ -533,6 +543,11 @@ class GridStack(BaseCallback):
 
     # .................................................................................................................
 
+    def _get_render_state(self):
+        return self._get_children_render_state()
+
+    # .................................................................................................................
+
     def _get_height_and_width_without_hint(self) -> [int, int]:
         """Set height to the total of largest heights per row, width to the total largest widths per column"""
 
@@ -673,7 +688,7 @@ class OverlayStack(BaseCallback):
         y1 = self._cb_region.y1
 
         # Have base item provide the base frame rendering and overlays handle drawing over-top
-        base_frame = self._base_item._render_up_to_size(h, w).copy()
+        base_frame = self._base_item._render_cached(h, w).copy()
         base_h, base_w = base_frame.shape[0:2]
         self._rdr.set_render_size(base_h, base_w)
 
@@ -687,6 +702,11 @@ class OverlayStack(BaseCallback):
 
     # .................................................................................................................
 
+    def _get_render_state(self):
+        return self._get_children_render_state()
+
+    # .................................................................................................................
+
     def _get_height_and_width_without_hint(self) -> [int, int]:
         return self._base_item._get_height_and_width_without_hint()
 
@@ -182,6 +182,12 @@ class HoverOverlay(BaseOverlay):
 
     # .................................................................................................................
 
+    def get_event_xy(self) -> CBEventXY:
+        """Returns the most recent mouse event, without clearing the changed/clicked state (unlike .read())"""
+        return self._event_xy
+
+    # .................................................................................................................
+
     def on_move(self, cbxy, cbflags) -> None:
         is_in_region = cbxy.is_in_region
         is_in_region_changed = is_in_region != self._prev_is_in_region
@@ -48,6 +48,12 @@ class StaticImage(BaseCallback):
 
     # .................................................................................................................
 
+    def _get_render_state(self):
+        # Appearance only depends on sizing
+        return ()
+
+    # .................................................................................................................
+
     def _get_width_given_height(self, h):
         h = min(h, self._rdr.limits.max_h)
         img_h, img_w = self._image.shape[0:2]
@@ -129,6 +135,12 @@ class StaticMessageBar(BaseCallback):
 
     # .................................................................................................................
 
+    def _get_render_state(self):
+        # Appearance only depends on sizing
+        return ()
+
+    # .................................................................................................................
+
 
 class HSeparator(BaseCallback):
 
@@ -158,6 +170,12 @@ class HSeparator(BaseCallback):
 
     # .................................................................................................................
 
+    def _get_render_state(self):
+        # Appearance only depends on sizing
+        return ()
+
+    # .................................................................................................................
+
 
 class VSeparator(BaseCallback):
 
@@ -186,3 +204,9 @@ class VSeparator(BaseCallback):
         return self._image
 
     # .................................................................................................................
+
+    def _get_render_state(self):
+        # Appearance only depends on sizing
+        return ()
+
+    # .................................................................................................................
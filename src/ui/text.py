@@ -55,7 +55,7 @@ class TitledTextBlock(BaseCallback):
 
     def _render_up_to_size(self, h, w):
 
-        img_h, img_w = self._image.shape[0:2]
+        img_h, img_w = self._base_image.shape[0:2]
         if img_h != h or img_w != w:
             new_base_img = blank_image(h, w, self._bg_color)
             self._title_txtdraw.xy_norm(new_base_img, self._text_title, (0.5, 0.5), offset_xy_px=(0, -self._title_h))
@@ -71,6 +71,11 @@ class TitledTextBlock(BaseCallback):
 
     # .................................................................................................................
 
+    def _get_render_state(self):
+        return (self._text_title, self._text_value)
+
+    # .................................................................................................................
+
 
 class TextBlock(BaseCallback):
 
@@ -110,7 +115,7 @@ class TextBlock(BaseCallback):
 
     def _render_up_to_size(self, h, w):
 
-        img_h, img_w = self._image.shape[0:2]
+        img_h, img_w = self._base_image.shape[0:2]
         if img_h != h or img_w != w:
             new_base_img = blank_image(h, w, self._bg_color)
             self._base_image = new_base_img
@@ -125,6 +130,11 @@ class TextBlock(BaseCallback):
 
     # .................................................................................................................
 
+    def _get_render_state(self):
+        return self._text_value
+
+    # .................................................................................................................
+
 
 class ValueBlock(TextBlock):
 
@@ -181,7 +191,7 @@ class ValueBlock(TextBlock):
 
     def _render_up_to_size(self, h, w):
 
-        img_h, img_w = self._image.shape[0:2]
+        img_h, img_w = self._base_image.shape[0:2]
         if img_h != h or img_w != w:
             new_base_img = blank_image(h, w, self._bg_color)
             self._base_image = new_base_img
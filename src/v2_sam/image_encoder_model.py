@@ -140,29 +140,13 @@ class SAMV2ImageEncoder(nn.Module):
             image_as_tensor_bchw
         """
 
-        # Figure out scaling factor to get target side length
-        img_h, img_w = image_bgr.shape[0:2]
-        largest_side = max(img_h, img_w)
-        scale_factor = max_side_length / largest_side
-
-        # Force sizing to multiples of a specific tiling size
-        tiling_size = self.get_image_tiling_size_constraint()
-        if use_square_sizing:
-            scaled_side = int(np.ceil(largest_side * scale_factor / tiling_size)) * tiling_size
-            scaled_h = scaled_w = scaled_side
-        else:
-            scaled_h = int(np.ceil(img_h * scale_factor / tiling_size)) * tiling_size
-            scaled_w = int(np.ceil(img_w * scale_factor / tiling_size)) * tiling_size
-
         # Scale RGB image to correct size and re-order from HWC to BCHW (with batch of 1)
-        image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
-        scaled_hwc = cv2.resize(image_rgb, dsize=(scaled_w, scaled_h),interpolation=cv2.INTER_CUBIC)
-        scaled_bchw = np.expand_dims(np.transpose(scaled_hwc, (2, 0, 1)), 0)
+        scaled_h, scaled_w = self.get_scaled_hw(image_bgr.shape[0:2], max_side_length, use_square_sizing)
+        scaled_chw = self._scale_to_rgb_chw(image_bgr, scaled_h, scaled_w)
+        scaled_bchw = np.expand_dims(scaled_chw, 0)
 
         # Move the image over to the pytorch for final pre-processing steps
-        device, dtype = self.mean_rgb.device, self.mean_rgb.dtype
-        image_tensor_bchw = torch.tensor(scaled_bchw, device=device, dtype=dtype)
-        image_tensor_bchw = (image_tensor_bchw - self.mean_rgb) * self.stdev_scale_rgb
+        image_tensor_bchw = self._normalize_bchw(scaled_bchw)
 
         # The original SAM implementation padded the short side of the image to form a square
         # -> This results in more processing and isn't required in this implementation!
@@ -176,6 +160,72 @@ class SAMV2ImageEncoder(nn.Module):
 
     # .................................................................................................................
 
+    def prepare_image_batches(
+        self,
+        images_bgr_list: list[ndarray],
+        max_side_length=1024,
+        use_square_sizing=True,
+        max_batch_size: int | None = None,
+    ) -> list[tuple[list[int], Tensor]]:
+        """
+        Batched version of 'prepare_image'. Images are grouped (bucketed) by their
+        scaled size, so that images sharing a size can be encoded in a single forward pass.
+        Images are not padded, so each image is processed exactly as with 'prepare_image'.
+        The max_batch_size setting can be used to limit the number of images per batch.
+
+        Returns:
+            batches_list
+            -> Each entry is a tuple: (image_indices_list, image_tensor_bchw)
+               where the indices map each batch entry back to the input list
+        """
+
+        # Group image indices by scaled sizing
+        indices_per_hw = {}
+        for img_idx, image_bgr in enumerate(images_bgr_list):
+            scaled_hw = self.get_scaled_hw(image_bgr.shape[0:2], max_side_length, use_square_sizing)
+            indices_per_hw.setdefault(scaled_hw, []).append(img_idx)
+
+        # Build one tensor per group, splitting up groups that exceed the max batch size
+        batches_list = []
+        for (scaled_h, scaled_w), indices in indices_per_hw.items():
+            step_size = len(indices) if max_batch_size is None else max(1, max_batch_size)
+            for start_idx in range(0, len(indices), step_size):
+                batch_indices = indices[start_idx : start_idx + step_size]
+                batch_images = [images_bgr_list[idx] for idx in batch_indices]
+                scaled_chw_list = [self._scale_to_rgb_chw(image, scaled_h, scaled_w) for image in batch_images]
+                image_tensor_bchw = self._normalize_bchw(np.stack(scaled_chw_list))
+                batches_list.append((batch_indices, image_tensor_bchw))
+
+        return batches_list
+
+    # .................................................................................................................
+
+    def get_scaled_hw(self, image_hw: tuple[int, int], max_side_length=1024, use_square_sizing=True) -> tuple[int, int]:
+        """
+        Helper used to compute the size an image will be scaled to before encoding.
+        Sizes are forced to integer multiples of the tiling size constraint.
+        Returns:
+            scaled_h, scaled_w
+        """
+
+        # Figure out scaling factor to get target side length
+        img_h, img_w = image_hw
+        largest_side = max(img_h, img_w)
+        scale_factor = max_side_length / largest_side
+
+        # Force sizing to multiples of a specific tiling size
+        tiling_size = self.get_image_tiling_size_constraint()
+        if use_square_sizing:
+            scaled_side = int(np.ceil(largest_side * scale_factor / tiling_size)) * tiling_size
+            scaled_h = scaled_w = scaled_side
+        else:
+            scaled_h = int(np.ceil(img_h * scale_factor / tiling_size)) * tiling_size
+            scaled_w = int(np.ceil(img_w * scale_factor / tiling_size)) * tiling_size
+
+        return scaled_h, scaled_w
+
+    # .................................................................................................................
+
     def get_image_tiling_size_constraint(self) -> int:
         """
         Due to the hierarchical structure of the image encoder, input images
@@ -224,3 +274,19 @@ class SAMV2ImageEncoder(nn.Module):
         return self
 
     # .................................................................................................................
+
+    def _scale_to_rgb_chw(self, image_bgr: ndarray, scaled_h: int, scaled_w: int) -> ndarray:
+        """Helper used to scale a bgr image to a target size, as an RGB image in CHW order"""
+        image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+        scaled_hwc = cv2.resize(image_rgb, dsize=(scaled_w, scaled_h), interpolation=cv2.INTER_CUBIC)
+        return np.transpose(scaled_hwc, (2, 0, 1))
+
+    # .................................................................................................................
+
+    def _normalize_bchw(self, scaled_bchw: ndarray) -> Tensor:
+        """Helper used to move (uint8) image data into pytorch & apply RGB normalization"""
+        device, dtype = self.mean_rgb.device, self.mean_rgb.dtype
+        image_tensor_bchw = torch.tensor(scaled_bchw, device=device, dtype=dtype)
+        return (image_tensor_bchw - self.mean_rgb) * self.stdev_scale_rgb
+
+    # .................................................................................................................
@@ -1,3 +1,6 @@
+import os
+import os.path as osp
+
 import torch
 
 from src.v2_sam.sam_v2_model import SAMV2Model
@@ -11,9 +14,13 @@ from src.v2_sam.memory_encoder_model import SAMV2MemoryEncoder
 from src.v2_sam.state_dict_conversion.config_from_original_state_dict import get_model_config_from_state_dict
 from src.v2_sam.state_dict_conversion.convert_original_state_dict_keys import convert_state_dict_keys
 
+# Key used to identify (pre-)converted weight files, which store the model config along with the converted weights
+CONVERTED_FORMAT_KEY = "samv2_converted_format_version"
+CONVERTED_FORMAT_VERSION = 1
+
 
 def make_samv2_from_original_state_dict(
-    original_state_dict: dict | str, strict_load=True, weights_only=True
+    original_state_dict: dict | str, strict_load=True, weights_only=True, include_video_components=True
 ) -> [dict, SAMV2Model]:
     """
     Function used to initialize a SAMV2 model from a state dictionary (i.e. model weights) file.
@@ -23,6 +30,13 @@ def make_samv2_from_original_state_dict(
     The state dict can be provided directly (e.g. from state_dict = torch.load(...)) or
     a string can be given, in which case it will be assumed to be a path to load the state dict
 
+    Files made using 'save_converted_samv2' are also supported, in which case the
+    config detection & key conversion steps are skipped (which speeds up loading).
+
+    If 'include_video_components' is False, then the memory encoder & memory fusion
+    models (which are only needed for video segmentation) are not built or loaded.
+    This speeds up loading & reduces memory usage when only segmenting images.
+
     Returns:
         model_config_dict, sam_v2_model
     """
@@ -30,12 +44,11 @@ def make_samv2_from_original_state_dict(
     # If we're given a string, assume it's a path to the state dict
     need_to_load = isinstance(original_state_dict, str)
     if need_to_load:
-        path_to_state_dict = original_state_dict
-        # Load model weights with fail check in case weights are in cuda format and user doesn't have cuda
-        try:
-            original_state_dict = torch.load(path_to_state_dict, weights_only=weights_only)
-        except RuntimeError:
-            original_state_dict = torch.load(path_to_state_dict, map_location="cpu", weights_only=weights_only)
+        original_state_dict = load_state_dict_file(original_state_dict, weights_only)
+
+    # Skip conversion if we're given pre-converted weights
+    if CONVERTED_FORMAT_KEY in original_state_dict.keys():
+        return make_samv2_from_converted_state_dict(original_state_dict, strict_load, include_video_components)
 
     # Feedback on using non-strict loading
     if not strict_load:
@@ -54,20 +67,118 @@ def make_samv2_from_original_state_dict(
 
     # Get model config from weights (i.e. sam large vs sam base) & convert to new keys/state dict
     model_config_dict = get_model_config_from_state_dict(original_state_dict)
-    new_state_dict = convert_state_dict_keys(model_config_dict, original_state_dict)
+    new_state_dict = convert_state_dict_keys(model_config_dict, original_state_dict, include_video_components)
 
     # Load model & set model weights
-    sam_model = make_sam_v2(**model_config_dict)
-    sam_model.image_encoder.load_state_dict(new_state_dict["imgencoder"], strict_load)
-    sam_model.coordinate_encoder.load_state_dict(new_state_dict["coordencoder"], strict_load)
-    sam_model.prompt_encoder.load_state_dict(new_state_dict["promptencoder"], strict_load)
-    sam_model.mask_decoder.load_state_dict(new_state_dict["maskdecoder"], strict_load)
-    sam_model.memory_encoder.load_state_dict(new_state_dict["memoryencoder"], strict_load)
-    sam_model.memory_fusion.load_state_dict(new_state_dict["memoryfusion"], strict_load)
+    sam_model = make_sam_v2(**model_config_dict, include_video_components=include_video_components)
+    for component_key, component_model in get_components_by_key(sam_model).items():
+        component_model.load_state_dict(new_state_dict[component_key], strict_load)
+
+    return model_config_dict, sam_model
+
+
+def make_samv2_from_converted_state_dict(
+    converted_state_dict: dict | str, strict_load=True, include_video_components=True
+) -> [dict, SAMV2Model]:
+    """
+    Function used to initialize a SAMV2 model from weights that were already converted
+    (see 'save_converted_samv2'). These files hold the model config along with
+    the weights of each model component, so no config detection or key conversion
+    is needed. When loading from a path, the file is memory-mapped & weights are
+    assigned directly to the model (i.e. without copying), so loading is fast
+    and doesn't require holding a second copy of the weights in memory.
+
+    Returns:
+        model_config_dict, sam_v2_model
+    """
+
+    # If we're given a string, assume it's a path to the converted file
+    if isinstance(converted_state_dict, str):
+        converted_state_dict = load_state_dict_file(converted_state_dict, weights_only=True)
+
+    # Sanity check, make sure we got a file we know how to load
+    file_version = converted_state_dict.get(CONVERTED_FORMAT_KEY, None)
+    if file_version != CONVERTED_FORMAT_VERSION:
+        raise ValueError(f"Unsupported converted weights (version: {file_version}), re-convert the original weights")
+
+    # Build model & assign weights (tensors are used as-is, instead of being copied into the model)
+    model_config_dict = dict(converted_state_dict["config"])
+    component_state_dicts = converted_state_dict["state_dicts"]
+    sam_model = make_sam_v2(**model_config_dict, include_video_components=include_video_components)
+    for component_key, component_model in get_components_by_key(sam_model).items():
+        component_model.load_state_dict(component_state_dicts[component_key], strict_load, assign=True)
 
     return model_config_dict, sam_model
 
 
+def save_converted_samv2(original_state_dict: dict | str, save_path: str, weights_only=True) -> str:
+    """
+    Helper used to convert original SAMV2 weights into a format that is faster to load.
+    The saved file holds the model config and the (already converted) weights for each model
+    component. It can be loaded using either 'make_samv2_from_converted_state_dict' or
+    'make_samv2_from_original_state_dict'.
+
+    Returns:
+        save_path
+    """
+
+    # If we're given a string, assume it's a path to the state dict
+    if isinstance(original_state_dict, str):
+        original_state_dict = load_state_dict_file(original_state_dict, weights_only)
+    if "model" in original_state_dict.keys():
+        original_state_dict = original_state_dict["model"]
+
+    # Convert weights & store (cpu) copies for each component, along with the model config
+    # -> Copies avoid saving the full storage of tensors that are views of other (larger) tensors
+    model_config_dict = get_model_config_from_state_dict(original_state_dict)
+    new_state_dict = convert_state_dict_keys(model_config_dict, original_state_dict)
+    component_state_dicts = {
+        component_key: {key: value.detach().cpu().clone() for key, value in component_state_dict.items()}
+        for component_key, component_state_dict in new_state_dict.items()
+    }
+    converted_state_dict = {
+        CONVERTED_FORMAT_KEY: CONVERTED_FORMAT_VERSION,
+        "config": model_config_dict,
+        "state_dicts": component_state_dicts,
+    }
+
+    save_folder = osp.dirname(save_path)
+    if save_folder != "":
+        os.makedirs(save_folder, exist_ok=True)
+    torch.save(converted_state_dict, save_path)
+
+    return save_path
+
+
+def load_state_dict_file(path_to_state_dict: str, weights_only=True) -> dict:
+    """
+    Helper used to load model weights from a file. Weights are loaded on the cpu,
+    and memory-mapped when possible, so that the file contents are only read
+    in as needed (rather than all at once, which is slow & uses lots of memory).
+    """
+
+    try:
+        state_dict = torch.load(path_to_state_dict, map_location="cpu", mmap=True, weights_only=weights_only)
+    except RuntimeError:
+        # Older (non-zip) file formats don't support memory-mapping
+        state_dict = torch.load(path_to_state_dict, map_location="cpu", weights_only=weights_only)
+
+    return state_dict
+
+
+def get_components_by_key(sam_model: SAMV2Model) -> dict:
+    """Helper used to match each (existing) model component with the key used to store its weights"""
+    components_by_key = {
+        "imgencoder": sam_model.image_encoder,
+        "coordencoder": sam_model.coordinate_encoder,
+        "promptencoder": sam_model.prompt_encoder,
+        "maskdecoder": sam_model.mask_decoder,
+        "memoryencoder": sam_model.memory_encoder,
+        "memoryfusion": sam_model.memory_fusion,
+    }
+    return {key: component for key, component in components_by_key.items() if component is not None}
+
+
 def make_sam_v2(
     features_per_image_token=112,
     features_per_prompt_token=256,
@@ -87,6 +198,7 @@ def make_sam_v2(
     num_memory_encoder_mixer_layers=2,
     num_memory_fusion_layers=4,
     is_version_2p1=True,
+    include_video_components=True,
 ) -> SAMV2Model:
     """
     Helper used to build all SAMV2 model components. The arguments for this function are
@@ -96,6 +208,8 @@ def make_sam_v2(
     However, if you want to make a model without pretrained weights
     here are the following standard configs (based on the original SAMV2 configs):
     https://github.com/facebookresearch/segment-anything-2/tree/main/sam2_configs
+
+    The memory encoder & memory fusion models are only built if 'include_video_components' is True
     """
 
     # Construct model components
@@ -120,16 +234,19 @@ def make_sam_v2(
         num_output_mask_tokens,
     )
 
-    memenc_model = SAMV2MemoryEncoder(
-        features_per_prompt_token,
-        features_per_memory_token,
-        num_downsample_layers=num_memory_downsample_layers,
-        num_mixer_layers=num_memory_encoder_mixer_layers,
-        is_version_2p1=is_version_2p1,
-    )
-    memfuse_model = SAMV2MemoryFusion(
-        features_per_prompt_token, features_per_memory_token, num_layers=num_memory_fusion_layers
-    )
+    # Video components are skipped if not needed (e.g. when only segmenting images)
+    memenc_model, memfuse_model = None, None
+    if include_video_components:
+        memenc_model = SAMV2MemoryEncoder(
+            features_per_prompt_token,
+            features_per_memory_token,
+            num_downsample_layers=num_memory_downsample_layers,
+            num_mixer_layers=num_memory_encoder_mixer_layers,
+            is_version_2p1=is_version_2p1,
+        )
+        memfuse_model = SAMV2MemoryFusion(
+            features_per_prompt_token, features_per_memory_token, num_layers=num_memory_fusion_layers
+        )
 
     # Bundle components into complete SAM model!
     return SAMV2Model(imgenc_model, coordenc_model, promptenc_model, maskdec_model, memenc_model, memfuse_model)
@@ -0,0 +1,173 @@
+import os
+import os.path as osp
+import json
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.v2_sam.onnx_model import IMAGE_ENCODER_FILE_NAME, MASK_DECODER_FILE_NAME, CONFIG_FILE_NAME
+from src.v2_sam.onnx_model import make_prompt_points
+
+# For type hints
+from torch import Tensor
+from src.v2_sam.sam_v2_model import SAMV2Model
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Classes
+
+
+class ImageEncoderExport(nn.Module):
+    """
+    Wrapper around the image encoder used for exporting. Includes the RGB normalization
+    step, so that the exported model takes in (scaled) RGB images with values from 0 to 255,
+    with shape: Bx3xHxW. Outputs the 3 multi-resolution feature maps of the image encoder.
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, model: SAMV2Model):
+        super().__init__()
+        self.image_encoder = model.image_encoder
+
+    # .................................................................................................................
+
+    def forward(self, image_rgb_bchw: Tensor) -> tuple[Tensor, Tensor, Tensor]:
+        image_tensor_bchw = (image_rgb_bchw - self.image_encoder.mean_rgb) * self.image_encoder.stdev_scale_rgb
+        return self.image_encoder(image_tensor_bchw)
+
+    # .................................................................................................................
+
+
+class PromptsToMasksExport(nn.Module):
+    """
+    Wrapper around the coordinate encoder, prompt encoder and mask decoder, used for exporting.
+    Prompts are given as a single set of (normalized) xy points, along with a label for each
+    point, which indicates the point type (see POINT_LABELS), so that any mix of prompts
+    can be given using a single pair of inputs:
+        points_xy_norm: BxNx2
+        point_labels: BxN
+
+    This gives the same result as the 'encode_prompts' & 'generate_masks' functions of the
+    original model, as long as the points are given in the same order (fg, bg, padding, boxes).
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, model: SAMV2Model):
+        super().__init__()
+        self.coordinate_encoder = model.coordinate_encoder
+        self.prompt_encoder = model.prompt_encoder
+        self.mask_decoder = model.mask_decoder
+
+    # .................................................................................................................
+
+    def forward(
+        self,
+        lowres_tokens: Tensor,
+        hires_tokens_x2: Tensor,
+        hires_tokens_x4: Tensor,
+        points_xy_norm: Tensor,
+        point_labels: Tensor,
+    ) -> tuple[Tensor, Tensor]:
+
+        # Add per-label embeddings to position-encoded points (padding points don't use a position encoding)
+        # -> Embedding table is ordered to match label values + 1
+        point_posenc = self.coordinate_encoder(points_xy_norm)
+        ptenc, boxenc = self.prompt_encoder.point_encoder, self.prompt_encoder.box_encoder
+        embed_table = [ptenc.not_a_point_embed, ptenc.bg_embed, ptenc.fg_embed, boxenc.tl_embed, boxenc.br_embed]
+        embed_table = torch.cat(embed_table, dim=0)
+        labels = point_labels.long()
+        is_padding = (labels < 0).unsqueeze(-1)
+        point_posenc = torch.where(is_padding, torch.zeros_like(point_posenc), point_posenc)
+        encoded_prompts = point_posenc + embed_table[labels + 1]
+
+        # Compute grid position encoding from the image encoding size (matches 'get_full_grid_encoding')
+        grid_h, grid_w = lowres_tokens.shape[2:]
+        device, dtype = lowres_tokens.device, lowres_tokens.dtype
+        x_embed = (torch.arange(grid_w, device=device, dtype=dtype) + 0.5) / grid_w
+        y_embed = (torch.arange(grid_h, device=device, dtype=dtype) + 0.5) / grid_h
+        xy_embed = torch.stack([x_embed.unsqueeze(0).expand(grid_h, -1), y_embed.unsqueeze(1).expand(-1, grid_w)], -1)
+        grid_posenc = self.coordinate_encoder(xy_embed).permute(2, 0, 1).unsqueeze(0)
+
+        encoded_images_list = [lowres_tokens, hires_tokens_x2, hires_tokens_x4]
+        mask_preds, iou_preds, _, _ = self.mask_decoder(encoded_images_list, encoded_prompts, grid_posenc, None, False)
+
+        return mask_preds, iou_preds
+
+    # .................................................................................................................
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Functions
+
+
+def export_samv2_onnx(model: SAMV2Model, save_folder: str, example_image_hw=(1024, 1024), opset_version=17) -> dict:
+    """
+    Export the image encoder & prompt-to-mask (prompt encoding + mask decoding) parts of a SAMV2 model
+    to ONNX. The image size & number of prompt points are exported as dynamic axes. A config file
+    is saved alongside the models, holding settings needed to pre-process images.
+
+    Returns:
+        save_paths_dict
+    """
+
+    # Export is done on the cpu, in float32
+    model.to(device="cpu", dtype=torch.float32)
+    model.eval()
+    os.makedirs(save_folder, exist_ok=True)
+
+    # Make example inputs
+    tiling_size = model.image_encoder.get_image_tiling_size_constraint()
+    example_h, example_w = [int(np.ceil(size / tiling_size)) * tiling_size for size in example_image_hw]
+    example_image = 255.0 * torch.rand((1, 3, example_h, example_w))
+    example_points, example_labels = make_prompt_points([[(0.25, 0.25), (0.75, 0.75)]], [(0.5, 0.5)], [])
+
+    # Export image encoder, with dynamic image sizing
+    image_encoder_path = osp.join(save_folder, IMAGE_ENCODER_FILE_NAME)
+    feature_names = ["lowres_tokens", "hires_tokens_x2", "hires_tokens_x4"]
+    with torch.no_grad():
+        torch.onnx.export(
+            ImageEncoderExport(model),
+            (example_image,),
+            image_encoder_path,
+            input_names=["image_rgb_bchw"],
+            output_names=feature_names,
+            dynamic_axes={
+                "image_rgb_bchw": {0: "batch", 2: "image_height", 3: "image_width"},
+                **{name: {0: "batch", 2: f"{name}_h", 3: f"{name}_w"} for name in feature_names},
+            },
+            opset_version=opset_version,
+        )
+
+        # Export prompt-to-mask model, with dynamic prompt counts & image encoding sizing
+        example_features = ImageEncoderExport(model)(example_image)
+        mask_decoder_path = osp.join(save_folder, MASK_DECODER_FILE_NAME)
+        torch.onnx.export(
+            PromptsToMasksExport(model),
+            (*example_features, torch.from_numpy(example_points), torch.from_numpy(example_labels)),
+            mask_decoder_path,
+            input_names=[*feature_names, "points_xy_norm", "point_labels"],
+            output_names=["mask_predictions", "iou_predictions"],
+            dynamic_axes={
+                **{name: {2: f"{name}_h", 3: f"{name}_w"} for name in feature_names},
+                "points_xy_norm": {1: "num_points"},
+                "point_labels": {1: "num_points"},
+                "mask_predictions": {2: "mask_h", 3: "mask_w"},
+            },
+            opset_version=opset_version,
+        )
+
+    # Save settings needed to use the exported models
+    config_path = osp.join(save_folder, CONFIG_FILE_NAME)
+    config_dict = {
+        "tiling_size": tiling_size,
+        "rgb_offset": [float(val) for val in model.image_encoder.rgb_offset],
+        "rgb_stdev": [float(val) for val in model.image_encoder.rgb_stdev],
+        "example_image_hw": [example_h, example_w],
+    }
+    with open(config_path, "w") as outfile:
+        json.dump(config_dict, outfile, indent=2)
+
+    return {"image_encoder": image_encoder_path, "mask_decoder": mask_decoder_path, "config": config_path}
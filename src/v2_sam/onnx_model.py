@@ -0,0 +1,272 @@
+import os.path as osp
+import json
+
+import cv2
+import numpy as np
+
+# For type hints
+from numpy import ndarray
+
+# File names used for exported models & settings (all stored in a single folder)
+IMAGE_ENCODER_FILE_NAME = "image_encoder.onnx"
+MASK_DECODER_FILE_NAME = "mask_decoder.onnx"
+CONFIG_FILE_NAME = "config.json"
+
+# Prompt point labels used by the exported mask decoder
+POINT_LABELS = {"padding": -1, "bg": 0, "fg": 1, "box_tl": 2, "box_br": 3}
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Classes
+
+
+class ONNXImageEncoder:
+    """
+    Image encoder which runs an exported (see 'export_samv2_onnx') SAMV2 image encoder using onnxruntime.
+    Handles image pre-processing the same way as the original image encoder.
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, session, tiling_size: int, rgb_offset: list[float], to_output_func: callable):
+
+        # Store onnx session & sizing settings
+        self._session = session
+        self._tiling_size = tiling_size
+        self._output_names = [output.name for output in session.get_outputs()]
+        self._to_output = to_output_func
+
+        # Match the buffers of the original image encoder (used to pick the device/dtype of cached encodings)
+        self.mean_rgb = to_output_func(np.float32(rgb_offset).reshape(-1, 1, 1))
+
+    # .................................................................................................................
+
+    def __call__(self, image_rgb_bchw: ndarray) -> list[ndarray]:
+        """Run the image encoder on a (scaled) RGB image. Returns: [lowres_features, features_x2, features_x4]"""
+        image_rgb_bchw = np.ascontiguousarray(image_rgb_bchw, dtype=np.float32)
+        features_list = self._session.run(self._output_names, {"image_rgb_bchw": image_rgb_bchw})
+        return [self._to_output(features) for features in features_list]
+
+    # .................................................................................................................
+
+    def get_image_tiling_size_constraint(self) -> int:
+        return self._tiling_size
+
+    # .................................................................................................................
+
+    def get_scaled_hw(self, image_hw: tuple[int, int], max_side_length=1024, use_square_sizing=True) -> tuple[int, int]:
+        """Same as the original image encoder 'get_scaled_hw'. Returns: scaled_h, scaled_w"""
+
+        img_h, img_w = image_hw
+        largest_side = max(img_h, img_w)
+        scale_factor = max_side_length / largest_side
+
+        tiling_size = self._tiling_size
+        if use_square_sizing:
+            scaled_side = int(np.ceil(largest_side * scale_factor / tiling_size)) * tiling_size
+            scaled_h = scaled_w = scaled_side
+        else:
+            scaled_h = int(np.ceil(img_h * scale_factor / tiling_size)) * tiling_size
+            scaled_w = int(np.ceil(img_w * scale_factor / tiling_size)) * tiling_size
+
+        return scaled_h, scaled_w
+
+    # .................................................................................................................
+
+    def prepare_image(self, image_bgr: ndarray, max_side_length=1024, use_square_sizing=True) -> ndarray:
+        """
+        Helper used to scale an opencv-formatted (bgr) image into the format needed by the image encoder.
+        RGB normalization is part of the exported model, so isn't done here.
+        Returns:
+            image_rgb_bchw (float32)
+        """
+
+        scaled_h, scaled_w = self.get_scaled_hw(image_bgr.shape[0:2], max_side_length, use_square_sizing)
+        image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+        scaled_hwc = cv2.resize(image_rgb, dsize=(scaled_w, scaled_h), interpolation=cv2.INTER_CUBIC)
+
+        return np.expand_dims(np.transpose(scaled_hwc, (2, 0, 1)), 0).astype(np.float32)
+
+    # .................................................................................................................
+
+
+class ONNXSAMV2Model:
+    """
+    Alternative to the (pytorch) SAMV2Model, which runs exported image encoder & mask decoder
+    models (see 'export_samv2_onnx') using onnxruntime on the CPU, with full graph optimizations.
+    This supports the image segmentation functions of the original model, with the same interface:
+
+        model = ONNXSAMV2Model("path/to/onnx_folder")
+        encoded_img, patch_grid_hw, preencoded_hw = model.encode_image(image_bgr)
+        encoded_prompts = model.encode_prompts(box_tlbr_norm_list, fg_xy_norm_list, bg_xy_norm_list)
+        mask_preds, iou_preds = model.generate_masks(encoded_img, encoded_prompts)
+
+    Only numpy & onnxruntime are needed (not pytorch), and results are given as numpy arrays.
+    If 'return_tensors' is enabled, results are instead given as (cpu) pytorch tensors, so they
+    can be used in place of the original model results (e.g. with the labeling UI helpers).
+
+    Note that prompt encoding is part of the exported mask decoder, so the 'encoded prompts' are
+    actually the prompt points & labels used as inputs to the exported model. Mask hints are not
+    supported, since they aren't part of the exported mask decoder.
+    """
+
+    # .................................................................................................................
+
+    def __init__(self, onnx_folder_path: str, num_threads: int | None = None, return_tensors=False):
+
+        # Import here, so onnxruntime is only needed when using onnx models
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("Using onnx models requires onnxruntime, install with: pip install onnxruntime")
+
+        # Only import pytorch if tensor outputs are needed
+        self._to_output = lambda array: array
+        if return_tensors:
+            import torch
+
+            self._to_output = torch.from_numpy
+
+        # Load settings saved when exporting
+        with open(osp.join(onnx_folder_path, CONFIG_FILE_NAME), "r") as infile:
+            config_dict = json.load(infile)
+
+        # Set up sessions to run on cpu, with all graph optimizations enabled
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads is not None:
+            session_options.intra_op_num_threads = int(num_threads)
+        providers = ["CPUExecutionProvider"]
+        imgenc_path = osp.join(onnx_folder_path, IMAGE_ENCODER_FILE_NAME)
+        maskdec_path = osp.join(onnx_folder_path, MASK_DECODER_FILE_NAME)
+        imgenc_session = ort.InferenceSession(imgenc_path, sess_options=session_options, providers=providers)
+        self._maskdec_session = ort.InferenceSession(maskdec_path, sess_options=session_options, providers=providers)
+
+        tiling_size, rgb_offset = config_dict["tiling_size"], config_dict["rgb_offset"]
+        self.image_encoder = ONNXImageEncoder(imgenc_session, tiling_size, rgb_offset, self._to_output)
+
+    # .................................................................................................................
+
+    def encode_image(
+        self,
+        image_bgr: ndarray,
+        max_side_length=1024,
+        use_square_sizing=True,
+    ) -> tuple[list[ndarray], tuple[int, int], tuple[int, int]]:
+        """
+        Same as the original model 'encode_image' function
+        Returns:
+            encoded_images_list, patch_grid_hw, preencoded_image_hw
+        """
+
+        image_rgb_bchw = self.image_encoder.prepare_image(image_bgr, max_side_length, use_square_sizing)
+        encoded_images_list = self.image_encoder(image_rgb_bchw)
+
+        # Get patch sizing of lowest-res tokens (as needed by other components) & size of processed image
+        patch_grid_hw = tuple(encoded_images_list[0].shape[2:])
+        preencoded_image_hw = tuple(image_rgb_bchw.shape[2:])
+
+        return encoded_images_list, patch_grid_hw, preencoded_image_hw
+
+    # .................................................................................................................
+
+    def encode_prompts(
+        self, box_tlbr_norm_list: list, fg_xy_norm_list: list, bg_xy_norm_list: list
+    ) -> tuple[ndarray, ndarray]:
+        """
+        Convert prompts into the inputs needed by the exported mask decoder (which handles prompt encoding)
+        Returns:
+            points_xy_norm, point_labels
+        """
+        return make_prompt_points(box_tlbr_norm_list, fg_xy_norm_list, bg_xy_norm_list)
+
+    # .................................................................................................................
+
+    def generate_masks(
+        self,
+        encoded_image_features_list: list[ndarray],
+        encoded_prompts: tuple[ndarray, ndarray],
+        mask_hint: None = None,
+        blank_promptless_output: bool = True,
+    ) -> tuple[ndarray, ndarray]:
+        """
+        Same as the original model 'generate_masks' function, except that mask hints are not supported
+        (the mask_hint argument is only kept for compatibility & must be None).
+        Image encodings can be given as numpy arrays or (cpu) pytorch tensors.
+        Returns:
+            mask_predictions, iou_predictions
+        """
+
+        if mask_hint is not None:
+            raise ValueError("Mask hints are not supported by onnx models (mask_hint must be None)")
+
+        # Give blank results when there are no prompts, like the original model
+        points_xy_norm, point_labels = encoded_prompts
+        if point_labels.shape[1] == 0 and blank_promptless_output:
+            grid_h, grid_w = encoded_image_features_list[0].shape[2:]
+            mask_preds = np.full((1, 4, 4 * grid_h, 4 * grid_w), -100, dtype=np.float32)
+            iou_preds = np.ones((1, 4), dtype=np.float32)
+            return self._to_output(mask_preds), self._to_output(iou_preds)
+
+        # Run the exported prompt encoder + mask decoder
+        features_list = [np.ascontiguousarray(enc, dtype=np.float32) for enc in encoded_image_features_list]
+        lowres_tokens, hires_tokens_x2, hires_tokens_x4 = features_list
+        input_dict = {
+            "lowres_tokens": lowres_tokens,
+            "hires_tokens_x2": hires_tokens_x2,
+            "hires_tokens_x4": hires_tokens_x4,
+            "points_xy_norm": points_xy_norm,
+            "point_labels": point_labels,
+        }
+        mask_preds, iou_preds = self._maskdec_session.run(["mask_predictions", "iou_predictions"], input_dict)
+
+        return self._to_output(mask_preds), self._to_output(iou_preds)
+
+    # .................................................................................................................
+
+    def get_best_mask_index(self, iou_predictions: ndarray) -> int:
+        """Returns the index of the highest IoU prediction score"""
+        return int(np.argmax(np.asarray(iou_predictions)))
+
+    # .................................................................................................................
+
+    def check_have_prompts(self, box_tlbr_norm_list, fg_xy_norm_list, bg_xy_norm_list) -> bool:
+        """Helper used to check if there are any prompts"""
+        return any((len(items) for items in (box_tlbr_norm_list, fg_xy_norm_list, bg_xy_norm_list)))
+
+    # .................................................................................................................
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Functions
+
+
+def make_prompt_points(box_tlbr_norm_list: list, fg_xy_norm_list: list, bg_xy_norm_list: list) -> tuple:
+    """
+    Helper used to convert prompts (in the same format as 'encode_prompts') into
+    the points & labels format used by the exported mask decoder. Follows the
+    same ordering & padding as the original prompt encoder.
+    Returns:
+        points_xy_norm (shape: 1xNx2, float32), point_labels (shape: 1xN, int64)
+    """
+
+    box_tlbr_norm_list = [] if box_tlbr_norm_list is None else box_tlbr_norm_list
+    fg_xy_norm_list = [] if fg_xy_norm_list is None else fg_xy_norm_list
+    bg_xy_norm_list = [] if bg_xy_norm_list is None else bg_xy_norm_list
+
+    # Original model adds a padding point when given points without boxes
+    no_points = len(fg_xy_norm_list) == 0 and len(bg_xy_norm_list) == 0
+    no_boxes = len(box_tlbr_norm_list) == 0
+    num_padding_points = 1 if (no_boxes and not no_points) else 0
+
+    points_list = [*fg_xy_norm_list, *bg_xy_norm_list, *[(0.0, 0.0)] * num_padding_points]
+    labels_list = [POINT_LABELS["fg"]] * len(fg_xy_norm_list) + [POINT_LABELS["bg"]] * len(bg_xy_norm_list)
+    labels_list += [POINT_LABELS["padding"]] * num_padding_points
+    for tl_xy, br_xy in box_tlbr_norm_list:
+        points_list.extend((tl_xy, br_xy))
+        labels_list.extend((POINT_LABELS["box_tl"], POINT_LABELS["box_br"]))
+
+    points_xy_norm = np.float32(points_list).reshape(1, -1, 2)
+    point_labels = np.int64(labels_list).reshape(1, -1)
+
+    return points_xy_norm, point_labels
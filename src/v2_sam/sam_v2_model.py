@@ -24,14 +24,14 @@ class SAMV2Model(nn.Module):
         coordinate_encoder: SAMV2CoordinateEncoder,
         prompt_encoder_model: SAMV2PromptEncoder,
         mask_decoder_model: SAMV2MaskDecoder,
-        memory_encoder_model: SAMV2MemoryEncoder,
-        memory_fusion_model: SAMV2MemoryFusion,
+        memory_encoder_model: SAMV2MemoryEncoder | None,
+        memory_fusion_model: SAMV2MemoryFusion | None,
     ):
 
         # Inherit from parent
         super().__init__()
 
-        # Store SAM model components
+        # Store SAM model components (memory components may be missing, if only used for images)
         self.image_encoder = image_encoder_model
         self.coordinate_encoder = coordinate_encoder
         self.prompt_encoder = prompt_encoder_model
@@ -141,6 +141,48 @@ class SAMV2Model(nn.Module):
 
     # .................................................................................................................
 
+    def encode_images(
+        self,
+        images_bgr_list: list[ndarray],
+        max_side_length=1024,
+        use_square_sizing=True,
+        max_batch_size: int | None = None,
+    ) -> tuple[list[tuple[list[Tensor], tuple[int, int], tuple[int, int]]], list[tuple[int, int]]]:
+        """
+        Batched version of 'encode_image'. Images that share the same (scaled) size
+        are encoded together in a single forward pass of the image encoder. The
+        max_batch_size setting can be used to limit memory usage with many images.
+
+        Returns:
+            encoding_results_list, original_image_hw_list
+            -> Each entry of the encoding results list matches the output of
+               'encode_image', for the image at the same index of the input list
+               (i.e. encoded_images_list, patch_grid_hw, preencoded_image_hw),
+               with each feature map having a batch size of 1
+            -> The original image sizes are given as (height, width) tuples
+        """
+
+        encoding_results_list = [None] * len(images_bgr_list)
+        original_hw_list = [tuple(image_bgr.shape[0:2]) for image_bgr in images_bgr_list]
+
+        with torch.inference_mode():
+            batches_list = self.image_encoder.prepare_image_batches(
+                images_bgr_list, max_side_length, use_square_sizing, max_batch_size
+            )
+            for image_indices, image_rgb_normalized_bchw in batches_list:
+                image_preenc_hw = image_rgb_normalized_bchw.shape[2:]
+                batch_features_list = self.image_encoder(image_rgb_normalized_bchw)
+                patch_grid_hw = batch_features_list[0].shape[2:]
+
+                # Split batched results back into per-image results
+                for batch_idx, img_idx in enumerate(image_indices):
+                    features_list = [features[batch_idx : batch_idx + 1] for features in batch_features_list]
+                    encoding_results_list[img_idx] = (features_list, patch_grid_hw, image_preenc_hw)
+
+        return encoding_results_list, original_hw_list
+
+    # .................................................................................................................
+
     def generate_masks(
         self,
         encoded_image_features_list: list[Tensor],
@@ -204,6 +246,8 @@ class SAMV2Model(nn.Module):
             best_mask_prediction, memory_encoding, object_pointer
         """
 
+        self._check_have_video_components()
+
         # Encode initial prompts
         encoded_prompts = self.encode_prompts(box_tlbr_norm_list, fg_xy_norm_list, bg_xy_norm_list)
 
@@ -264,6 +308,8 @@ class SAMV2Model(nn.Module):
             The memory & pointer features F & F' are model configs (64, 256 respectively, by default)
         """
 
+        self._check_have_video_components()
+
         with torch.inference_mode():
 
             # Encode image features with previous memory encodings & object pointer data
@@ -304,6 +350,14 @@ class SAMV2Model(nn.Module):
 
     # .................................................................................................................
 
+    def _check_have_video_components(self) -> None:
+        """Helper used to give a clear error if video functions are used without the memory components"""
+        if self.memory_encoder is None or self.memory_fusion is None:
+            raise AttributeError("Video masking requires a model built with 'include_video_components=True'")
+        return
+
+    # .................................................................................................................
+
     def get_best_mask_index(self, iou_predictions: Tensor) -> int:
         """Returns the index of the highest IoU prediction score"""
         return self.mask_decoder.get_best_mask_index(iou_predictions)
@@ -12,12 +12,17 @@ from .key_regex import get_nth_integer, get_suffix_terms, find_match_by_lut
 # %% Main function
 
 
-def convert_state_dict_keys(config_dict: dict, original_state_dict: dict) -> dict[str, dict]:
+def convert_state_dict_keys(
+    config_dict: dict, original_state_dict: dict, include_video_components=True
+) -> dict[str, dict]:
     """
     Function which converts original Segment-Anything V2 model weights
     into the new format needed by the model implementation in this repo (MuggledSAM)
     (layer names are renamed to make the model easier to understand, some are deleted or re-arranged)
 
+    If 'include_video_components' is False, then the memory encoder & memory fusion
+    weights are skipped (their state dicts will be empty).
+
     Returns:
         new_state_dict
 
@@ -82,6 +87,10 @@ def convert_state_dict_keys(config_dict: dict, original_state_dict: dict) -> dic
             maskdecoder_sd[new_key] = mod_data
             continue
 
+        # Remaining keys are only needed for video processing
+        if not include_video_components:
+            continue
+
         new_key = _convert_memencoder_keys(orig_key)
         if found_key(new_key):
 
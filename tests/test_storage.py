@@ -0,0 +1,157 @@
+import numpy as np
+import pytest
+
+import src.image_status as image_status
+from src.image_status import ImageStatusIndex
+from src.helpers.mask_storage import (
+    encode_mask_rle,
+    decode_mask_rle,
+    encode_mask_packbits,
+    decode_mask_packbits,
+    save_mask_file,
+    load_mask_file,
+    get_mask_file_name,
+)
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Helpers
+
+
+def make_test_masks() -> list[np.ndarray]:
+    """Helper used to make masks covering the edge cases of the storage formats (odd sizes, blank & full masks)"""
+
+    rng = np.random.default_rng(0)
+    random_mask = np.uint8(rng.random((37, 51)) > 0.5) * np.uint8(255)
+    single_pixel_mask = np.zeros((1, 1), dtype=np.uint8)
+    single_pixel_mask[0, 0] = 255
+    corner_mask = np.zeros((7, 3), dtype=np.uint8)
+    corner_mask[0, 0] = 255
+    corner_mask[-1, -1] = 255
+
+    return [
+        random_mask,
+        np.zeros((13, 29), dtype=np.uint8),
+        np.full((13, 29), 255, dtype=np.uint8),
+        single_pixel_mask,
+        corner_mask,
+        np.zeros((1, 17), dtype=np.uint8),
+    ]
+
+
+class FakeClock:
+    """Stand-in for time.time, so lease expiry can be tested without waiting"""
+
+    def __init__(self, start_sec=1000.0):
+        self.now_sec = start_sec
+
+    def __call__(self) -> float:
+        return self.now_sec
+
+
+@pytest.fixture
+def fake_clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(image_status.time, "time", clock)
+    return clock
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Mask storage tests
+
+
+@pytest.mark.parametrize("mask_uint8", make_test_masks(), ids=lambda mask: "x".join(str(s) for s in mask.shape))
+def test_rle_round_trip(mask_uint8):
+    rle_dict = encode_mask_rle(mask_uint8)
+    assert rle_dict["size"] == list(mask_uint8.shape)
+    assert sum(rle_dict["counts"]) == mask_uint8.size
+    assert np.array_equal(decode_mask_rle(rle_dict), mask_uint8)
+
+
+@pytest.mark.parametrize("mask_uint8", make_test_masks(), ids=lambda mask: "x".join(str(s) for s in mask.shape))
+def test_packbits_round_trip(mask_uint8):
+    packed_bits, mask_hw = encode_mask_packbits(mask_uint8)
+    assert packed_bits.size == int(np.ceil(mask_uint8.size / 8))
+    assert np.array_equal(decode_mask_packbits(packed_bits, mask_hw), mask_uint8)
+
+
+@pytest.mark.parametrize("mask_format", ["rle", "packbits"])
+def test_mask_file_round_trip(tmp_path, mask_format):
+    for mask_idx, mask_uint8 in enumerate(make_test_masks()):
+        save_path = tmp_path / get_mask_file_name(f"image_{mask_idx}.png", mask_format)
+        save_mask_file(save_path, mask_uint8, mask_format)
+        assert np.array_equal(load_mask_file(save_path), mask_uint8)
+
+    # Temporary files should always be renamed into place
+    assert not any(path.name.endswith(".tmp") for path in tmp_path.iterdir())
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# %% Image status tests
+
+
+def test_status_claims_are_disjoint(tmp_path, fake_clock):
+    db_path = tmp_path / "status.sqlite3"
+    index_a = ImageStatusIndex(db_path, "a", lease_sec=10)
+    index_b = ImageStatusIndex(db_path, "b", lease_sec=10)
+    index_a.sync([f"{idx}.png" for idx in range(5)], labeled_names={"0.png"})
+
+    claimed_a = index_a.claim(2)
+    claimed_b = index_b.claim(10)
+    assert claimed_a == ["1.png", "2.png"]
+    assert sorted(claimed_b) == ["3.png", "4.png"]
+    assert index_a.count(ImageStatusIndex.CLAIMED) == 4
+    assert index_a.count(ImageStatusIndex.LABELED) == 1
+
+
+def test_status_expired_claims_are_reclaimed(tmp_path, fake_clock):
+    db_path = tmp_path / "status.sqlite3"
+    index_a = ImageStatusIndex(db_path, "a", lease_sec=10)
+    index_b = ImageStatusIndex(db_path, "b", lease_sec=10)
+    index_a.sync(["0.png", "1.png"], labeled_names=set())
+    assert index_a.claim(2) == ["0.png", "1.png"]
+
+    # Claims can't be taken before the lease expires, but can be afterwards
+    fake_clock.now_sec += 5
+    assert index_b.claim(2) == []
+    fake_clock.now_sec += 6
+    assert index_b.claim(1) == ["0.png"]
+
+    # The original annotator loses the image that was re-claimed, but keeps the other
+    assert index_a.renew(["0.png", "1.png"]) == ["1.png"]
+
+
+def test_status_renew_extends_lease(tmp_path, fake_clock):
+    db_path = tmp_path / "status.sqlite3"
+    index_a = ImageStatusIndex(db_path, "a", lease_sec=10)
+    index_b = ImageStatusIndex(db_path, "b", lease_sec=10)
+    index_a.sync(["0.png"], labeled_names=set())
+    assert index_a.claim(1) == ["0.png"]
+
+    # Keep renewing past the original lease time, the image should never become available
+    for _ in range(5):
+        fake_clock.now_sec += 8
+        assert index_a.renew(["0.png"]) == ["0.png"]
+        assert index_b.claim(1) == []
+
+    # Releasing hands the image back immediately
+    index_a.release(["0.png"])
+    assert index_b.claim(1) == ["0.png"]
+
+
+def test_status_sync_keeps_recent_labels(tmp_path, fake_clock):
+    db_path = tmp_path / "status.sqlite3"
+    index_a = ImageStatusIndex(db_path, "a", lease_sec=10)
+    index_a.sync(["0.png", "1.png"], labeled_names=set())
+    index_a.claim(2)
+    index_a.mark_labeled("0.png")
+
+    # A recently labeled image may not have its mask written yet, so shouldn't be handed out again
+    fake_clock.now_sec += 1
+    index_a.sync(["0.png", "1.png"], labeled_names=set())
+    assert index_a.count(ImageStatusIndex.LABELED) == 1
+
+    # Once a lease period has passed, a missing mask means the image needs to be labeled again
+    fake_clock.now_sec += 20
+    index_a.sync(["0.png", "1.png"], labeled_names=set())
+    assert index_a.count(ImageStatusIndex.LABELED) == 0